@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from django.contrib import admin
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from email_relay.models import Message
+from email_relay.stats import estimate_count
+
+# Below this many estimated rows, counting exactly is cheap enough.
+EXACT_COUNT_THRESHOLD = 10_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginate with PostgreSQL's estimated row count on large tables.
+
+    Counting every matching row of a large relay table for each page of the
+    admin is expensive, so the planner's estimate is used instead once it is
+    over `EXACT_COUNT_THRESHOLD`. Other databases always count.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        estimate = None
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "subject",
+        "recipient_summary",
+        "status",
+        "priority",
+        "retry_count",
+        "created_at",
+        "sent_at",
+    ]
+    list_filter = ["status", "priority"]
+    ordering = ["-id"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = [
+        "subject",
+        "recipient_summary",
+        "idempotency_key",
+        "data",
+        "recipient_state",
+        "trace_context",
+        "log",
+        "retry_count",
+        "created_at",
+        "updated_at",
+        "sent_at",
+        "claimed_at",
+        "reserved_until",
+    ]
+    actions = [
+        "requeue_messages",
+        "cancel_messages",
+        "fail_messages",
+        "delete_messages",
+    ]
+
+    def get_queryset(self, request):
+        # The data of a message can be large, so it is only loaded when a
+        # single message is viewed, rather than for every row of a list.
+        return (
+            super()
+            .get_queryset(request)
+            .defer("data", "recipient_state", "trace_context", "log")
+        )
+
+    def get_actions(self, request):
+        # Replaced by `delete_messages`, which does not load each message.
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(description="Requeue selected messages", permissions=["change"])
+    def requeue_messages(self, request, queryset):
+        count = queryset.requeue()
+        self.message_user(request, f"Requeued {count} messages.", messages.SUCCESS)
+
+    @admin.action(description="Cancel selected messages", permissions=["change"])
+    def cancel_messages(self, request, queryset):
+        count = queryset.cancel(log=f"Cancelled by {request.user}")
+        self.message_user(request, f"Cancelled {count} messages.", messages.SUCCESS)
+
+    @admin.action(
+        description="Mark selected messages as failed", permissions=["change"]
+    )
+    def fail_messages(self, request, queryset):
+        count = queryset.fail(log=f"Marked as failed by {request.user}")
+        self.message_user(
+            request, f"Marked {count} messages as failed.", messages.SUCCESS
+        )
+
+    @admin.action(description="Delete selected messages", permissions=["delete"])
+    def delete_messages(self, request, queryset):
+        count = queryset.delete_in_chunks()
+        self.message_user(request, f"Deleted {count} messages.", messages.SUCCESS)
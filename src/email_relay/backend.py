@@ -6,13 +6,30 @@ from django.core.mail import EmailMessage
 from django.core.mail.backends.base import BaseEmailBackend
 
 from email_relay.conf import app_settings
+from email_relay.instrumentation import get_observer
 from email_relay.models import Message
 
 
 class RelayDatabaseEmailBackend(BaseEmailBackend):
     def send_messages(self, email_messages: Sequence[EmailMessage]) -> int:
-        messages = Message.objects.bulk_create(
-            [Message(email=email) for email in email_messages],
-            app_settings.MESSAGES_BATCH_SIZE,
-        )
-        return len(messages)
+        observer = get_observer()
+        with observer.stage("serialize"):
+            messages = [
+                message
+                for email in email_messages
+                for message in Message(email=email).split(
+                    app_settings.MESSAGES_MAX_RECIPIENTS
+                )
+            ]
+        observer.messages_serialized(messages)
+        with observer.stage("insert"):
+            # Messages already queued with the same idempotency key are
+            # skipped by the database, rather than looked up one by one.
+            Message.objects.bulk_create(
+                messages,
+                app_settings.MESSAGES_BATCH_SIZE,
+                ignore_conflicts=any(
+                    message.idempotency_key is not None for message in messages
+                ),
+            )
+        return len(email_messages)
@@ -0,0 +1,271 @@
+"""Benchmark queueing and relaying email.
+
+Run with `python -m email_relay.bench`. Results are written as JSON, so they can
+be compared across releases. Pass `--database-url` to benchmark against a
+database other than an in-memory SQLite database, such as PostgreSQL.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import django
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail import EmailMultiAlternatives
+from django.db import connections
+from django.db import router
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings
+
+from email_relay import __version__
+
+PAYLOADS = ("plain", "html", "attachments")
+TRANSPORTS = ("null", "smtp")
+
+TEXT_BODY = "The quick brown fox jumps over the lazy dog.\n" * 25
+HTML_BODY = "<p>The quick brown fox jumps over the <b>lazy</b> dog.</p>\n" * 200
+ATTACHMENT = bytes(range(256)) * 400
+
+
+def make_email(payload: str, index: int) -> EmailMessage:
+    if payload == "plain":
+        email = EmailMessage()
+    elif payload == "html":
+        email = EmailMultiAlternatives()
+        email.attach_alternative(HTML_BODY, "text/html")
+    elif payload == "attachments":
+        email = EmailMessage()
+        for n in range(3):
+            email.attach(f"attachment-{n}.bin", ATTACHMENT, "application/octet-stream")
+    else:
+        raise ValueError(f"Unknown payload: {payload}")
+
+    email.subject = f"Benchmark message {index}"
+    email.body = TEXT_BODY
+    email.from_email = "bench@example.com"
+    email.to = [f"to-{index}@example.com"]
+    email.cc = ["cc@example.com"]
+    return email
+
+
+@contextmanager
+def transport(name: str) -> Iterator[None]:
+    if name == "null":
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.dummy.EmailBackend"
+        ):
+            yield
+    elif name == "smtp":
+        from email_relay.smtp_sink import SMTPSink
+
+        with SMTPSink() as sink, override_settings(**sink.email_settings()):
+            yield
+    else:
+        raise ValueError(f"Unknown transport: {name}")
+
+
+def measure(
+    setup: Callable[[], None], run: Callable[[], None], messages: int, memory: bool
+) -> dict[str, Any]:
+    from email_relay.models import Message
+
+    connection = connections[router.db_for_write(Message)]
+
+    setup()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+
+    result: dict[str, Any] = {
+        "messages": messages,
+        "seconds": round(seconds, 6),
+        "messages_per_second": round(messages / seconds, 2) if seconds else None,
+        "queries": len(queries),
+        "queries_per_message": round(len(queries) / messages, 3),
+    }
+
+    if memory:
+        # Tracing allocations slows everything down, so memory is measured on
+        # a separate run from the timings.
+        setup()
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def bench_enqueue(
+    payload: str, messages: int, batch_size: int, memory: bool
+) -> dict[str, Any]:
+    from email_relay.backend import RelayDatabaseEmailBackend
+    from email_relay.models import Message
+
+    emails = [make_email(payload, index) for index in range(messages)]
+    backend = RelayDatabaseEmailBackend()
+
+    def setup() -> None:
+        Message.objects.all().delete()
+
+    def run() -> None:
+        for start in range(0, messages, batch_size):
+            backend.send_messages(emails[start : start + batch_size])
+
+    return {
+        "benchmark": "enqueue",
+        "payload": payload,
+        **measure(setup, run, messages, memory),
+    }
+
+
+def bench_relay(
+    payload: str, transport_name: str, messages: int, memory: bool
+) -> dict[str, Any]:
+    from email_relay.models import Message
+    from email_relay.relay import send_all
+
+    message = Message(email=make_email(payload, 0))
+
+    def setup() -> None:
+        Message.objects.all().delete()
+        Message.objects.bulk_create(Message(data=message.data) for _ in range(messages))
+
+    with transport(transport_name):
+        result = measure(setup, send_all, messages, memory)
+
+    return {
+        "benchmark": "send_all",
+        "payload": payload,
+        "transport": transport_name,
+        **result,
+    }
+
+
+def run_benchmarks(
+    messages: int = 1000,
+    batch_size: int = 100,
+    payloads: tuple[str, ...] = PAYLOADS,
+    transports: tuple[str, ...] = TRANSPORTS,
+    memory: bool = True,
+) -> dict[str, Any]:
+    from email_relay.models import Message
+
+    connection = connections[router.db_for_write(Message)]
+    results = []
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            **getattr(settings, "DJANGO_EMAIL_RELAY", {}),
+            "EMAIL_MAX_BATCH": None,
+            "EMAIL_THROTTLE": 0,
+        }
+    ):
+        for payload in payloads:
+            results.append(bench_enqueue(payload, messages, batch_size, memory))
+            for transport_name in transports:
+                results.append(bench_relay(payload, transport_name, messages, memory))
+        Message.objects.all().delete()
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "results": results,
+    }
+
+
+def configure(database_url: str) -> None:  # pragma: no cover
+    from environs import Env
+
+    settings.configure(
+        DATABASES={"default": Env().dj_db_url("DATABASE_URL", default=database_url)},
+        INSTALLED_APPS=["email_relay"],
+        LOGGING_CONFIG=None,
+        USE_TZ=True,
+    )
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m email_relay.bench",
+        description="Benchmark queueing and relaying email.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--database-url",
+        default="sqlite://:memory:",
+        help="Database to benchmark against. `DATABASE_URL` takes precedence.",
+    )
+    parser.add_argument(
+        "--messages", type=int, default=1000, help="Messages per benchmark."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="Messages per call to the email backend when queueing.",
+    )
+    parser.add_argument(
+        "--payload",
+        action="append",
+        choices=PAYLOADS,
+        help="Payload to benchmark, can be repeated. Defaults to all.",
+    )
+    parser.add_argument(
+        "--transport",
+        action="append",
+        choices=TRANSPORTS,
+        help="Transport for the relay to send with, can be repeated. Defaults to all.",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="Skip measuring peak memory.",
+    )
+    parser.add_argument(
+        "--output", help="File to write the results to, instead of stdout."
+    )
+    args = parser.parse_args(argv)
+
+    if not settings.configured:
+        configure(args.database_url)
+
+    results = run_benchmarks(
+        messages=args.messages,
+        batch_size=args.batch_size,
+        payloads=tuple(args.payload or PAYLOADS),
+        transports=tuple(args.transport or TRANSPORTS),
+        memory=args.memory,
+    )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import time
+
+from email_relay.conf import app_settings
+from email_relay.errors import is_transport_error
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerOpen(Exception):
+    """A message was not sent because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stop sending while the email backend is down.
+
+    The breaker starts closed, letting every message through. After
+    `EMAIL_CIRCUIT_BREAKER_THRESHOLD` transport errors in a row, such as
+    connection failures or timeouts, it opens and no messages are sent for
+    `EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS`. It is then half-open, letting
+    a single message through as a probe: if that is sent, the breaker
+    closes again, and if not, it reopens for another cool-down.
+
+    Errors about a message itself, such as a refused recipient, show the
+    email backend is up, so they count as a success here.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and self.remaining_seconds > 0
+
+    @property
+    def is_half_open(self) -> bool:
+        return self.opened_at is not None and self.remaining_seconds <= 0
+
+    @property
+    def remaining_seconds(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(
+            self.opened_at
+            + app_settings.EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS
+            - time.monotonic(),
+            0.0,
+        )
+
+    def record(self, result: Exception | None) -> None:
+        """Record the outcome of sending a message."""
+        if result is not None and is_transport_error(result):
+            self.record_failure()
+        elif result is None or isinstance(result, OSError):
+            self.record_success()
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("email backend is back, closing circuit breaker")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.is_half_open:
+            logger.warning(
+                "probe message could not be sent, reopening circuit breaker for "
+                "%s seconds",
+                app_settings.EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+            )
+            self.opened_at = time.monotonic()
+        elif self.opened_at is None and self.failures >= (
+            app_settings.EMAIL_CIRCUIT_BREAKER_THRESHOLD or 0
+        ):
+            logger.warning(
+                "opening circuit breaker for %s seconds after %s transport errors "
+                "in a row",
+                app_settings.EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS,
+                self.failures,
+            )
+            self.opened_at = time.monotonic()
+
+
+_breaker: CircuitBreaker | None = None
+
+
+def get_circuit_breaker() -> CircuitBreaker | None:
+    """Get the process-wide circuit breaker, if enabled.
+
+    Returns:
+        CircuitBreaker | None: The circuit breaker, or `None` if
+            `EMAIL_CIRCUIT_BREAKER_THRESHOLD` is not set.
+    """
+    global _breaker
+
+    if not app_settings.EMAIL_CIRCUIT_BREAKER_THRESHOLD:
+        return None
+
+    if _breaker is None:
+        _breaker = CircuitBreaker()
+    return _breaker
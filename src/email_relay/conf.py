@@ -1,32 +1,215 @@
 from __future__ import annotations
 
+import copy
 from dataclasses import dataclass
+from dataclasses import fields
+from typing import TYPE_CHECKING
 from typing import Any
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 EMAIL_RELAY_SETTINGS_NAME = "DJANGO_EMAIL_RELAY"
 EMAIL_RELAY_DATABASE_ALIAS = "email_relay_db"
+EMAIL_RELAY_LEADER_LOCK_ID = 7308617008875856249
+
+SMTP_ERROR_ACTIONS = ("defer", "fail")
+UPSTREAM_KEYS = {"BACKEND", "NAME", "OPTIONS", "THROTTLE", "WEIGHT"}
 
 
 @dataclass(frozen=True)
 class AppSettings:
     DATABASE_ALIAS: str = EMAIL_RELAY_DATABASE_ALIAS
+    EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS: float = 60.0
+    EMAIL_CIRCUIT_BREAKER_THRESHOLD: int | None = None
     EMAIL_MAX_BATCH: int | None = None
     EMAIL_MAX_DEFERRED: int | None = None
     EMAIL_MAX_RETRIES: int | None = None
+    EMAIL_SEND_BATCH_SIZE: int | None = None
+    EMAIL_SENDING_TIMEOUT_SECONDS: float = 600.0
+    EMAIL_SMTP_ERROR_ACTIONS: dict[int, str] | None = None
+    EMAIL_STALE_SENDING_ACTION: str = "fail"
     EMPTY_QUEUE_SLEEP: int = 30
     EMAIL_THROTTLE: int = 0
+    EMAIL_UPSTREAM_EJECT_SECONDS: float = 30.0
+    EMAIL_UPSTREAM_ERROR_WINDOW: int = 20
+    EMAIL_UPSTREAM_MAX_ERROR_RATE: float = 0.5
+    EMAIL_UPSTREAMS: list[dict[str, Any]] | None = None
     MESSAGES_BATCH_SIZE: int | None = None
+    MESSAGES_MAX_RECIPIENTS: int | None = None
     MESSAGES_RETENTION_SECONDS: int | None = None
+    MESSAGES_TTL_SECONDS: dict[int, int] | None = None
+    PRIORITY_AGING_SECONDS: int | None = None
+    PRIORITY_WEIGHTS: dict[int, int] | None = None
+    QUEUE_STATS_APPROXIMATE: bool = False
+    QUEUE_STATS_CACHE_SECONDS: float = 15.0
+    RELAY_HEALTHCHECK_INTERVAL: float = 60.0
+    RELAY_HEALTHCHECK_MAX_LOOP_SECONDS: float | None = None
     RELAY_HEALTHCHECK_METHOD: str = "GET"
     RELAY_HEALTHCHECK_STATUS_CODE: int = 200
     RELAY_HEALTHCHECK_TIMEOUT: float | tuple[float, float] | tuple[float, None] = 5.0
     RELAY_HEALTHCHECK_URL: str | None = None
+    RELAY_LEADER_ELECTION: bool = False
+    RELAY_LEADER_LEASE_SECONDS: int = 10
+    RELAY_LEADER_LOCK_ID: int = EMAIL_RELAY_LEADER_LOCK_ID
+    RELAY_LEADER_POLL_SECONDS: float = 1.0
+    RELAY_METRICS_ADDR: str = "0.0.0.0"  # noqa: S104
+    RELAY_METRICS_CACHE_SECONDS: float = 15.0
+    RELAY_METRICS_PORT: int | None = None
+    RELAY_OBSERVERS: list[str] | None = None
+
+    def __post_init__(self):
+        for name in (
+            "EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS",
+            "EMAIL_CIRCUIT_BREAKER_THRESHOLD",
+            "EMAIL_MAX_BATCH",
+            "EMAIL_MAX_DEFERRED",
+            "EMAIL_MAX_RETRIES",
+            "EMAIL_SEND_BATCH_SIZE",
+            "EMAIL_SENDING_TIMEOUT_SECONDS",
+            "EMPTY_QUEUE_SLEEP",
+            "EMAIL_THROTTLE",
+            "EMAIL_UPSTREAM_EJECT_SECONDS",
+            "EMAIL_UPSTREAM_ERROR_WINDOW",
+            "EMAIL_UPSTREAM_MAX_ERROR_RATE",
+            "MESSAGES_BATCH_SIZE",
+            "MESSAGES_RETENTION_SECONDS",
+            "QUEUE_STATS_CACHE_SECONDS",
+            "RELAY_HEALTHCHECK_INTERVAL",
+            "RELAY_HEALTHCHECK_MAX_LOOP_SECONDS",
+            "RELAY_LEADER_LEASE_SECONDS",
+            "RELAY_LEADER_POLL_SECONDS",
+            "RELAY_METRICS_CACHE_SECONDS",
+        ):
+            value = getattr(self, name)
+            if value is not None and value < 0:
+                raise ImproperlyConfigured(
+                    f"{EMAIL_RELAY_SETTINGS_NAME}['{name}'] must not be negative, "
+                    f"got {value!r}"
+                )
+
+        if (
+            self.MESSAGES_MAX_RECIPIENTS is not None
+            and self.MESSAGES_MAX_RECIPIENTS < 1
+        ):
+            raise ImproperlyConfigured(
+                f"{EMAIL_RELAY_SETTINGS_NAME}['MESSAGES_MAX_RECIPIENTS'] must be at "
+                f"least 1, got {self.MESSAGES_MAX_RECIPIENTS!r}"
+            )
+
+        for name in ("MESSAGES_TTL_SECONDS", "PRIORITY_WEIGHTS"):
+            for key, value in (getattr(self, name) or {}).items():
+                if int(value) < 0:
+                    raise ImproperlyConfigured(
+                        f"{EMAIL_RELAY_SETTINGS_NAME}['{name}'][{key!r}] must not "
+                        f"be negative, got {value!r}"
+                    )
+
+        for code, action in (self.EMAIL_SMTP_ERROR_ACTIONS or {}).items():
+            try:
+                int(code)
+            except (TypeError, ValueError):
+                raise ImproperlyConfigured(
+                    f"{EMAIL_RELAY_SETTINGS_NAME}['EMAIL_SMTP_ERROR_ACTIONS'] keys "
+                    f"must be SMTP reply codes, got {code!r}"
+                ) from None
+            if action not in SMTP_ERROR_ACTIONS:
+                raise ImproperlyConfigured(
+                    f"{EMAIL_RELAY_SETTINGS_NAME}['EMAIL_SMTP_ERROR_ACTIONS']"
+                    f"[{code!r}] must be one of "
+                    f"{', '.join(repr(action) for action in SMTP_ERROR_ACTIONS)}, "
+                    f"got {action!r}"
+                )
+
+        if self.EMAIL_STALE_SENDING_ACTION not in SMTP_ERROR_ACTIONS:
+            raise ImproperlyConfigured(
+                f"{EMAIL_RELAY_SETTINGS_NAME}['EMAIL_STALE_SENDING_ACTION'] must be "
+                f"one of {', '.join(repr(action) for action in SMTP_ERROR_ACTIONS)}, "
+                f"got {self.EMAIL_STALE_SENDING_ACTION!r}"
+            )
+
+        for index, upstream in enumerate(self.EMAIL_UPSTREAMS or []):
+            name = f"{EMAIL_RELAY_SETTINGS_NAME}['EMAIL_UPSTREAMS'][{index}]"
+            if "BACKEND" not in upstream:
+                raise ImproperlyConfigured(f"{name} must set 'BACKEND'")
+            unknown = set(upstream) - UPSTREAM_KEYS
+            if unknown:
+                raise ImproperlyConfigured(
+                    f"{name} has unknown keys: {', '.join(sorted(unknown))}"
+                )
+            for key in ("WEIGHT", "THROTTLE"):
+                value = upstream.get(key, 0)
+                if value < 0:
+                    raise ImproperlyConfigured(
+                        f"{name}['{key}'] must not be negative, got {value!r}"
+                    )
+        if self.EMAIL_UPSTREAMS and not any(
+            upstream.get("WEIGHT", 1) > 0 for upstream in self.EMAIL_UPSTREAMS
+        ):
+            raise ImproperlyConfigured(
+                f"{EMAIL_RELAY_SETTINGS_NAME}['EMAIL_UPSTREAMS'] must have at least "
+                "one upstream with a 'WEIGHT' above 0"
+            )
+
+    @classmethod
+    def from_settings(cls) -> AppSettings:
+        """Resolve the user's `DJANGO_EMAIL_RELAY` setting against the defaults.
+
+        Raises:
+            ImproperlyConfigured: If the setting contains unknown or invalid
+                values.
+        """
+        user_settings = getattr(settings, EMAIL_RELAY_SETTINGS_NAME, None) or {}
+        unknown = set(user_settings) - {field.name for field in fields(cls)}
+        if unknown:
+            raise ImproperlyConfigured(
+                f"Unknown {EMAIL_RELAY_SETTINGS_NAME} settings: "
+                f"{', '.join(sorted(unknown))}"
+            )
+        return cls(**copy.deepcopy(user_settings))
+
+
+if TYPE_CHECKING:
+    _AppSettingsBase = AppSettings
+else:
+    _AppSettingsBase = object
+
+
+class LazyAppSettings(_AppSettingsBase):
+    """A snapshot of `AppSettings`, resolved on first access.
+
+    The resolved values are stored on the instance, so reading a setting is a
+    plain attribute lookup rather than a trip through `django.conf.settings`.
+    The snapshot is discarded whenever `DJANGO_EMAIL_RELAY` is changed through
+    Django's `setting_changed` signal, such as with `override_settings`, or
+    when `reload` is called.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes missing from the instance, so only
+        # before the snapshot is taken or for names that are not settings.
+        if name.startswith("_") or self.__dict__:
+            raise AttributeError(name)
+        snapshot = AppSettings.from_settings()
+        self.__dict__.update(
+            {field.name: getattr(snapshot, field.name) for field in fields(snapshot)}
+        )
+        return getattr(self, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"Cannot set {name}, app settings are read-only")
+
+    def reload(self) -> None:
+        """Discard the snapshot, so settings are resolved again on next access."""
+        self.__dict__.clear()
+
 
-    def __getattribute__(self, __name: str) -> Any:
-        user_settings = getattr(settings, EMAIL_RELAY_SETTINGS_NAME, {})
-        return user_settings.get(__name, super().__getattribute__(__name))
+app_settings = LazyAppSettings()
 
 
-app_settings = AppSettings()
+@receiver(setting_changed)
+def reload_app_settings(*, setting: str, **kwargs) -> None:
+    if setting == EMAIL_RELAY_SETTINGS_NAME:
+        app_settings.reload()
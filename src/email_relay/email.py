@@ -2,16 +2,142 @@ from __future__ import annotations
 
 import base64
 import binascii
+import datetime
+import hashlib
 from dataclasses import asdict
 from dataclasses import dataclass
 from dataclasses import field
+from dataclasses import replace
 from email.mime.base import MIMEBase
+from email.utils import parseaddr
 
 from django.core.mail import EmailMessage
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from email_relay import __version__
 
+RELAY_HEADER_PREFIX = "X-Email-Relay-"
+SEND_AT_HEADER = f"{RELAY_HEADER_PREFIX}Send-At"
+EXPIRES_AT_HEADER = f"{RELAY_HEADER_PREFIX}Expires-At"
+IDEMPOTENCY_KEY_HEADER = f"{RELAY_HEADER_PREFIX}Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def get_relay_header(
+    email_message: EmailMessage | EmailMultiAlternatives, header: str
+) -> str | None:
+    for name, value in email_message.extra_headers.items():
+        if name.lower() == header.lower():
+            return str(value)
+    return None
+
+
+def get_send_at(
+    email_message: EmailMessage | EmailMultiAlternatives,
+) -> datetime.datetime | None:
+    """Get the time an email should be sent at, if it has been scheduled.
+
+    Taken from a `send_at` attribute on the email, or failing that, an
+    ISO 8601 formatted `X-Email-Relay-Send-At` header. Naive datetimes are
+    assumed to be in the current time zone.
+    """
+    return _get_relay_datetime(email_message, "send_at", SEND_AT_HEADER)
+
+
+def get_expires_at(
+    email_message: EmailMessage | EmailMultiAlternatives,
+) -> datetime.datetime | None:
+    """Get the time after which an email should no longer be sent, if any.
+
+    Taken from an `expires_at` attribute on the email, or failing that, an
+    ISO 8601 formatted `X-Email-Relay-Expires-At` header. Naive datetimes are
+    assumed to be in the current time zone.
+    """
+    return _get_relay_datetime(email_message, "expires_at", EXPIRES_AT_HEADER)
+
+
+def get_idempotency_key(
+    email_message: EmailMessage | EmailMultiAlternatives,
+) -> str | None:
+    """Get the key identifying an email across repeated attempts to queue it.
+
+    Taken from an `idempotency_key` attribute on the email, or failing that,
+    an `X-Email-Relay-Idempotency-Key` header.
+    """
+    value = getattr(email_message, "idempotency_key", None)
+    if value is None:
+        value = get_relay_header(email_message, IDEMPOTENCY_KEY_HEADER)
+        if value is None:
+            return None
+
+    value = str(value)
+    if len(value) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(
+            f"idempotency_key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} "
+            f"characters, got {len(value)}"
+        )
+    return value
+
+
+def split_idempotency_key(key: str, index: int) -> str:
+    """Get the idempotency key for the message at `index` of a split email.
+
+    The index is appended to the key, which is replaced with its SHA-256
+    digest first if the result would be longer than the field allows, so
+    the same key and index always give the same result.
+    """
+    suffix = f":{index}"
+    if len(key) + len(suffix) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        key = hashlib.sha256(key.encode()).hexdigest()
+    return f"{key}{suffix}"
+
+
+def _get_relay_datetime(
+    email_message: EmailMessage | EmailMultiAlternatives, attribute: str, header: str
+) -> datetime.datetime | None:
+    value = getattr(email_message, attribute, None)
+    if value is None:
+        header_value = get_relay_header(email_message, header)
+        if header_value is None:
+            return None
+        value = parse_datetime(header_value)
+        if value is None:
+            raise ValueError(f"Invalid {header} header: {header_value!r}")
+
+    if not isinstance(value, datetime.datetime):
+        raise TypeError(f"{attribute} must be a datetime")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def normalize_address(address: str) -> str:
+    """Get the bare, lowercased email address from a recipient."""
+    return parseaddr(address)[1].lower()
+
+
+class RelayEmailMessage(EmailMultiAlternatives):
+    """An email that can be sent to only some of its recipients.
+
+    If `envelope_recipients` is set, the email is only sent to those of its
+    recipients, while its `To` and `Cc` headers stay the same, so a retry
+    reaches only the recipients that have not received it yet.
+    """
+
+    envelope_recipients: list[str] | None = None
+
+    def recipients(self) -> list[str]:
+        recipients = super().recipients()
+        if self.envelope_recipients is None:
+            return recipients
+        return [
+            recipient
+            for recipient in recipients
+            if recipient in self.envelope_recipients
+        ]
+
 
 @dataclass(frozen=True)
 class RelayEmailData:
@@ -25,13 +151,44 @@ class RelayEmailData:
     extra_headers: dict[str, str] = field(default_factory=dict)
     alternatives: list[tuple[str, str]] = field(default_factory=list)
     attachments: list[dict[str, str]] = field(default_factory=list)
+    envelope_recipients: list[str] | None = None
     _email_relay_version: str = __version__
 
     def to_dict(self) -> dict[str, str]:
         return asdict(self)
 
-    def to_email_message(self) -> EmailMultiAlternatives:
-        email = EmailMultiAlternatives(
+    @property
+    def recipients(self) -> list[str]:
+        if self.envelope_recipients is not None:
+            return self.envelope_recipients
+        return [*self.to, *self.cc, *self.bcc]
+
+    def split(self, max_recipients: int) -> list[RelayEmailData]:
+        """Split the email into emails to at most `max_recipients` recipients each.
+
+        Each email keeps the same `To` and `Cc` headers and is only sent to its
+        own share of the recipients. As `Bcc` recipients are not in the
+        headers, each email only keeps its own.
+        """
+        recipients = self.recipients
+        if len(recipients) <= max_recipients:
+            return [self]
+
+        emails = []
+        for start in range(0, len(recipients), max_recipients):
+            chunk = recipients[start : start + max_recipients]
+            chunk_set = set(chunk)
+            emails.append(
+                replace(
+                    self,
+                    bcc=[recipient for recipient in self.bcc if recipient in chunk_set],
+                    envelope_recipients=chunk,
+                )
+            )
+        return emails
+
+    def to_email_message(self) -> RelayEmailMessage:
+        email = RelayEmailMessage(
             subject=self.subject,
             body=self.body,
             from_email=self.from_email,
@@ -41,6 +198,7 @@ class RelayEmailData:
             reply_to=self.reply_to,
             headers=self.extra_headers,
         )
+        email.envelope_recipients = self.envelope_recipients
 
         for alternative in self.alternatives:
             email.attach_alternative(alternative[0], alternative[1])
@@ -104,7 +262,11 @@ class RelayEmailData:
             cc=email_message.cc,
             bcc=email_message.bcc,
             reply_to=email_message.reply_to,
-            extra_headers=email_message.extra_headers,
+            extra_headers={
+                name: value
+                for name, value in email_message.extra_headers.items()
+                if not name.lower().startswith(RELAY_HEADER_PREFIX.lower())
+            },
             alternatives=getattr(email_message, "alternatives", []),
             attachments=attachments,
         )
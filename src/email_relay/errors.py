@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import smtplib
+
+from email_relay.conf import app_settings
+
+DEFER = "defer"
+FAIL = "fail"
+
+# Errors sending a message that may be worth retrying later, rather than
+# marking the message as failed straight away.
+RETRYABLE_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPDataError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    OSError,
+)
+
+# Errors about the message being sent, rather than the email backend it was
+# sent through, which shows the email backend is up.
+MESSAGE_ERRORS = (
+    smtplib.SMTPDataError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+)
+
+
+def is_transport_error(error: Exception) -> bool:
+    """Whether an error means the email backend could not be reached or used."""
+    return isinstance(error, OSError) and not isinstance(error, MESSAGE_ERRORS)
+
+
+def get_smtp_codes(error: Exception) -> list[int]:
+    """Get the SMTP reply codes from an error about a message."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return [code for code, _ in error.recipients.values()]
+    if isinstance(error, smtplib.SMTPResponseException):
+        return [error.smtp_code]
+    return []
+
+
+def get_smtp_action(code: int) -> str:
+    """Whether to defer or fail a message for an SMTP reply code.
+
+    Uses `EMAIL_SMTP_ERROR_ACTIONS` if the code is in it. Otherwise,
+    permanent `5xx` replies fail the message, and anything else defers it.
+    """
+    actions = {
+        int(reply_code): action
+        for reply_code, action in (app_settings.EMAIL_SMTP_ERROR_ACTIONS or {}).items()
+    }
+    if code in actions:
+        return actions[code]
+    return FAIL if 500 <= code < 600 else DEFER
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a message that failed to send with an error should be deferred.
+
+    Network errors and errors from the email backend itself, such as failing
+    to authenticate, are always retryable. Errors about the message are
+    retryable depending on their SMTP reply codes, so a transient `4xx` such
+    as `421 try again later` defers the message, while a permanent `5xx`
+    such as `550 mailbox does not exist` fails it. If every recipient was
+    refused, the message is deferred if any of them might be accepted later.
+    """
+    if not isinstance(error, RETRYABLE_ERRORS):
+        return False
+    if not isinstance(error, MESSAGE_ERRORS):
+        return True
+    codes = get_smtp_codes(error)
+    return not codes or any(get_smtp_action(code) == DEFER for code in codes)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from email_relay.conf import app_settings
+
+try:
+    import requests
+except ImportError:  # pragma: no cover
+    requests = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+
+class Healthcheck:
+    """Ping `RELAY_HEALTHCHECK_URL` from a background thread.
+
+    The relay loop calls `beat` as it makes progress, and a ping is only sent
+    every `RELAY_HEALTHCHECK_INTERVAL` seconds if the loop has beaten within
+    the last `RELAY_HEALTHCHECK_MAX_LOOP_SECONDS`. A relay that is stuck stops
+    pinging, so the monitoring service alerts, while a slow monitoring service
+    never holds up sending emails.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.last_beat: float | None = None
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    @property
+    def max_loop_seconds(self) -> float:
+        if app_settings.RELAY_HEALTHCHECK_MAX_LOOP_SECONDS is not None:
+            return app_settings.RELAY_HEALTHCHECK_MAX_LOOP_SECONDS
+        return 2 * max(
+            app_settings.RELAY_HEALTHCHECK_INTERVAL, app_settings.EMPTY_QUEUE_SLEEP
+        )
+
+    def beat(self) -> None:
+        self.last_beat = time.monotonic()
+
+    def is_alive(self) -> bool:
+        return (
+            self.last_beat is not None
+            and time.monotonic() - self.last_beat <= self.max_loop_seconds
+        )
+
+    def ping(self) -> bool:
+        """Ping the healthcheck URL if the relay loop is alive.
+
+        Returns:
+            bool: Whether the ping was sent and got the expected status code.
+        """
+        url = app_settings.RELAY_HEALTHCHECK_URL
+        if url is None:
+            # Unset by a settings reload since the healthcheck was started.
+            return False
+
+        if not self.is_alive():
+            logger.warning(
+                "relay loop has not completed in the last %s seconds, "
+                "skipping healthcheck ping",
+                self.max_loop_seconds,
+            )
+            return False
+
+        logger.debug("pinging healthcheck")
+        try:
+            response = self.session.request(
+                method=app_settings.RELAY_HEALTHCHECK_METHOD,
+                url=url,
+                timeout=app_settings.RELAY_HEALTHCHECK_TIMEOUT,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning("healthcheck failed, got exception: %s", e)
+            return False
+
+        if response.status_code != app_settings.RELAY_HEALTHCHECK_STATUS_CODE:
+            logger.warning(
+                "healthcheck failed, got %s, expected %s",
+                response.status_code,
+                app_settings.RELAY_HEALTHCHECK_STATUS_CODE,
+            )
+            return False
+
+        logger.debug("healthcheck ping successful")
+        return True
+
+    def run(self) -> None:
+        while not self.stopping.wait(app_settings.RELAY_HEALTHCHECK_INTERVAL):
+            try:
+                self.ping()
+            except Exception:
+                logger.exception("unexpected error pinging healthcheck")
+
+    def start(self) -> None:
+        self.thread = threading.Thread(
+            target=self.run, name="relay-healthcheck", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.session.close()
+
+
+def get_healthcheck() -> Healthcheck | None:
+    """Get a healthcheck for the relay loop, if enabled.
+
+    Returns:
+        Healthcheck | None: The healthcheck, or `None` if
+            `RELAY_HEALTHCHECK_URL` is not set or `requests` is not installed.
+    """
+    if app_settings.RELAY_HEALTHCHECK_URL is None:
+        return None
+
+    if requests is None:
+        logger.warning(
+            "Healthcheck URL configured but requests is not installed. "
+            "Please install requests to use the healthcheck feature."
+        )
+        return None
+
+    return Healthcheck()
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import contextlib
+import time
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Sequence
+from contextlib import AbstractContextManager
+from typing import TYPE_CHECKING
+
+from django.utils.module_loading import import_string
+
+from email_relay.conf import app_settings
+
+if TYPE_CHECKING:
+    from email_relay.models import Message
+
+NULL_STAGE: AbstractContextManager[None] = contextlib.nullcontext()
+
+
+class RelayObserver:
+    """Hooks into the relay and email backend, doing nothing by default.
+
+    Subclass and override the methods you are interested in, then add the
+    dotted path of the subclass to the `RELAY_OBSERVERS` setting. Observers are
+    instantiated once per process with no arguments.
+
+    Stages timed by `stage` are:
+
+    - `serialize`: converting an `EmailMessage` to a `Message` in the backend.
+    - `insert`: inserting the new messages into the database in the backend.
+    - `claim`: fetching a batch of messages, and locking each one to send.
+    - `render`: converting a `Message` back to an `EmailMessage`.
+    - `send`: handing an email to the relay's email backend, or a batch of
+      emails without a `message` if the backend sends them all at once.
+    - `ack`: recording the outcome of sending a message.
+    """
+
+    def stage(
+        self, name: str, message: Message | None = None
+    ) -> AbstractContextManager[None]:
+        return NULL_STAGE
+
+    def messages_serialized(self, messages: Sequence[Message]) -> None:
+        """Called by the email backend before the new messages are inserted."""
+
+    def batch_claimed(self, messages: Sequence[Message]) -> None:
+        pass
+
+    def message_sent(self, message: Message) -> None:
+        pass
+
+    def message_deferred(self, message: Message) -> None:
+        pass
+
+    def message_failed(self, message: Message) -> None:
+        pass
+
+    def messages_expired(self, count: int) -> None:
+        pass
+
+    def loop_completed(self, duration: float) -> None:
+        pass
+
+    def summary(self) -> str:
+        """Summarize what has been observed since the last summary.
+
+        Returns:
+            str: Appended to the relay's log line at the end of each loop,
+                unless empty.
+        """
+        return ""
+
+
+class StageTimer:
+    __slots__ = ("callback", "name", "started")
+
+    def __init__(self, name: str, callback: Callable[[str, float], None]):
+        self.name = name
+        self.callback = callback
+        self.started = 0.0
+
+    def __enter__(self) -> None:
+        self.started = time.monotonic()
+
+    def __exit__(self, *exc_info) -> None:
+        self.callback(self.name, time.monotonic() - self.started)
+
+
+class StageStatsObserver(RelayObserver):
+    """Aggregate how long each stage takes and how often it runs.
+
+    The aggregated stats are added to the relay's log line at the end of each
+    loop, then reset.
+    """
+
+    def __init__(self):
+        self.stats: dict[str, list[float]] = {}
+
+    def stage(
+        self, name: str, message: Message | None = None
+    ) -> AbstractContextManager[None]:
+        return StageTimer(name, self.record)
+
+    def record(self, name: str, duration: float) -> None:
+        stats = self.stats.get(name)
+        if stats is None:
+            self.stats[name] = [1, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+    def summary(self) -> str:
+        summary = ", ".join(
+            f"{name} {count:.0f}x avg {total / count * 1000:.1f}ms "
+            f"max {longest * 1000:.1f}ms"
+            for name, (count, total, longest) in self.stats.items()
+        )
+        self.stats = {}
+        return summary
+
+
+class CompositeObserver(RelayObserver):
+    def __init__(self, observers: Sequence[RelayObserver]):
+        self.observers = list(observers)
+
+    def stage(
+        self, name: str, message: Message | None = None
+    ) -> AbstractContextManager[None]:
+        return self._stages(name, message)
+
+    @contextlib.contextmanager
+    def _stages(self, name: str, message: Message | None) -> Iterator[None]:
+        with contextlib.ExitStack() as stack:
+            for observer in self.observers:
+                stack.enter_context(observer.stage(name, message))
+            yield
+
+    def messages_serialized(self, messages: Sequence[Message]) -> None:
+        for observer in self.observers:
+            observer.messages_serialized(messages)
+
+    def batch_claimed(self, messages: Sequence[Message]) -> None:
+        for observer in self.observers:
+            observer.batch_claimed(messages)
+
+    def message_sent(self, message: Message) -> None:
+        for observer in self.observers:
+            observer.message_sent(message)
+
+    def message_deferred(self, message: Message) -> None:
+        for observer in self.observers:
+            observer.message_deferred(message)
+
+    def message_failed(self, message: Message) -> None:
+        for observer in self.observers:
+            observer.message_failed(message)
+
+    def messages_expired(self, count: int) -> None:
+        for observer in self.observers:
+            observer.messages_expired(count)
+
+    def loop_completed(self, duration: float) -> None:
+        for observer in self.observers:
+            observer.loop_completed(duration)
+
+    def summary(self) -> str:
+        return ", ".join(
+            summary for observer in self.observers if (summary := observer.summary())
+        )
+
+
+NULL_OBSERVER = RelayObserver()
+
+_observers: dict[tuple[str, ...], RelayObserver] = {}
+
+
+def get_observer() -> RelayObserver:
+    """Get the process-wide observer for the configured `RELAY_OBSERVERS`.
+
+    Relay metrics are included when enabled. With nothing configured, a shared
+    no-op observer is returned.
+    """
+    from email_relay.metrics import get_metrics
+
+    paths = tuple(app_settings.RELAY_OBSERVERS or ())
+    metrics = get_metrics()
+    if not paths:
+        return metrics or NULL_OBSERVER
+
+    observer = _observers.get(paths)
+    if observer is None:
+        observer = _observers[paths] = _build_observer(paths)
+    if metrics is None:
+        return observer
+    return CompositeObserver([metrics, observer])
+
+
+def _build_observer(paths: tuple[str, ...]) -> RelayObserver:
+    observers = [import_string(path)() for path in paths]
+    if len(observers) == 1:
+        return observers[0]
+    return CompositeObserver(observers)
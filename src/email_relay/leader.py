@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import socket
+import time
+import uuid
+
+from django.db import IntegrityError
+from django.db import connections
+from django.db import router
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from email_relay.conf import app_settings
+from email_relay.models import Lease
+
+logger = logging.getLogger(__name__)
+
+LEADER_LEASE_NAME = "runrelay"
+
+
+class LeaderElection:
+    """Elect a single leader among a group of relay processes.
+
+    On PostgreSQL a session-level advisory lock is used, which the server
+    releases the moment the leader's connection drops. On any other database
+    a row in the `Lease` table is used instead, which a standby may take over
+    once the leader has stopped renewing it for `RELAY_LEADER_LEASE_SECONDS`.
+    """
+
+    def __init__(self, using: str | None = None, identity: str | None = None):
+        self.using = using or router.db_for_write(Lease)
+        self.identity = (
+            identity or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.is_leader = False
+        self._last_acquired: float | None = None
+
+    @property
+    def uses_advisory_lock(self) -> bool:
+        return connections[self.using].vendor == "postgresql"
+
+    def acquire(self) -> bool:
+        """Try to become (or remain) the leader.
+
+        Returns:
+            bool: Whether this process is the leader.
+        """
+        if self.uses_advisory_lock:
+            is_leader = self._acquire_advisory_lock()
+        else:
+            is_leader = self._acquire_lease()
+
+        if is_leader and not self.is_leader:
+            logger.info("acquired relay leadership as %s", self.identity)
+        elif not is_leader and self.is_leader:
+            logger.warning("lost relay leadership as %s", self.identity)
+
+        self.is_leader = is_leader
+        self._last_acquired = time.monotonic() if is_leader else None
+        return is_leader
+
+    def heartbeat(self) -> bool:
+        """Cheaply confirm leadership while a batch is being sent.
+
+        Only goes back to the database once a third of the lease has elapsed
+        since leadership was last confirmed.
+
+        Returns:
+            bool: Whether this process is still the leader.
+        """
+        if not self.is_leader or self._last_acquired is None:
+            return False
+        elapsed = time.monotonic() - self._last_acquired
+        if elapsed < app_settings.RELAY_LEADER_LEASE_SECONDS / 3:
+            return True
+        return self.acquire()
+
+    def release(self) -> None:
+        if not self.is_leader:
+            return
+
+        if self.uses_advisory_lock:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_unlock(%s)",
+                    [app_settings.RELAY_LEADER_LOCK_ID],
+                )
+        else:
+            Lease.objects.using(self.using).filter(
+                name=LEADER_LEASE_NAME, holder=self.identity
+            ).delete()
+
+        logger.info("released relay leadership as %s", self.identity)
+        self.is_leader = False
+        self._last_acquired = None
+
+    def _acquire_advisory_lock(self) -> bool:
+        lock_id = app_settings.RELAY_LEADER_LOCK_ID
+        with connections[self.using].cursor() as cursor:
+            if self.is_leader:
+                # A bigint advisory lock key is split across `classid` (high 32
+                # bits) and `objid` (low 32 bits), with `objsubid` set to 1.
+                cursor.execute(
+                    "SELECT EXISTS ("
+                    "SELECT 1 FROM pg_locks WHERE locktype = 'advisory' "
+                    "AND pid = pg_backend_pid() AND classid = %s AND objid = %s "
+                    "AND objsubid = 1 AND granted)",
+                    [lock_id >> 32, lock_id & 0xFFFFFFFF],
+                )
+                if cursor.fetchone()[0]:
+                    return True
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+            return bool(cursor.fetchone()[0])
+
+    def _acquire_lease(self) -> bool:
+        now = timezone.now()
+        expires_at = now + datetime.timedelta(
+            seconds=app_settings.RELAY_LEADER_LEASE_SECONDS
+        )
+        leases = Lease.objects.using(self.using)
+
+        renewed = (
+            leases.filter(name=LEADER_LEASE_NAME)
+            .filter(Q(holder=self.identity) | Q(expires_at__lte=now))
+            .update(holder=self.identity, expires_at=expires_at)
+        )
+        if renewed:
+            return True
+
+        try:
+            with transaction.atomic(using=self.using):
+                leases.create(
+                    name=LEADER_LEASE_NAME,
+                    holder=self.identity,
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            return False
+        return True
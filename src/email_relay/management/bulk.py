@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import abc
+import argparse
+import datetime
+
+from django.core.management import BaseCommand
+from django.core.management import CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_datetime
+
+from email_relay.models import BULK_CHUNK_SIZE
+from email_relay.models import Message
+from email_relay.models import MessageQuerySet
+from email_relay.models import Priority
+from email_relay.models import Status
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """Parse an ISO 8601 date or datetime, in the current time zone if naive."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            msg = f"{value!r} is not an ISO 8601 date or datetime"
+            raise argparse.ArgumentTypeError(msg)
+        parsed = datetime.datetime.combine(date, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class BulkMessageCommand(BaseCommand, abc.ABC):
+    """Base for commands that change every message matching a set of filters.
+
+    Subclasses set the statuses they act on by default and which of those
+    `--status` may pick from, and implement `apply` to run the change, which
+    should run one statement per chunk of messages rather than per message.
+    """
+
+    verb: str
+    past_verb: str
+    statuses: list[Status]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            dest="statuses",
+            choices=[status.label.lower() for status in self.statuses],
+            help=(
+                "Only messages with this status, which can be given more than "
+                "once. Defaults to "
+                f"{', '.join(status.label.lower() for status in self.statuses)}."
+            ),
+        )
+        parser.add_argument(
+            "--priority",
+            action="append",
+            dest="priorities",
+            choices=[priority.label.lower() for priority in Priority],
+            help="Only messages with this priority, which can be given more than once.",
+        )
+        parser.add_argument(
+            "--created-after",
+            type=parse_time,
+            help="Only messages created at or after this ISO 8601 date or datetime.",
+        )
+        parser.add_argument(
+            "--created-before",
+            type=parse_time,
+            help="Only messages created before this ISO 8601 date or datetime.",
+        )
+        parser.add_argument(
+            "--sender",
+            help="Only messages with a from address containing this text.",
+        )
+        parser.add_argument(
+            "--recipient",
+            help="Only messages with a To, Cc or Bcc address containing this text.",
+        )
+        parser.add_argument(
+            "--log-contains",
+            help="Only messages with a log containing this text, such as an error.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=BULK_CHUNK_SIZE,
+            help="Number of messages to change with each statement.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the matching messages without changing them.",
+        )
+
+    def handle(
+        self,
+        *args,
+        statuses: list[str] | None = None,
+        priorities: list[str] | None = None,
+        created_after: datetime.datetime | None = None,
+        created_before: datetime.datetime | None = None,
+        sender: str | None = None,
+        recipient: str | None = None,
+        log_contains: str | None = None,
+        chunk_size: int = BULK_CHUNK_SIZE,
+        dry_run: bool = False,
+        **options,
+    ) -> None:
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        queryset = Message.objects.matching(
+            statuses=[Status[status.upper()] for status in statuses]
+            if statuses
+            else self.statuses,
+            priorities=[Priority[priority.upper()] for priority in priorities]
+            if priorities
+            else None,
+            created_after=created_after,
+            created_before=created_before,
+            sender=sender,
+            recipient=recipient,
+            log=log_contains,
+        )
+
+        if dry_run:
+            self.stdout.write(f"would {self.verb} {queryset.count()} messages")
+            return
+
+        count = self.apply(queryset, chunk_size)
+        self.stdout.write(f"{self.past_verb} {count} messages")
+
+    @abc.abstractmethod
+    def apply(self, queryset: MessageQuerySet, chunk_size: int) -> int:
+        """Change the messages in chunks of `chunk_size`, returning how many."""
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from email_relay.management.bulk import BulkMessageCommand
+from email_relay.models import PENDING_STATUSES
+from email_relay.models import MessageQuerySet
+
+
+class Command(BulkMessageCommand):
+    help = "Cancel messages that are waiting to be sent, so they are not sent."
+
+    verb = "cancel"
+    past_verb = "cancelled"
+    statuses = PENDING_STATUSES
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--reason",
+            default="",
+            help="Reason for cancelling, saved in the log of each message.",
+        )
+
+    def handle(self, *args, reason: str = "", **options) -> None:
+        self.reason = reason
+        super().handle(*args, **options)
+
+    def apply(self, queryset: MessageQuerySet, chunk_size: int) -> int:
+        return queryset.cancel(log=self.reason, chunk_size=chunk_size)
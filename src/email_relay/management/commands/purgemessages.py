@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from email_relay.management.bulk import BulkMessageCommand
+from email_relay.models import FINISHED_STATUSES
+from email_relay.models import MessageQuerySet
+
+
+class Command(BulkMessageCommand):
+    help = "Delete sent, failed, expired or cancelled messages."
+
+    verb = "delete"
+    past_verb = "deleted"
+    statuses = FINISHED_STATUSES
+
+    def apply(self, queryset: MessageQuerySet, chunk_size: int) -> int:
+        return queryset.delete_in_chunks(chunk_size=chunk_size)
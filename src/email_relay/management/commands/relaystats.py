@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+from django.core.management import BaseCommand
+
+from email_relay.models import Priority
+from email_relay.models import Status
+from email_relay.stats import get_queue_stats
+
+
+class Command(BaseCommand):
+    help = "Show the number of messages in the relay database by status and priority."
+
+    def add_arguments(self, parser):
+        approximate = parser.add_mutually_exclusive_group()
+        approximate.add_argument(
+            "--approximate",
+            action="store_true",
+            default=None,
+            help="Use PostgreSQL's estimates instead of counting messages.",
+        )
+        approximate.add_argument(
+            "--exact",
+            action="store_false",
+            dest="approximate",
+            help="Count messages, even if QUEUE_STATS_APPROXIMATE is set.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Ignore cached results from QUEUE_STATS_CACHE_SECONDS.",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            dest="as_json",
+            help="Output the results as JSON.",
+        )
+
+    def handle(
+        self,
+        *args,
+        approximate: bool | None = None,
+        no_cache: bool = False,
+        as_json: bool = False,
+        **options,
+    ) -> None:
+        stats = get_queue_stats(
+            approximate=approximate, cache_seconds=0 if no_cache else None
+        )
+
+        if as_json:
+            self.stdout.write(json.dumps(stats.to_dict(), indent=2))
+            return
+
+        columns = [priority.label.lower() for priority in Priority] + ["total"]
+        width = max(len(status.label) for status in Status)
+        self.stdout.write(
+            " ".join([" " * width] + [f"{column:>10}" for column in columns])
+        )
+        for status in Status:
+            counts = [stats.count(status, priority) for priority in Priority]
+            counts.append(stats.count(status))
+            self.stdout.write(
+                " ".join(
+                    [f"{status.label.lower():<{width}}"]
+                    + [f"{count:>10}" for count in counts]
+                )
+            )
+        self.stdout.write(
+            f"{stats.count()} messages"
+            f"{' (approximate)' if stats.approximate else ''}"
+            f" as of {stats.collected_at.isoformat()}"
+        )
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from email_relay.management.bulk import BulkMessageCommand
+from email_relay.models import REQUEUEABLE_STATUSES
+from email_relay.models import MessageQuerySet
+
+
+class Command(BulkMessageCommand):
+    help = "Queue deferred, failed, expired or cancelled messages to be sent again."
+
+    verb = "requeue"
+    past_verb = "requeued"
+    statuses = REQUEUEABLE_STATUSES
+
+    def apply(self, queryset: MessageQuerySet, chunk_size: int) -> int:
+        return queryset.requeue(chunk_size=chunk_size)
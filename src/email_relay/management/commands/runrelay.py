@@ -1,50 +1,209 @@
 from __future__ import annotations
 
 import datetime
+import importlib
 import logging
+import signal
+import threading
 import time
 
+from django.conf import settings
 from django.core.management import BaseCommand
+from django.core.management import CommandError
 from django.utils import timezone
 
+from email_relay.conf import EMAIL_RELAY_SETTINGS_NAME
+from email_relay.conf import AppSettings
 from email_relay.conf import app_settings
+from email_relay.healthcheck import get_healthcheck
+from email_relay.leader import LeaderElection
+from email_relay.metrics import get_metrics
 from email_relay.models import Message
 from email_relay.relay import send_all
 
-try:
-    import requests
-except ImportError:  # pragma: no cover
-    requests = None  # type: ignore[assignment]
-
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    def handle(self, *args, _loop_count: int | None = None, **options) -> None:
+    help = "Relay queued emails from the database to the configured email backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of relay worker processes to run under a supervisor.",
+        )
+
+    def handle(
+        self, *args, processes: int = 1, _loop_count: int | None = None, **options
+    ) -> None:
+        if processes < 1:
+            raise CommandError("--processes must be at least 1")
+
+        if processes == 1:
+            self.run_relay(_loop_count=_loop_count)
+            return
+
+        if app_settings.RELAY_LEADER_ELECTION:
+            raise CommandError(
+                "--processes cannot be used with RELAY_LEADER_ELECTION, "
+                "as only a single process may send emails at a time"
+            )
+
+        # Imported here as the supervisor needs `os.fork` and POSIX signals,
+        # which a single process does not.
+        from email_relay.supervisor import Supervisor
+
+        logger.info("starting relay supervisor with %s processes", processes)
+        Supervisor(target=self.run_worker, processes=processes).run()
+
+    def run_worker(self, index: int) -> None:
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            logger.info("worker %s stopping after current message", index)
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.run_relay(stopping=stopping, worker_index=index)
+
+    def run_relay(
+        self,
+        stopping: threading.Event | None = None,
+        worker_index: int = 0,
+        _loop_count: int | None = None,
+    ) -> None:
         # _loop_count is used to make testing a bit easier
         # it is not intended to be used in production
         loop_count = 0 if _loop_count is not None else None
+        stopping = stopping or threading.Event()
+        reloading = threading.Event()
 
-        logger.info("starting relay")
+        def reload(signum, frame):
+            reloading.set()
 
-        while True:
-            if Message.objects.messages_available_to_send():
-                send_all()
+        previous_reload_handler = None
+        if hasattr(signal, "SIGHUP") and (
+            threading.current_thread() is threading.main_thread()
+        ):
+            previous_reload_handler = signal.signal(signal.SIGHUP, reload)
+
+        logger.info("starting relay")
 
-            self.delete_old_messages()
-            self.ping_healthcheck()
+        metrics = get_metrics()
+        if metrics is not None:
+            # Each worker process serves its own metrics on consecutive ports.
+            metrics.start_server(port_offset=worker_index)
+
+        leader = LeaderElection() if app_settings.RELAY_LEADER_ELECTION else None
+
+        healthcheck = get_healthcheck()
+        if healthcheck is not None:
+            healthcheck.beat()
+            healthcheck.start()
+
+        def should_continue() -> bool:
+            if stopping.is_set():
+                return False
+            if healthcheck is not None:
+                # Sending a large batch can take longer than a healthcheck
+                # interval, so each sent message counts as the loop being alive.
+                healthcheck.beat()
+            return leader is None or leader.heartbeat()
+
+        try:
+            while not stopping.is_set():
+                if reloading.is_set():
+                    reloading.clear()
+                    self.reload_settings()
+
+                if leader is None or leader.acquire():
+                    self.release_scheduled_messages()
+                    send_all(should_continue=should_continue)
+
+                    self.delete_old_messages()
+                    sleep: float = app_settings.EMPTY_QUEUE_SLEEP
+                else:
+                    logger.debug("another relay is the leader, standing by")
+                    sleep = app_settings.RELAY_LEADER_POLL_SECONDS
+
+                if healthcheck is not None:
+                    healthcheck.beat()
+
+                msg = "loop complete"
+                if sleep > 0:
+                    msg += f", sleeping for {sleep} seconds before next loop"
+                logger.debug(msg)
+
+                if _loop_count is not None and loop_count is not None:
+                    loop_count += 1
+                    if loop_count >= _loop_count:
+                        break
+
+                self.wait(stopping, sleep, leader)
+        finally:
+            if healthcheck is not None:
+                healthcheck.stop()
+            if leader is not None:
+                leader.release()
+            if previous_reload_handler is not None:
+                signal.signal(signal.SIGHUP, previous_reload_handler)
+
+    def wait(
+        self,
+        stopping: threading.Event,
+        sleep: float,
+        leader: LeaderElection | None,
+    ) -> None:
+        """Wait `sleep` seconds before the next loop, or until stopping.
+
+        The leader keeps renewing its lease while it waits, as the sleep can
+        be longer than `RELAY_LEADER_LEASE_SECONDS`, and stops waiting early
+        if it loses leadership.
+        """
+        if leader is None or not leader.is_leader:
+            stopping.wait(sleep)
+            return
+
+        step = app_settings.RELAY_LEADER_LEASE_SECONDS / 3 or sleep
+        deadline = time.monotonic() + sleep
+        while (remaining := deadline - time.monotonic()) > 0:
+            if stopping.wait(min(remaining, step)) or not leader.heartbeat():
+                return
 
-            msg = "loop complete"
-            if app_settings.EMPTY_QUEUE_SLEEP > 0:
-                msg += f", sleeping for {app_settings.EMPTY_QUEUE_SLEEP} seconds before next loop"
-            logger.debug(msg)
+    def reload_settings(self) -> None:
+        """Re-read `DJANGO_EMAIL_RELAY` from the settings module, if there is one.
+
+        The new settings are validated before being applied, and the current
+        settings are kept if they are invalid or cannot be loaded.
+        """
+        current = getattr(settings, EMAIL_RELAY_SETTINGS_NAME, None)
+        try:
+            if settings.SETTINGS_MODULE:
+                module = importlib.reload(
+                    importlib.import_module(settings.SETTINGS_MODULE)
+                )
+                setattr(
+                    settings,
+                    EMAIL_RELAY_SETTINGS_NAME,
+                    getattr(module, EMAIL_RELAY_SETTINGS_NAME, {}),
+                )
+            AppSettings.from_settings()
+        except Exception:
+            logger.exception("could not reload settings, keeping current settings")
+            setattr(settings, EMAIL_RELAY_SETTINGS_NAME, current)
+            return
 
-            if _loop_count is not None and loop_count is not None:
-                loop_count += 1
-                if loop_count >= _loop_count:
-                    break
+        app_settings.reload()
+        logger.info("reloaded settings")
 
-            time.sleep(app_settings.EMPTY_QUEUE_SLEEP)
+    def release_scheduled_messages(self) -> None:
+        released_messages = Message.objects.release_scheduled_messages()
+        if released_messages:
+            logger.debug("released %s scheduled messages", released_messages)
 
     def delete_old_messages(self) -> None:
         if app_settings.MESSAGES_RETENTION_SECONDS is not None:
@@ -59,32 +218,3 @@ class Command(BaseCommand):
                     )
                 )
             logger.debug("deleted %s messages", deleted_messages)
-
-    def ping_healthcheck(self) -> None:
-        if app_settings.RELAY_HEALTHCHECK_URL is not None:
-            if requests is None:
-                logger.warning(
-                    "Healthcheck URL configured but requests is not installed. "
-                    "Please install requests to use the healthcheck feature."
-                )
-                return
-
-            logger.debug("pinging healthcheck")
-            try:
-                response = requests.request(
-                    method=app_settings.RELAY_HEALTHCHECK_METHOD,
-                    url=app_settings.RELAY_HEALTHCHECK_URL,
-                    timeout=app_settings.RELAY_HEALTHCHECK_TIMEOUT,
-                )
-            except requests.exceptions.RequestException as e:
-                logger.warning("healthcheck failed, got exception: %s", e)
-                return
-
-            if response.status_code == app_settings.RELAY_HEALTHCHECK_STATUS_CODE:
-                logger.debug("healthcheck ping successful")
-            else:
-                logger.warning(
-                    "healthcheck failed, got %s, expected %s",
-                    response.status_code,
-                    app_settings.RELAY_HEALTHCHECK_STATUS_CODE,
-                )
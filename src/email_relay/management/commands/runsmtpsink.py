@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import threading
+
+from django.core.management import BaseCommand
+from django.core.management import CommandError
+
+from email_relay.smtp_sink import SinkFaults
+from email_relay.smtp_sink import SMTPSink
+
+
+def parse_command_latency(value: str) -> tuple[str, float]:
+    command, _, seconds = value.partition("=")
+    try:
+        return command.upper(), float(seconds)
+    except ValueError as err:
+        raise CommandError(
+            f"--command-latency must be COMMAND=SECONDS, got {value!r}"
+        ) from err
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a local SMTP server that discards every message, with optional "
+        "latency and fault injection, for load testing the relay."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Host to bind to.")
+        parser.add_argument("--port", type=int, default=1025, help="Port to bind to.")
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds to wait before replying to each command.",
+        )
+        parser.add_argument(
+            "--command-latency",
+            action="append",
+            default=[],
+            metavar="COMMAND=SECONDS",
+            help="Seconds to wait before replying to a specific command, such as "
+            "DATA=0.5, instead of --latency. Can be repeated.",
+        )
+        parser.add_argument(
+            "--temporary-failure-rate",
+            type=float,
+            default=0.0,
+            help="Probability of replying to a message with a 4xx error.",
+        )
+        parser.add_argument(
+            "--permanent-failure-rate",
+            type=float,
+            default=0.0,
+            help="Probability of replying to a message with a 5xx error.",
+        )
+        parser.add_argument(
+            "--drop-rate",
+            type=float,
+            default=0.0,
+            help="Probability of dropping the connection on each command.",
+        )
+        parser.add_argument(
+            "--refuse-rate",
+            type=float,
+            default=0.0,
+            help="Probability of refusing each recipient.",
+        )
+        parser.add_argument(
+            "--seed", type=int, help="Seed for repeatable fault injection."
+        )
+        parser.add_argument(
+            "--report-interval",
+            type=float,
+            default=10.0,
+            help="Seconds between printing what the sink has received.",
+        )
+
+    def handle(
+        self,
+        *args,
+        host: str = "127.0.0.1",
+        port: int = 1025,
+        latency: float = 0.0,
+        command_latency: list[str] | None = None,
+        temporary_failure_rate: float = 0.0,
+        permanent_failure_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        refuse_rate: float = 0.0,
+        seed: int | None = None,
+        report_interval: float = 10.0,
+        _loop_count: int | None = None,
+        **options,
+    ) -> None:
+        faults = SinkFaults(
+            latency=latency,
+            command_latency=dict(
+                parse_command_latency(value) for value in command_latency or []
+            ),
+            temporary_failure_rate=temporary_failure_rate,
+            permanent_failure_rate=permanent_failure_rate,
+            drop_rate=drop_rate,
+            refuse_rate=refuse_rate,
+        )
+
+        # _loop_count is used to make testing a bit easier
+        # it is not intended to be used in production
+        loop_count = 0
+        stopping = threading.Event()
+
+        with SMTPSink(host=host, port=port, faults=faults, seed=seed) as sink:
+            self.stdout.write(f"SMTP sink listening on {sink.host}:{sink.port}")
+            try:
+                while not stopping.wait(report_interval):
+                    self.report(sink)
+                    loop_count += 1
+                    if _loop_count is not None and loop_count >= _loop_count:
+                        break
+            except KeyboardInterrupt:  # pragma: no cover
+                pass
+            self.report(sink)
+
+    def report(self, sink: SMTPSink) -> None:
+        stats = sink.stats()
+        self.stdout.write(
+            "{messages} messages ({messages_per_second}/s), "
+            "{recipients} recipients, {refused_recipients} refused recipients, "
+            "{temporary_failures} temporary failures, "
+            "{permanent_failures} permanent failures, "
+            "{dropped_connections} dropped connections, "
+            "{connections} connections".format(**stats)
+        )
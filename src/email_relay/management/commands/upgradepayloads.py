@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management import BaseCommand
+from django.core.management import CommandError
+
+from email_relay.models import Message
+from email_relay.payloads import needs_upgrade
+from email_relay.payloads import upgrade_payload
+
+
+class Command(BaseCommand):
+    help = "Rewrite messages with payloads from older versions in the current schema."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of messages to read and update at a time.",
+        )
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=0,
+            help="Only upgrade messages with a higher id, to resume a previous run.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to sleep between batches, to limit the load on the database.",
+        )
+
+    def handle(
+        self,
+        *args,
+        batch_size: int = 1000,
+        after_id: int = 0,
+        sleep: float = 0,
+        **options,
+    ) -> None:
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        upgraded = 0
+        last_id = after_id
+        while True:
+            # Each batch is read and updated on its own, so the command can be
+            # stopped at any point and resumed from the last id it reported.
+            batch = list(
+                Message.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "data")[:batch_size]
+            )
+            if not batch:
+                break
+
+            last_id = batch[-1].id
+            messages = [
+                message
+                for message in batch
+                if message.data and needs_upgrade(message.data)
+            ]
+            for message in messages:
+                message.data = upgrade_payload(message.data)
+            if messages:
+                Message.objects.bulk_update(messages, ["data"])
+            upgraded += len(messages)
+            self.stdout.write(f"upgraded {upgraded} messages, up to id {last_id}")
+
+            if sleep > 0:
+                time.sleep(sleep)
+
+        self.stdout.write(f"done, upgraded {upgraded} messages")
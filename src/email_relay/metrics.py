@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from contextlib import AbstractContextManager
+from typing import Any
+
+from email_relay.conf import app_settings
+from email_relay.instrumentation import NULL_STAGE
+from email_relay.instrumentation import RelayObserver
+from email_relay.instrumentation import StageTimer
+from email_relay.models import Message
+from email_relay.models import Priority
+from email_relay.models import Status
+from email_relay.stats import get_queue_stats
+
+try:
+    import prometheus_client
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover
+    prometheus_client = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+SEND_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LOOP_DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800)
+BATCH_SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+RETRY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25)
+
+
+class QueueDepthCollector:
+    """Report the number of messages by status and priority.
+
+    Counts come from `get_queue_stats`, following `QUEUE_STATS_APPROXIMATE`,
+    and are cached in-process for `RELAY_METRICS_CACHE_SECONDS`, so frequent
+    scrapes do not add load to the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: dict[tuple[int, int], int] = {}
+        self._fetched_at: float | None = None
+
+    def get_counts(self) -> dict[tuple[int, int], int]:
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._fetched_at is None
+                or now - self._fetched_at >= app_settings.RELAY_METRICS_CACHE_SECONDS
+            ):
+                self._counts = get_queue_stats(cache_seconds=0).counts
+                self._fetched_at = now
+            return self._counts
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "email_relay_queue_depth",
+            "Number of messages in the relay database by status and priority.",
+            labels=["status", "priority"],
+        )
+        counts = self.get_counts()
+        for status in Status:
+            for priority in Priority:
+                gauge.add_metric(
+                    [status.label.lower(), priority.label.lower()],
+                    counts.get((status.value, priority.value), 0),
+                )
+        yield gauge
+
+
+class RelayMetrics(RelayObserver):
+    def __init__(self, registry: Any = None):
+        if prometheus_client is None:  # pragma: no cover
+            raise RuntimeError("prometheus_client is required for relay metrics")
+
+        self.registry = registry or prometheus_client.CollectorRegistry()
+        self.queue_depth = QueueDepthCollector()
+        self.registry.register(self.queue_depth)
+
+        self.messages = prometheus_client.Counter(
+            "email_relay_messages",
+            "Number of messages processed by the relay, by outcome.",
+            labelnames=["outcome"],
+            registry=self.registry,
+        )
+        self.enqueue_to_send_seconds = prometheus_client.Histogram(
+            "email_relay_enqueue_to_send_seconds",
+            "Time from a message being queued to it being sent.",
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.send_duration_seconds = prometheus_client.Histogram(
+            "email_relay_send_duration_seconds",
+            "Time taken to hand a single message to the email backend.",
+            buckets=SEND_DURATION_BUCKETS,
+            registry=self.registry,
+        )
+        self.loop_duration_seconds = prometheus_client.Histogram(
+            "email_relay_loop_duration_seconds",
+            "Time taken to send a batch of messages.",
+            buckets=LOOP_DURATION_BUCKETS,
+            registry=self.registry,
+        )
+        self.batch_size = prometheus_client.Histogram(
+            "email_relay_batch_size",
+            "Number of messages claimed per batch.",
+            buckets=BATCH_SIZE_BUCKETS,
+            registry=self.registry,
+        )
+        self.retry_count = prometheus_client.Histogram(
+            "email_relay_retry_count",
+            "Number of times a message was deferred before it was sent or failed.",
+            buckets=RETRY_COUNT_BUCKETS,
+            registry=self.registry,
+        )
+
+    def stage(
+        self, name: str, message: Message | None = None
+    ) -> AbstractContextManager[None]:
+        if name == "send":
+            return StageTimer(name, self._observe_send_duration)
+        return NULL_STAGE
+
+    def _observe_send_duration(self, name: str, duration: float) -> None:
+        self.send_duration_seconds.observe(duration)
+
+    def batch_claimed(self, messages: Sequence[Message]) -> None:
+        self.batch_size.observe(len(messages))
+
+    def loop_completed(self, duration: float) -> None:
+        self.loop_duration_seconds.observe(duration)
+
+    def message_sent(self, message: Message) -> None:
+        self.messages.labels(outcome="sent").inc()
+        self.retry_count.observe(message.retry_count)
+        if message.sent_at is not None:
+            self.enqueue_to_send_seconds.observe(
+                (message.sent_at - message.created_at).total_seconds()
+            )
+
+    def message_deferred(self, message: Message) -> None:
+        self.messages.labels(outcome="deferred").inc()
+
+    def message_failed(self, message: Message) -> None:
+        self.messages.labels(outcome="failed").inc()
+        self.retry_count.observe(message.retry_count)
+
+    def messages_expired(self, count: int) -> None:
+        self.messages.labels(outcome="expired").inc(count)
+
+    def start_server(self, port_offset: int = 0) -> None:
+        port = app_settings.RELAY_METRICS_PORT
+        if port is None:
+            return
+        port += port_offset
+        prometheus_client.start_http_server(
+            port, addr=app_settings.RELAY_METRICS_ADDR, registry=self.registry
+        )
+        logger.info(
+            "serving metrics on %s:%s", app_settings.RELAY_METRICS_ADDR or "*", port
+        )
+
+
+_metrics: RelayMetrics | None = None
+
+
+def get_metrics() -> RelayMetrics | None:
+    """Get the process-wide relay metrics, if enabled.
+
+    Returns:
+        RelayMetrics | None: The metrics, or `None` if `RELAY_METRICS_PORT` is
+            not set or `prometheus_client` is not installed.
+    """
+    global _metrics
+
+    if app_settings.RELAY_METRICS_PORT is None:
+        return None
+
+    if prometheus_client is None:
+        logger.warning(
+            "Metrics port configured but prometheus_client is not installed. "
+            "Please install django-email-relay[metrics] to use the metrics feature."
+        )
+        return None
+
+    if _metrics is None:
+        _metrics = RelayMetrics()
+    return _metrics
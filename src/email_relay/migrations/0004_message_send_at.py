@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0003_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="send_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the message is scheduled to be sent, if not immediately.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (1, "Queued"),
+                    (2, "Deferred"),
+                    (3, "Failed"),
+                    (4, "Sent"),
+                    (5, "Scheduled"),
+                ],
+                default=1,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["status", "send_at"], name="email_relay_msg_status_send_at"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0004_message_send_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="expires_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the message should no longer be sent, if ever.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (1, "Queued"),
+                    (2, "Deferred"),
+                    (3, "Failed"),
+                    (4, "Sent"),
+                    (5, "Scheduled"),
+                    (6, "Expired"),
+                ],
+                default=1,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["status", "expires_at"], name="email_relay_msg_status_expires"
+            ),
+        ),
+    ]
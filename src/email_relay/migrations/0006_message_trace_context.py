@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0005_message_expires_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="trace_context",
+            field=models.JSONField(
+                blank=True,
+                help_text="Trace context propagated from where the message was queued.",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0006_message_trace_context"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["status", "priority"], name="email_relay_msg_status_prio"
+            ),
+        ),
+    ]
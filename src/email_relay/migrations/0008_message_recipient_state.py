@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0007_message_status_priority_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="recipient_state",
+            field=models.JSONField(
+                blank=True,
+                help_text=(
+                    "Recipients the message has been sent to, and recipients that "
+                    "have permanently failed, once any recipient has been refused."
+                ),
+                null=True,
+            ),
+        ),
+    ]
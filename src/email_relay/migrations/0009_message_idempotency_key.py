@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0008_message_recipient_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="idempotency_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Key to stop the message being queued more than once, if any.",
+                max_length=255,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0009_message_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="claimed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the relay service last started sending the message.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (1, "Queued"),
+                    (2, "Deferred"),
+                    (3, "Failed"),
+                    (4, "Sent"),
+                    (5, "Scheduled"),
+                    (6, "Expired"),
+                    (7, "Sending"),
+                ],
+                default=1,
+            ),
+        ),
+    ]
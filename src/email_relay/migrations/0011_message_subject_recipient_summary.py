@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0010_message_claimed_at_status_sending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="recipient_summary",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The email's To recipients, kept out of the data for listing messages.",
+                max_length=255,
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="subject",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="The email's subject, kept out of the data for listing messages.",
+                max_length=255,
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("email_relay", "0011_message_subject_recipient_summary"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="status",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (1, "Queued"),
+                    (2, "Deferred"),
+                    (3, "Failed"),
+                    (4, "Sent"),
+                    (5, "Scheduled"),
+                    (6, "Expired"),
+                    (7, "Sending"),
+                    (8, "Cancelled"),
+                ],
+                default=1,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_relay', '0012_message_status_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, help_text="Until when the message is reserved for a relay process's batch.", null=True),
+        ),
+    ]
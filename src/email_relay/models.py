@@ -2,15 +2,33 @@ from __future__ import annotations
 
 import datetime
 import logging
-from itertools import chain
+from collections import defaultdict
+from collections import deque
+from collections.abc import Collection
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sequence
 
 from django.core.mail import EmailMessage
 from django.core.mail import EmailMultiAlternatives
 from django.db import models
+from django.db import router
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Least
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 from email_relay.conf import app_settings
+from email_relay.email import IDEMPOTENCY_KEY_MAX_LENGTH
 from email_relay.email import RelayEmailData
+from email_relay.email import get_expires_at
+from email_relay.email import get_idempotency_key
+from email_relay.email import get_send_at
+from email_relay.email import normalize_address
+from email_relay.email import split_idempotency_key
+from email_relay.errors import DEFER
+from email_relay.payloads import upgrade_payload
 
 logger = logging.getLogger(__name__)
 
@@ -26,29 +44,289 @@ class Status(models.IntegerChoices):
     DEFERRED = 2, "Deferred"
     FAILED = 3, "Failed"
     SENT = 4, "Sent"
+    SCHEDULED = 5, "Scheduled"
+    EXPIRED = 6, "Expired"
+    SENDING = 7, "Sending"
+    CANCELLED = 8, "Cancelled"
+
+
+# Messages waiting to be sent, those that can be queued to be sent again, and
+# those the relay is done with.
+PENDING_STATUSES = [Status.QUEUED, Status.DEFERRED, Status.SCHEDULED]
+REQUEUEABLE_STATUSES = [
+    Status.DEFERRED,
+    Status.FAILED,
+    Status.EXPIRED,
+    Status.CANCELLED,
+]
+FINISHED_STATUSES = [Status.SENT, Status.FAILED, Status.EXPIRED, Status.CANCELLED]
+
+# The most messages bulk updates and deletes change in a single statement.
+BULK_CHUNK_SIZE = 1000
+
+SUBJECT_MAX_LENGTH = 255
+RECIPIENT_SUMMARY_MAX_LENGTH = 255
 
 
 class MessageManager(models.Manager["Message"]):
     def get_message_batch(self) -> list[Message]:
-        message_batch = list(
-            chain(
-                self.queued().prioritized(),  # type: ignore[attr-defined]
-                self.deferred().prioritized(),  # type: ignore[attr-defined]
+        """Fetch the next batch of messages to send, in a single query.
+
+        Queued messages come before deferred ones, each ordered by priority
+        and then age, up to `EMAIL_MAX_BATCH` messages. An empty batch means
+        there is nothing to send.
+        """
+        if app_settings.PRIORITY_WEIGHTS:
+            return self.get_weighted_message_batch()
+
+        message_batch = list(self.message_batch_queryset())
+        logger.debug("found %s messages to send", len(message_batch))
+        return message_batch
+
+    def message_batch_queryset(self, now: datetime.datetime | None = None):
+        """Query the next batch of messages to send, without priority weights.
+
+        Messages reserved by another relay process are left out until their
+        reservation runs out.
+        """
+        queryset = (
+            self.unreserved(now)  # type: ignore[attr-defined]
+            .filter(status__in=[Status.QUEUED, Status.DEFERRED])
+            .prioritized()
+            .alias(
+                status_order=models.Case(
+                    models.When(status=Status.QUEUED, then=models.Value(0)),
+                    default=models.Value(1),
+                )
             )
         )
-        logger.debug("found %s messages to send", len(message_batch))
+        queryset = queryset.order_by("status_order", *queryset.query.order_by)
         if app_settings.EMAIL_MAX_BATCH is not None:
-            msg = f"max batch size is {app_settings.EMAIL_MAX_BATCH}"
-            if len(message_batch) > app_settings.EMAIL_MAX_BATCH:
-                msg += ", truncating"
-            logger.debug(msg)
-            message_batch = message_batch[: app_settings.EMAIL_MAX_BATCH]
+            queryset = queryset[: app_settings.EMAIL_MAX_BATCH]
+        return queryset
+
+    def reserve_message_batch(
+        self, now: datetime.datetime | None = None
+    ) -> list[Message]:
+        """Fetch the next batch of messages to send and reserve it for this process.
+
+        The batch is locked with `SELECT ... FOR UPDATE SKIP LOCKED` and its
+        messages reserved until `EMAIL_SENDING_TIMEOUT_SECONDS` from now, so
+        relay processes running at the same time each get their own batch.
+        The reservation only spreads the work, each message is still locked
+        and claimed by `get_message_for_sending` before it is sent, and a
+        reservation left by a relay that stopped runs out on its own.
+
+        With `PRIORITY_WEIGHTS`, the batch is built from messages that are not
+        reserved, then only those that could be locked are kept. Messages
+        locked by another relay process are skipped and the batch refilled
+        from the rest, so processes starting at the same time do not end up
+        with empty batches while messages are waiting.
+        """
+        now = now or timezone.now()
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            if app_settings.PRIORITY_WEIGHTS:
+                max_batch = app_settings.EMAIL_MAX_BATCH
+                message_batch: list[Message] = []
+                picked: set[int] = set()
+                # Every candidate is picked at most once, so this stops once
+                # the batch is full or there is nothing left to pick.
+                while max_batch is None or len(message_batch) < max_batch:
+                    candidates = self.get_weighted_message_batch(now, exclude=picked)
+                    if max_batch is not None:
+                        candidates = candidates[: max_batch - len(message_batch)]
+                    if not candidates:
+                        break
+                    locked = set(
+                        self.using(using)
+                        .unreserved(now)  # type: ignore[attr-defined]
+                        .filter(
+                            id__in=[message.id for message in candidates],
+                            status__in=[Status.QUEUED, Status.DEFERRED],
+                        )
+                        .select_for_update(skip_locked=True)
+                        .values_list("id", flat=True)
+                    )
+                    message_batch += [
+                        message for message in candidates if message.id in locked
+                    ]
+                    if len(locked) == len(candidates):
+                        break
+                    picked.update(message.id for message in candidates)
+            else:
+                message_batch = list(
+                    self.db_manager(using)
+                    .message_batch_queryset(now)
+                    .select_for_update(skip_locked=True)
+                )
+                logger.debug("found %s messages to send", len(message_batch))
+
+            if message_batch:
+                reserved_until = now + datetime.timedelta(
+                    seconds=app_settings.EMAIL_SENDING_TIMEOUT_SECONDS
+                )
+                self.using(using).filter(
+                    id__in=[message.id for message in message_batch]
+                ).update(reserved_until=reserved_until)
+                for message in message_batch:
+                    message.reserved_until = reserved_until
+        return message_batch
+
+    def release_reservations(self, messages: Sequence[Message]) -> int:
+        """Release the reservation on messages this process did not get to."""
+        if not messages:
+            return 0
+        return self.filter(
+            id__in=[message.id for message in messages],
+            reserved_until__isnull=False,
+        ).update(reserved_until=None)
+
+    def get_weighted_message_batch(
+        self, now: datetime.datetime | None = None, exclude: Collection[int] = ()
+    ) -> list[Message]:
+        """Build a batch that shares its slots between priorities by weight.
+
+        Queued and deferred messages are grouped by their effective priority
+        and taken oldest first from each group using smooth weighted
+        round-robin, so every priority gets at least its share of the batch
+        while it has messages waiting, with any unused share going to the
+        others. Messages with ids in `exclude` are left out.
+        """
+        max_batch = app_settings.EMAIL_MAX_BATCH
+        weights = {
+            int(priority): int(weight)
+            for priority, weight in (app_settings.PRIORITY_WEIGHTS or {}).items()
+        }
+
+        queryset = (
+            self.unreserved(now)  # type: ignore[attr-defined]
+            .filter(status__in=[Status.QUEUED, Status.DEFERRED])
+            .with_effective_priority()
+        )
+        if exclude:
+            queryset = queryset.exclude(id__in=list(exclude))
+        if max_batch is not None:
+            # No priority can take more than the whole batch, so there is no
+            # need to fetch more than that from any one of them.
+            queryset = queryset.annotate(
+                priority_rank=models.Window(
+                    RowNumber(),
+                    partition_by=[models.F("effective_priority")],
+                    order_by=[models.F("created_at").asc(), models.F("id").asc()],
+                )
+            ).filter(priority_rank__lte=max_batch)
+
+        pending: dict[int, deque[Message]] = defaultdict(deque)
+        for message in queryset.order_by("created_at", "id"):
+            pending[message.effective_priority].append(message)
+        logger.debug("found %s messages to send", sum(len(q) for q in pending.values()))
+
+        message_batch: list[Message] = []
+        current = dict.fromkeys(pending, 0)
+        while pending and (max_batch is None or len(message_batch) < max_batch):
+            total = 0
+            for priority in pending:
+                current[priority] += weights.get(priority, 1)
+                total += weights.get(priority, 1)
+            chosen = max(pending, key=lambda priority: (current[priority], priority))
+            current[chosen] -= total
+            message_batch.append(pending[chosen].popleft())
+            if not pending[chosen]:
+                del pending[chosen]
+                del current[chosen]
+
         return message_batch
 
     def get_message_for_sending(self, message_id: int) -> Message:
-        return self.filter(id=message_id).select_for_update(skip_locked=True).get()
+        # Another relay process may have sent this message since the batch was
+        # fetched, so only lock it if it is still waiting to be sent.
+        return (
+            self.filter(id=message_id, status__in=[Status.QUEUED, Status.DEFERRED])
+            .select_for_update(skip_locked=True)
+            .get()
+        )
+
+    def claim_messages(
+        self, messages: Sequence[Message], now: datetime.datetime | None = None
+    ) -> None:
+        """Move messages that are about to be sent to `Status.SENDING`.
+
+        Once committed, a relay service that stops while sending leaves the
+        messages as sending, rather than queued to be sent again, until they
+        are reconciled by `reconcile_sending_messages`.
+        """
+        now = now or timezone.now()
+        self.filter(id__in=[message.id for message in messages]).update(
+            status=Status.SENDING, claimed_at=now, reserved_until=None, updated_at=now
+        )
+        for message in messages:
+            message.status = Status.SENDING
+            message.claimed_at = now
+            message.reserved_until = None
+
+    def reconcile_sending_messages(self, now: datetime.datetime | None = None) -> int:
+        """Resolve messages left sending for longer than `EMAIL_SENDING_TIMEOUT_SECONDS`.
+
+        These were being sent by a relay service that stopped before it could
+        record whether they were sent, so they may or may not have been. By
+        default, they are marked as failed so they are not sent twice. With
+        `EMAIL_STALE_SENDING_ACTION` set to `"defer"`, they are deferred to be
+        sent again instead.
+        """
+        now = now or timezone.now()
+        log = "relay service stopped while sending, message may have been sent"
+        stale = self.filter(
+            status=Status.SENDING,
+            claimed_at__lte=now
+            - datetime.timedelta(seconds=app_settings.EMAIL_SENDING_TIMEOUT_SECONDS),
+        )
+        if app_settings.EMAIL_STALE_SENDING_ACTION == DEFER:
+            return stale.update(
+                status=Status.DEFERRED,
+                retry_count=models.F("retry_count") + 1,
+                log=log,
+                updated_at=now,
+            )
+        return stale.update(status=Status.FAILED, log=log, updated_at=now)
+
+    def release_scheduled_messages(self, now: datetime.datetime | None = None) -> int:
+        now = now or timezone.now()
+        return self.scheduled_before(now).update(  # type: ignore[attr-defined]
+            status=Status.QUEUED, updated_at=now
+        )
+
+    def expire_messages(self, now: datetime.datetime | None = None) -> int:
+        """Move messages that are past their expiry to `Status.EXPIRED`.
+
+        A message expires at its own `expires_at`, if it has one, or otherwise
+        once it has been waiting longer than the `MESSAGES_TTL_SECONDS`
+        configured for its priority, counting from when it was scheduled to
+        be sent or, if it was not scheduled, when it was created.
+        """
+        now = now or timezone.now()
+
+        expired = models.Q(
+            status__in=[Status.QUEUED, Status.DEFERRED, Status.SCHEDULED],
+            expires_at__lte=now,
+        )
+        for priority, ttl_seconds in (app_settings.MESSAGES_TTL_SECONDS or {}).items():
+            expired |= models.Q(
+                status__in=[Status.QUEUED, Status.DEFERRED],
+                expires_at__isnull=True,
+                priority=int(priority),
+                available_at__lte=now - datetime.timedelta(seconds=ttl_seconds),
+            )
+
+        return (
+            self.alias(available_at=Coalesce("send_at", "created_at"))
+            .filter(expired)
+            .update(status=Status.EXPIRED, updated_at=now)
+        )
 
     def messages_available_to_send(self) -> bool:
+        # The relay no longer calls this, as an empty batch from
+        # `get_message_batch` tells it the same thing in one query.
         return self.queued().exists() or self.deferred().exists()  # type: ignore[attr-defined]
 
     def delete_all_sent_messages(self) -> int:
@@ -60,8 +338,43 @@ class MessageManager(models.Manager["Message"]):
 
 class MessageQuerySet(models.QuerySet["Message"]):
     def prioritized(self):
+        if app_settings.PRIORITY_AGING_SECONDS:
+            return self.with_effective_priority().order_by(
+                "-effective_priority", "created_at"
+            )
         return self.order_by("-priority", "created_at")
 
+    def with_effective_priority(self, now: datetime.datetime | None = None):
+        """Annotate each message with its priority after aging.
+
+        With `PRIORITY_AGING_SECONDS` set, a message is promoted one priority
+        for every interval it has been waiting, up to `Priority.HIGH`.
+        Otherwise, the effective priority is the message's own priority.
+        """
+        aging_seconds = app_settings.PRIORITY_AGING_SECONDS
+        if not aging_seconds:
+            return self.annotate(effective_priority=models.F("priority"))
+
+        now = now or timezone.now()
+        max_promotions = Priority.HIGH - Priority.LOW
+        return self.annotate(
+            effective_priority=models.Case(
+                *[
+                    models.When(
+                        created_at__lte=now
+                        - datetime.timedelta(seconds=aging_seconds * promotions),
+                        then=Least(
+                            models.F("priority") + promotions,
+                            models.Value(Priority.HIGH),
+                        ),
+                    )
+                    for promotions in range(max_promotions, 0, -1)
+                ],
+                default=models.F("priority"),
+                output_field=models.PositiveSmallIntegerField(),
+            )
+        )
+
     def high_priority(self):
         return self.filter(priority=Priority.HIGH)
 
@@ -86,6 +399,164 @@ class MessageQuerySet(models.QuerySet["Message"]):
     def sent_before(self, dt: datetime.datetime):
         return self.sent().filter(sent_at__lte=dt)
 
+    def scheduled(self):
+        return self.filter(status=Status.SCHEDULED)
+
+    def expired(self):
+        return self.filter(status=Status.EXPIRED)
+
+    def scheduled_before(self, dt: datetime.datetime):
+        return self.scheduled().filter(send_at__lte=dt)
+
+    def cancelled(self):
+        return self.filter(status=Status.CANCELLED)
+
+    def unreserved(self, now: datetime.datetime | None = None):
+        """Messages not reserved by a relay process for a batch it is sending."""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(reserved_until__isnull=True) | models.Q(reserved_until__lte=now)
+        )
+
+    def matching(
+        self,
+        statuses: Iterable[int] | None = None,
+        priorities: Iterable[int] | None = None,
+        created_after: datetime.datetime | None = None,
+        created_before: datetime.datetime | None = None,
+        sender: str | None = None,
+        recipient: str | None = None,
+        log: str | None = None,
+    ):
+        """Filter messages for a bulk operation, ignoring filters left as `None`.
+
+        Args:
+            statuses (Iterable[int] | None): Any of these statuses.
+            priorities (Iterable[int] | None): Any of these priorities.
+            created_after (datetime.datetime | None): Created at or after this time.
+            created_before (datetime.datetime | None): Created before this time.
+            sender (str | None): Text in the from address, such as a domain.
+            recipient (str | None): Text in a To, Cc or Bcc address.
+            log (str | None): Text in the log, such as an error from sending.
+        """
+        queryset = self
+        if statuses is not None:
+            queryset = queryset.filter(status__in=list(statuses))
+        if priorities is not None:
+            queryset = queryset.filter(priority__in=list(priorities))
+        if created_after is not None:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before is not None:
+            queryset = queryset.filter(created_at__lt=created_before)
+        if sender is not None:
+            queryset = queryset.filter(data__from_email__icontains=sender)
+        if recipient is not None:
+            queryset = queryset.filter(
+                models.Q(data__to__icontains=recipient)
+                | models.Q(data__cc__icontains=recipient)
+                | models.Q(data__bcc__icontains=recipient)
+            )
+        if log is not None:
+            queryset = queryset.filter(log__icontains=log)
+        return queryset
+
+    def requeue(self, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Queue deferred, failed, expired and cancelled messages to be sent again.
+
+        They are sent as if they were new: their retries are reset, recipients
+        that failed are tried again, an expiry that has passed is cleared and
+        any `MESSAGES_TTL_SECONDS` counts from now. Messages scheduled to be
+        sent later, such as a cancelled scheduled message, are scheduled again.
+        """
+        now = timezone.now()
+        requeueable = self.filter(status__in=REQUEUEABLE_STATUSES)
+
+        # Which recipients failed is kept in JSON, which can only be changed
+        # portably by reading it back, so only messages with any are read.
+        with_recipient_state = requeueable.filter(recipient_state__isnull=False)
+        for ids in with_recipient_state._id_chunks(chunk_size):
+            messages: list[Message] = list(
+                with_recipient_state.filter(id__in=ids).only("id", "recipient_state")
+            )
+            for message in messages:
+                message.recipient_state = {
+                    **(message.recipient_state or {}),
+                    "failed": {},
+                }
+            Message.objects.bulk_update(messages, ["recipient_state"])
+
+        scheduled = models.Q(send_at__gt=now)
+        return requeueable.update_in_chunks(
+            chunk_size,
+            status=models.Case(
+                models.When(scheduled, then=models.Value(Status.SCHEDULED)),
+                default=models.Value(Status.QUEUED),
+                output_field=models.PositiveSmallIntegerField(),
+            ),
+            send_at=models.Case(
+                models.When(scheduled, then=models.F("send_at")),
+                default=models.Value(now),
+                output_field=models.DateTimeField(),
+            ),
+            expires_at=models.Case(
+                models.When(expires_at__lte=now, then=models.Value(None)),
+                default=models.F("expires_at"),
+                output_field=models.DateTimeField(),
+            ),
+            retry_count=0,
+            log="",
+            updated_at=now,
+        )
+
+    def fail(self, log: str = "", chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Mark messages that are waiting to be sent as failed."""
+        return self.filter(status__in=PENDING_STATUSES).update_in_chunks(
+            chunk_size, status=Status.FAILED, log=log
+        )
+
+    def cancel(self, log: str = "", chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Mark messages that are waiting to be sent as cancelled."""
+        return self.filter(status__in=PENDING_STATUSES).update_in_chunks(
+            chunk_size, status=Status.CANCELLED, log=log
+        )
+
+    def update_in_chunks(self, chunk_size: int = BULK_CHUNK_SIZE, **values) -> int:
+        """Update the messages with an `UPDATE` per chunk of `chunk_size` ids.
+
+        Each chunk is committed on its own, so updating a large number of
+        messages does not lock them all in one long transaction. Each
+        statement keeps the filters of the queryset, so messages that stop
+        matching after their ids are read, such as a queued message the relay
+        has just claimed for sending, are left alone.
+        """
+        values.setdefault("updated_at", timezone.now())
+        return sum(
+            self.filter(id__in=ids).update(**values)
+            for ids in self._id_chunks(chunk_size)
+        )
+
+    def delete_in_chunks(self, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """Delete the messages with a `DELETE` per chunk of `chunk_size` ids.
+
+        Like `update_in_chunks`, each statement keeps the filters of the
+        queryset.
+        """
+        return sum(
+            self.filter(id__in=ids).delete()[0] for ids in self._id_chunks(chunk_size)
+        )
+
+    def _id_chunks(self, chunk_size: int) -> Iterator[list[int]]:
+        # Walking the ids in order, rather than taking the first chunk of
+        # what is left each time, keeps going past rows that stop matching.
+        queryset = self.order_by("id").values_list("id", flat=True)
+        last_id = 0
+        while True:
+            ids = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if not ids:
+                return
+            last_id = ids[-1]
+            yield ids
+
 
 # This is a workaround to make `mypy` happy
 _MessageManager = MessageManager.from_queryset(MessageQuerySet)
@@ -108,13 +579,78 @@ class Message(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
     sent_at = models.DateTimeField(null=True, blank=True)
+    send_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the message is scheduled to be sent, if not immediately.",
+    )
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the message should no longer be sent, if ever.",
+    )
+    trace_context = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Trace context propagated from where the message was queued.",
+    )
+    subject = models.CharField(
+        max_length=SUBJECT_MAX_LENGTH,
+        blank=True,
+        default="",
+        help_text="The email's subject, kept out of the data for listing messages.",
+    )
+    recipient_summary = models.CharField(
+        max_length=RECIPIENT_SUMMARY_MAX_LENGTH,
+        blank=True,
+        default="",
+        help_text="The email's To recipients, kept out of the data for listing messages.",
+    )
+    idempotency_key = models.CharField(
+        max_length=IDEMPOTENCY_KEY_MAX_LENGTH,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Key to stop the message being queued more than once, if any.",
+    )
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the relay service last started sending the message.",
+    )
+    reserved_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Until when the message is reserved for a relay process's batch.",
+    )
+    recipient_state = models.JSONField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Recipients the message has been sent to, and recipients that have "
+            "permanently failed, once any recipient has been refused."
+        ),
+    )
 
     objects = _MessageManager()
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "send_at"], name="email_relay_msg_status_send_at"
+            ),
+            models.Index(
+                fields=["status", "expires_at"], name="email_relay_msg_status_expires"
+            ),
+            models.Index(
+                fields=["status", "priority"], name="email_relay_msg_status_prio"
+            ),
+        ]
 
     def __str__(self):
+        if self.subject or self.recipient_summary:
+            return f'{self.created_at} "{self.subject}" to {self.recipient_summary}'
         try:
             return f'{self.created_at} "{self.data["subject"]}" to {", ".join(self.data["to"])}'
         except Exception:
@@ -135,6 +671,15 @@ class Message(models.Model):
         self.sent_at = timezone.now()
         self.save()
 
+    def release(self):
+        """Put a message that was claimed but not sent back to be sent later.
+
+        No retry is counted, so a message that has not been retried before
+        goes back to the queue.
+        """
+        self.status = Status.DEFERRED if self.retry_count else Status.QUEUED
+        self.save()
+
     def defer(self, log: str = ""):
         self.status = Status.DEFERRED
         self.log = log
@@ -152,8 +697,98 @@ class Message(models.Model):
         if not data:
             return None
 
-        return RelayEmailData(**data).to_email_message()
+        email = RelayEmailData(**upgrade_payload(data)).to_email_message()
+        if self.recipient_state:
+            email.envelope_recipients = self.pending_recipients()
+        return email
 
     @email.setter
     def email(self, email_message: EmailMessage | EmailMultiAlternatives) -> None:
         self.data = RelayEmailData.from_email_message(email_message).to_dict()
+        self.send_at = get_send_at(email_message)
+        self.expires_at = get_expires_at(email_message)
+        self.idempotency_key = get_idempotency_key(email_message)
+        self.subject = truncate(str(email_message.subject), SUBJECT_MAX_LENGTH)
+        self.recipient_summary = truncate(
+            ", ".join(email_message.to), RECIPIENT_SUMMARY_MAX_LENGTH
+        )
+        if self.send_at is not None and self.send_at > timezone.now():
+            self.status = Status.SCHEDULED
+
+    @property
+    def recipients(self) -> list[str]:
+        data = upgrade_payload(self.data or {})
+        if data.get("envelope_recipients") is not None:
+            return data["envelope_recipients"]
+        return [*data.get("to", []), *data.get("cc", []), *data.get("bcc", [])]
+
+    def split(self, max_recipients: int | None) -> list[Message]:
+        """Split the message into messages to at most `max_recipients` each.
+
+        Each message is queued, sent and retried on its own, so several relay
+        services can send them at the same time.
+        """
+        data = self.data
+        if max_recipients is None or not data:
+            return [self]
+
+        emails = RelayEmailData(**data).split(max_recipients)
+        if len(emails) == 1:
+            return [self]
+
+        fields = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+        }
+        messages = []
+        for index, email in enumerate(emails):
+            message = Message(**{**fields, "data": email.to_dict()})
+            if self.idempotency_key is not None:
+                message.idempotency_key = split_idempotency_key(
+                    self.idempotency_key, index
+                )
+            messages.append(message)
+        return messages
+
+    def pending_recipients(self) -> list[str]:
+        """Get the recipients the message has not been sent to or failed for."""
+        state = self.recipient_state or {}
+        resolved = {
+            normalize_address(address)
+            for address in [*state.get("sent", []), *state.get("failed", {})]
+        }
+        return [
+            recipient
+            for recipient in self.recipients
+            if normalize_address(recipient) not in resolved
+        ]
+
+    def record_recipients(
+        self, sent: Iterable[str] = (), failed: dict[str, str] | None = None
+    ) -> None:
+        """Record recipients the message has been sent to or failed for.
+
+        Saved along with the message's status, such as by `defer`.
+        """
+        state = self.recipient_state or {"sent": [], "failed": {}}
+        state["sent"] = [*state["sent"], *sent]
+        state["failed"] = {**state["failed"], **(failed or {})}
+        self.recipient_state = state
+
+
+class Lease(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    holder = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+
+    objects: models.Manager[Lease] = models.Manager()
+
+    def __str__(self):
+        return f"{self.name} held by {self.holder} until {self.expires_at}"
+
+
+def truncate(value: str, max_length: int) -> str:
+    if len(value) <= max_length:
+        return value
+    return value[: max_length - 1] + "…"
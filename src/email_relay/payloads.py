@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from typing import Any
+
+VERSION_KEY = "_email_relay_version"
+
+PayloadUpgrader = Callable[[dict[str, Any]], dict[str, Any]]
+
+_upgraders: list[tuple[tuple[int, ...], str, PayloadUpgrader]] = []
+
+
+def parse_version(version: str | None) -> tuple[int, ...]:
+    """Parse a version such as `"0.6.0"` into a tuple that sorts by release.
+
+    Payloads written before `_email_relay_version` was added have no version,
+    which sorts before every release.
+    """
+    if not version:
+        return (0,)
+    return tuple(
+        int(match.group()) if (match := re.match(r"\d+", part)) else 0
+        for part in version.split(".")
+    )
+
+
+def register_upgrader(version: str) -> Callable[[PayloadUpgrader], PayloadUpgrader]:
+    """Register a function that upgrades payloads written before `version`.
+
+    The function takes the `Message.data` of an older payload and returns it
+    in the schema of `version`. Upgraders run in order of their versions, so
+    each only has to handle the schema of the one before it.
+    """
+
+    def decorator(upgrader: PayloadUpgrader) -> PayloadUpgrader:
+        _upgraders.append((parse_version(version), version, upgrader))
+        _upgraders.sort(key=lambda registered: registered[0])
+        return upgrader
+
+    return decorator
+
+
+def needs_upgrade(data: dict[str, Any]) -> bool:
+    """Whether a payload was written before the latest registered upgrader."""
+    if not _upgraders:
+        return False
+    return parse_version(data.get(VERSION_KEY)) < _upgraders[-1][0]
+
+
+def upgrade_payload(data: dict[str, Any]) -> dict[str, Any]:
+    """Upgrade a payload to the current schema with every upgrader it needs.
+
+    Payloads that are already current are returned as they are, so this is
+    cheap enough to run each time a message is read.
+    """
+    if not needs_upgrade(data):
+        return data
+
+    current = parse_version(data.get(VERSION_KEY))
+    data = dict(data)
+    for parsed, version, upgrader in _upgraders:
+        if current < parsed:
+            data = upgrader(data)
+            data[VERSION_KEY] = version
+    return data
+
+
+@register_upgrader("0.2.0")
+def upgrade_to_0_2_0(data: dict[str, Any]) -> dict[str, Any]:
+    """Upgrade a payload from before the schema followed Django's `EmailMessage`.
+
+    Changes:
+        - "message" is now "body"
+        - "recipient_list" is now "to"
+        - "html_message" is now a part of "alternatives", a list of tuples of (content, mimetype)
+
+    Adds:
+        - "cc"
+        - "bcc"
+        - "reply_to"
+        - "extra_headers"
+        - "alternatives"
+
+    Payloads written from 0.2.0 until `_email_relay_version` was added in 0.4.0
+    have no version either, but are already in this schema, so only the keys
+    from the old schema are changed.
+    """
+    if "message" in data:
+        data["body"] = data.pop("message")
+    if "recipient_list" in data:
+        data["to"] = data.pop("recipient_list")
+    data.setdefault("body", "")
+    for key in ("to", "cc", "bcc", "reply_to", "alternatives"):
+        data.setdefault(key, [])
+    data.setdefault("extra_headers", {})
+    html_message = data.pop("html_message", None)
+    if html_message:
+        data["alternatives"] = [*data["alternatives"], (html_message, "text/html")]
+    return data
@@ -0,0 +1,23 @@
+"""Pytest fixtures for testing against the relay's SMTP sink.
+
+Enable with `pytest_plugins = ["email_relay.pytest_plugin"]` in a `conftest.py`.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import pytest
+from django.test import override_settings
+
+from email_relay.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def smtp_sink() -> Iterator[SMTPSink]:
+    """Run an SMTP sink and point Django's SMTP email backend at it.
+
+    Faults can be changed through `smtp_sink.faults` during a test.
+    """
+    with SMTPSink(seed=0) as sink, override_settings(**sink.email_settings()):
+        yield sink
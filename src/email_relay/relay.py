@@ -1,91 +1,161 @@
 from __future__ import annotations
 
+import contextlib
 import logging
 import smtplib
 import time
+from collections.abc import Callable
+from collections.abc import Sequence
 
 from django.conf import settings
+from django.core.mail import EmailMessage
 from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import router
 from django.db import transaction
 
+from email_relay.breaker import CircuitBreaker
+from email_relay.breaker import CircuitBreakerOpen
+from email_relay.breaker import get_circuit_breaker
 from email_relay.conf import app_settings
+from email_relay.email import normalize_address
+from email_relay.errors import DEFER
+from email_relay.errors import FAIL
+from email_relay.errors import MESSAGE_ERRORS
+from email_relay.errors import get_smtp_action
+from email_relay.errors import is_retryable
+from email_relay.instrumentation import RelayObserver
+from email_relay.instrumentation import get_observer
 from email_relay.models import Message
+from email_relay.upstreams import get_upstream_pool
 
 logger = logging.getLogger(__name__)
 
 
-def send_all():
+def send_all(should_continue: Callable[[], bool] | None = None):
+    observer = get_observer()
+    started = time.monotonic()
+
+    breaker = get_circuit_breaker()
+    if breaker is not None and breaker.is_open:
+        logger.debug(
+            "circuit breaker open, not sending emails for another %.1f seconds",
+            breaker.remaining_seconds,
+        )
+        return
+
+    # Expired before the batch is fetched, so they do not take up its slots.
+    expired = Message.objects.expire_messages()
+    if expired:
+        logger.info("expired %s messages", expired)
+        observer.messages_expired(expired)
+
+    # Resolved on every loop, not only when there is something else to send,
+    # so they are not left sending on a quiet queue. Deferred ones can then
+    # go out in this batch.
+    reconciled = Message.objects.reconcile_sending_messages()
+    if reconciled:
+        logger.warning(
+            "%s messages were left sending by a relay that stopped, marked them as %s",
+            reconciled,
+            "deferred"
+            if app_settings.EMAIL_STALE_SENDING_ACTION == DEFER
+            else "failed",
+        )
+
+    # The batch doubles as the check for whether there is anything to send,
+    # so an idle relay only runs this query after expiring and reconciling
+    # messages. Reserving it keeps other relay processes to their own batches.
+    with observer.stage("claim"):
+        message_batch = Message.objects.reserve_message_batch()
+    observer.batch_claimed(message_batch)
+    if not message_batch:
+        logger.debug("no emails to send")
+        return
+
     logger.info("sending emails")
 
     counts = {
         "deferred": 0,
         "failed": 0,
         "sent": 0,
+        "skipped": 0,
     }
 
-    message_batch = Message.objects.get_message_batch()
+    # The claim and the outcomes must be committed on the relay's database,
+    # which is not necessarily the default one.
+    using = router.db_for_write(Message)
+    connection: BaseEmailBackend | None = None
+    batch_size = app_settings.EMAIL_SEND_BATCH_SIZE or 1
 
-    connection = None
+    offset = 0
+    while offset < len(message_batch):
+        if should_continue is not None and not should_continue():
+            logger.warning("relay asked to stop, leaving remaining messages queued")
+            break
 
-    for message in message_batch:
-        with transaction.atomic():
-            try:
-                message = Message.objects.get_message_for_sending(message.id)
-            except Message.DoesNotExist:
-                continue
-            try:
-                if connection is None:
-                    relay_email_backend = getattr(
-                        settings,
-                        "EMAIL_BACKEND",
-                        "django.core.mail.backends.smtp.EmailBackend",
-                    )
-                    connection = get_connection(backend=relay_email_backend)
-                email = message.email
-                if email is not None:
-                    email.connection = connection
-                    email.send()
-                    logger.debug("sent message %s", message.id)
-                    message.mark_sent()
-                    counts["sent"] += 1
-                else:
+        if breaker is not None and breaker.is_open:
+            logger.warning("circuit breaker open, leaving remaining messages queued")
+            break
+
+        # While half-open, the circuit breaker lets a single message through
+        # to check whether the email backend is back.
+        size = 1 if breaker is not None and breaker.is_half_open else batch_size
+        chunk = message_batch[offset : offset + size]
+        offset += size
+
+        with transaction.atomic(using=using):
+            messages: list[Message] = []
+            emails: list[EmailMessage] = []
+            for message in chunk:
+                try:
+                    with observer.stage("claim", message):
+                        message = Message.objects.get_message_for_sending(message.id)
+                except Message.DoesNotExist:
+                    continue
+                try:
+                    with observer.stage("render", message):
+                        email = message.email
+                except Exception as err:
+                    counts[record_result(message, err, observer)] += 1
+                    continue
+                if email is None:
                     msg = f"Message {message.id} has no email object"
-                    message.fail(log=msg)
+                    with observer.stage("ack", message):
+                        message.fail(log=msg)
                     counts["failed"] += 1
+                    observer.message_failed(message)
                     logger.warning(msg)
-            except (
-                smtplib.SMTPAuthenticationError,
-                smtplib.SMTPDataError,
-                smtplib.SMTPRecipientsRefused,
-                smtplib.SMTPSenderRefused,
-                OSError,
-            ) as err:
-                if (
-                    app_settings.EMAIL_MAX_RETRIES is not None
-                    and message.retry_count >= app_settings.EMAIL_MAX_RETRIES
-                ):
-                    logger.warning(
-                        "max retries reached, marking message %s as failed", message.id
-                    )
-                    message.fail(log=str(err))
-                    connection = None
-                    counts["failed"] += 1
                     continue
+                messages.append(message)
+                emails.append(email)
 
-                logger.debug(
-                    "deferring message %s due to %s", message.id, err, exc_info=True
-                )
-                message.defer(log=str(err))
-                connection = None
-                counts["deferred"] += 1
-            except Exception as err:
-                logger.exception(
-                    "unexpected error processing message %s, marking as failed.",
-                    message.id,
+            if not messages:
+                continue
+
+            # Committed before sending, so the messages are not sent again if
+            # the relay stops before recording the outcome, and no row locks
+            # are held while waiting on the email backend.
+            Message.objects.claim_messages(messages)
+
+        results: list[Exception | None]
+        try:
+            if connection is None:
+                connection = get_upstream_pool()
+            if connection is None:
+                relay_email_backend = getattr(
+                    settings,
+                    "EMAIL_BACKEND",
+                    "django.core.mail.backends.smtp.EmailBackend",
                 )
-                message.fail(log=str(err))
-                connection = None
-                counts["failed"] += 1
+                connection = get_connection(backend=relay_email_backend)
+            results = send_messages(connection, messages, emails, observer, breaker)
+        except Exception as err:
+            results = [err] * len(messages)
+
+        with transaction.atomic(using=using):
+            for message, result in zip(messages, results):
+                counts[record_result(message, result, observer)] += 1
 
         if (
             app_settings.EMAIL_MAX_DEFERRED is not None
@@ -104,9 +174,245 @@ def send_all():
             )
             time.sleep(app_settings.EMAIL_THROTTLE)
 
-    logger.info(
-        "sent %s emails, deferred %s emails, failed %s emails",
-        counts["sent"],
-        counts["deferred"],
-        counts["failed"],
+    # Messages claimed for sending are no longer reserved, so this only
+    # releases those left when the loop stopped early, or that failed to
+    # render, for any relay process to pick up.
+    Message.objects.release_reservations(message_batch)
+
+    observer.loop_completed(time.monotonic() - started)
+
+    if counts["skipped"]:
+        logger.warning(
+            "circuit breaker opened, left %s emails queued without retrying them",
+            counts["skipped"],
+        )
+
+    msg = "sent %s emails, deferred %s emails, failed %s emails"
+    args: list[object] = [counts["sent"], counts["deferred"], counts["failed"]]
+    summary = observer.summary()
+    if summary:
+        msg += " (%s)"
+        args.append(summary)
+    logger.info(msg, *args)
+
+
+def send_messages(
+    connection: BaseEmailBackend,
+    messages: Sequence[Message],
+    emails: Sequence[EmailMessage],
+    observer: RelayObserver,
+    breaker: CircuitBreaker | None = None,
+) -> list[Exception | None]:
+    """Send emails over a single connection, returning the outcome of each.
+
+    If the email backend has a `send_messages_with_results` method, the whole
+    batch is handed to it at once. It should take a list of emails and
+    return, for each email in the same order, `None` if it was sent or the
+    exception it failed with. Otherwise, each email is sent in turn over one
+    open connection, such as a single SMTP session.
+
+    Each outcome is recorded with the circuit breaker, if there is one. Once
+    it opens, the rest of the emails are not sent, with `CircuitBreakerOpen`
+    as their outcome.
+
+    Args:
+        connection (BaseEmailBackend): The email backend to send with.
+        messages (Sequence[Message]): The messages being sent.
+        emails (Sequence[EmailMessage]): The email for each message.
+        observer (RelayObserver): The observer to report the send stage to.
+        breaker (CircuitBreaker | None): The circuit breaker to record the
+            outcomes with.
+
+    Returns:
+        list[Exception | None]: The outcome of sending each email.
+    """
+    send_messages_with_results = getattr(connection, "send_messages_with_results", None)
+    if send_messages_with_results is not None:
+        with observer.stage("send"):
+            results = list(send_messages_with_results(list(emails)))
+        if len(results) != len(emails):
+            raise ValueError(
+                f"{type(connection).__name__}.send_messages_with_results returned "
+                f"{len(results)} results for {len(emails)} emails"
+            )
+        if breaker is not None:
+            for result in results:
+                breaker.record(result)
+        return results
+
+    results = []
+    try:
+        for message, email in zip(messages, emails):
+            if breaker is not None and breaker.is_open:
+                results.append(CircuitBreakerOpen())
+                continue
+            try:
+                # A no-op if the connection is already open, so every email
+                # in the batch shares it, reconnecting after an error.
+                connection.open()
+                email.connection = connection
+                with observer.stage("send", message):
+                    email.send()
+            except Exception as err:
+                results.append(err)
+                with contextlib.suppress(Exception):
+                    connection.close()
+            else:
+                results.append(None)
+            if breaker is not None:
+                breaker.record(results[-1])
+    finally:
+        connection.close()
+    return results
+
+
+def record_result(
+    message: Message, result: Exception | None, observer: RelayObserver
+) -> str:
+    """Mark a message as sent, deferred or failed from the outcome of sending it.
+
+    Messages that were not sent because the circuit breaker opened are left
+    as they are, without counting a retry. If only some recipients were
+    refused, the message is only deferred for the refused recipients worth
+    retrying, and is otherwise resolved by `resolve_recipients`.
+
+    Returns:
+        str: The outcome, one of `"sent"`, `"deferred"`, `"failed"` or
+            `"skipped"`.
+    """
+    if isinstance(result, CircuitBreakerOpen):
+        with observer.stage("ack", message):
+            message.release()
+        return "skipped"
+
+    if result is None and message.recipient_state:
+        message.record_recipients(sent=message.pending_recipients())
+        return resolve_recipients(message, observer)
+
+    if result is None:
+        logger.debug("sent message %s", message.id)
+        with observer.stage("ack", message):
+            message.mark_sent()
+        observer.message_sent(message)
+        return "sent"
+
+    if isinstance(result, smtplib.SMTPRecipientsRefused):
+        retry = record_refused_recipients(message, result)
+        if retry is not None and not retry:
+            return resolve_recipients(message, observer)
+        if retry:
+            # Only the recipients left to retry count towards deferring.
+            result = smtplib.SMTPRecipientsRefused(retry)
+
+    if not is_retryable(result):
+        if isinstance(result, MESSAGE_ERRORS):
+            logger.warning(
+                "permanent error sending message %s, marking as failed: %s",
+                message.id,
+                result,
+            )
+        else:
+            logger.error(
+                "unexpected error processing message %s, marking as failed.",
+                message.id,
+                exc_info=result,
+            )
+        with observer.stage("ack", message):
+            message.fail(log=str(result))
+        observer.message_failed(message)
+        return "failed"
+
+    if (
+        app_settings.EMAIL_MAX_RETRIES is not None
+        and message.retry_count >= app_settings.EMAIL_MAX_RETRIES
+    ):
+        logger.warning("max retries reached, marking message %s as failed", message.id)
+        with observer.stage("ack", message):
+            message.fail(log=str(result))
+        observer.message_failed(message)
+        return "failed"
+
+    logger.debug("deferring message %s due to %s", message.id, result, exc_info=result)
+    with observer.stage("ack", message):
+        message.defer(log=str(result))
+    observer.message_deferred(message)
+    return "deferred"
+
+
+def record_refused_recipients(
+    message: Message, error: smtplib.SMTPRecipientsRefused
+) -> dict[str, tuple[int, bytes]] | None:
+    """Record which recipients of a message were refused, and which were sent to.
+
+    Recipients missing from the error were accepted. Refused recipients with
+    a permanent SMTP reply code are recorded as failed, and the rest are left
+    to retry.
+
+    Returns:
+        dict[str, tuple[int, bytes]] | None: The refused recipients left to
+            retry, or `None` if none of the refused recipients could be
+            matched to the message's, in which case nothing is recorded.
+    """
+    refused = {
+        normalize_address(address): reply for address, reply in error.recipients.items()
+    }
+    pending = message.pending_recipients()
+    if not any(normalize_address(recipient) in refused for recipient in pending):
+        return None
+
+    sent = []
+    failed = {}
+    retry = {}
+    for recipient in pending:
+        reply = refused.get(normalize_address(recipient))
+        if reply is None:
+            sent.append(recipient)
+        elif get_smtp_action(reply[0]) == FAIL:
+            failed[recipient] = f"{reply[0]} {smtp_text(reply[1])}"
+        else:
+            retry[recipient] = reply
+
+    message.record_recipients(sent=sent, failed=failed)
+    if sent and (failed or retry):
+        logger.info(
+            "message %s sent to %s recipients, %s recipients failed, "
+            "%s recipients left to retry",
+            message.id,
+            len(sent),
+            len(failed),
+            len(retry),
+        )
+    return retry
+
+
+def resolve_recipients(message: Message, observer: RelayObserver) -> str:
+    """Mark a message with no recipients left to retry as sent or failed.
+
+    The message is sent if it was sent to any recipient, and failed if every
+    recipient failed.
+    """
+    state = message.recipient_state or {}
+    failed = state.get("failed", {})
+    log = "\n".join(f"{address}: {reply}" for address, reply in failed.items())
+
+    if state.get("sent"):
+        logger.debug("sent message %s", message.id)
+        message.log = log
+        with observer.stage("ack", message):
+            message.mark_sent()
+        observer.message_sent(message)
+        return "sent"
+
+    logger.warning(
+        "permanent error sending message %s, marking as failed: %s", message.id, log
     )
+    with observer.stage("ack", message):
+        message.fail(log=log)
+    observer.message_failed(message)
+    return "failed"
+
+
+def smtp_text(response: bytes | str) -> str:
+    if isinstance(response, bytes):
+        return response.decode("utf-8", "replace")
+    return response
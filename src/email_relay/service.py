@@ -169,15 +169,20 @@ def run_relay_service() -> int:
         description="Run the Django Email Relay service.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
-    # just here so we get a --help for testing
-    parser.parse_args()
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of relay worker processes to run under a supervisor.",
+    )
+    args = parser.parse_args()
     user_settings = get_user_settings_from_env()
     SETTINGS = merge_with_defaults(default_settings, user_settings)
     settings.configure(**SETTINGS)
     django.setup()
     call_command("migrate")
     print("Starting email relay service...")  # noqa: T201
-    call_command("runrelay")
+    call_command("runrelay", processes=args.processes)
     # should never get here, `runrelay` is an infinite loop
     # but if it does, exit with 0
     return 0
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import smtplib
+
+from django.conf import settings
+from django.core.mail.backends import smtp
+from django.core.mail.message import sanitize_address
+
+
+class EmailBackend(smtp.EmailBackend):
+    """Django's SMTP email backend, reporting every recipient that is refused.
+
+    Django's SMTP email backend only raises `SMTPRecipientsRefused` if every
+    recipient of an email is refused. If only some are, the email is sent to
+    the rest and the refused recipients are silently dropped. This backend
+    raises `SMTPRecipientsRefused` for the refused recipients after sending
+    to the rest, so the relay service can retry just those recipients.
+    """
+
+    def _send(self, email_message):
+        if not email_message.recipients():
+            return False
+        encoding = email_message.encoding or settings.DEFAULT_CHARSET
+        from_email = sanitize_address(email_message.from_email, encoding)
+        recipients = {
+            sanitize_address(addr, encoding): addr
+            for addr in email_message.recipients()
+        }
+        message = email_message.message()
+        try:
+            refused = self.connection.sendmail(  # type: ignore[union-attr]
+                from_email, list(recipients), message.as_bytes(linesep="\r\n")
+            )
+        except smtplib.SMTPRecipientsRefused as err:
+            refused = err.recipients
+        except smtplib.SMTPException:
+            if not self.fail_silently:
+                raise
+            return False
+        if refused and not self.fail_silently:
+            # Report the recipients as they were given, rather than as they
+            # were encoded for the SMTP server, so they can be matched up.
+            raise smtplib.SMTPRecipientsRefused(
+                {recipients.get(addr, addr): reply for addr, reply in refused.items()}
+            )
+        return not refused or len(refused) < len(recipients)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import random
+import socketserver
+import threading
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+
+@dataclass
+class SinkFaults:
+    """Faults for the SMTP sink to inject, changeable while it is running.
+
+    Rates are the probability, from `0` to `1`, of each fault happening.
+    `latency` is added before replying to every command, or
+    `command_latency` for the commands listed in it, such as `{"DATA": 0.5}`.
+    `refused_recipients` always refuses the recipients in it with their SMTP
+    reply code, such as `{"bounce@example.com": 550}`.
+    """
+
+    latency: float = 0.0
+    command_latency: dict[str, float] = field(default_factory=dict)
+    temporary_failure_rate: float = 0.0
+    permanent_failure_rate: float = 0.0
+    drop_rate: float = 0.0
+    refuse_rate: float = 0.0
+    refused_recipients: dict[str, int] = field(default_factory=dict)
+
+    def latency_for(self, command: str) -> float:
+        return self.command_latency.get(command, self.latency)
+
+
+@dataclass
+class SinkStats:
+    connections: int = 0
+    messages: int = 0
+    recipients: int = 0
+    refused_recipients: int = 0
+    temporary_failures: int = 0
+    permanent_failures: int = 0
+    dropped_connections: int = 0
+    bytes: int = 0
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    server: SMTPSinkServer
+
+    def handle(self) -> None:
+        self.server.count("connections")
+        self.recipients = 0
+        self.reply(220, "email-relay smtp sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().partition(" ")[0]
+            command = command.upper()
+
+            faults = self.server.faults
+            latency = faults.latency_for(command)
+            if latency > 0:
+                time.sleep(latency)
+            if command != "QUIT" and self.server.roll(faults.drop_rate):
+                self.server.count("dropped_connections")
+                return
+
+            if command == "EHLO":
+                self.reply(250, "email-relay", "8BITMIME", "SMTPUTF8")
+            elif command == "HELO":
+                self.reply(250, "email-relay")
+            elif command == "MAIL":
+                self.recipients = 0
+                self.reply(250, "OK")
+            elif command == "RCPT":
+                address = line.decode("ascii", "replace").partition("<")[2]
+                code = faults.refused_recipients.get(address.partition(">")[0])
+                if code is not None:
+                    self.server.count("refused_recipients")
+                    self.reply(code, "Recipient refused")
+                elif self.server.roll(faults.refuse_rate):
+                    self.server.count("refused_recipients")
+                    self.reply(550, "5.1.1 Mailbox unavailable")
+                else:
+                    self.recipients += 1
+                    self.reply(250, "OK")
+            elif command == "DATA":
+                if not self.recipients:
+                    self.reply(503, "5.5.1 No valid recipients")
+                    continue
+                self.reply(354, "End data with <CR><LF>.<CR><LF>")
+                size = self.read_data()
+                if self.server.roll(faults.temporary_failure_rate):
+                    self.server.count("temporary_failures")
+                    self.reply(451, "4.3.0 Temporary failure, try again later")
+                elif self.server.roll(faults.permanent_failure_rate):
+                    self.server.count("permanent_failures")
+                    self.reply(554, "5.3.0 Permanent failure")
+                else:
+                    self.server.record(self.recipients, size)
+                    self.reply(250, "OK")
+            elif command in ("RSET", "NOOP"):
+                self.reply(250, "OK")
+            elif command == "QUIT":
+                self.reply(221, "Bye")
+                return
+            else:
+                self.reply(502, "Command not implemented")
+
+    def read_data(self) -> int:
+        size = 0
+        for line in self.rfile:
+            if line == b".\r\n":
+                break
+            size += len(line)
+        return size
+
+    def reply(self, code: int, *lines: str) -> None:
+        *first, last = lines
+        response = "".join(f"{code}-{line}\r\n" for line in first)
+        response += f"{code} {last}\r\n"
+        self.wfile.write(response.encode("ascii"))
+
+
+class SMTPSinkServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        faults: SinkFaults | None = None,
+        seed: int | None = None,
+    ):
+        super().__init__(address, SMTPSinkHandler)
+        self.faults = faults or SinkFaults()
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)  # noqa: S311
+        self.stats = SinkStats()
+        self.started = time.monotonic()
+
+    def roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def count(self, stat: str) -> None:
+        with self.lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def record(self, recipients: int, size: int) -> None:
+        with self.lock:
+            self.stats.messages += 1
+            self.stats.recipients += recipients
+            self.stats.bytes += size
+
+
+class SMTPSink:
+    """A minimal SMTP server that accepts and discards every message.
+
+    Runs in a background thread, for testing, benchmarking and load testing
+    the relay against a real SMTP connection without delivering any email.
+    Use as a context manager, or call `start` and `stop`. Binding to port `0`
+    picks a free port, available as `port` once started.
+
+    Latency, failed deliveries, dropped connections and refused recipients can
+    be injected with `faults`, using `seed` to make them repeatable.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        faults: SinkFaults | None = None,
+        seed: int | None = None,
+    ):
+        self.host = host
+        self.port = port
+        self.faults = faults or SinkFaults()
+        self.seed = seed
+        self.server: SMTPSinkServer | None = None
+        self.thread: threading.Thread | None = None
+
+    def __enter__(self) -> SMTPSink:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    @property
+    def messages(self) -> int:
+        return self.server.stats.messages if self.server is not None else 0
+
+    def email_settings(self) -> dict[str, Any]:
+        """Get the Django settings to send email to the sink over SMTP."""
+        return {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": self.host,
+            "EMAIL_PORT": self.port,
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "EMAIL_USE_TLS": False,
+            "EMAIL_USE_SSL": False,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        """Get the counts recorded since the sink was started.
+
+        Returns:
+            dict[str, Any]: Each count, along with `seconds` since the sink
+                was started and accepted `messages_per_second`.
+        """
+        if self.server is None:
+            return asdict(SinkStats())
+        with self.server.lock:
+            stats: dict[str, Any] = asdict(self.server.stats)
+        seconds = time.monotonic() - self.server.started
+        stats["seconds"] = round(seconds, 3)
+        stats["messages_per_second"] = round(stats["messages"] / seconds, 2)
+        return stats
+
+    def start(self) -> None:
+        self.server = SMTPSinkServer((self.host, self.port), self.faults, self.seed)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="smtp-sink",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
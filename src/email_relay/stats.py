@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from django.core.cache import cache
+from django.db import connections
+from django.db import router
+from django.db.models import Count
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from email_relay.conf import app_settings
+from email_relay.models import Message
+from email_relay.models import Priority
+from email_relay.models import Status
+
+QUEUE_STATS_CACHE_KEY = "email_relay:queue_stats:{}"
+
+
+@dataclass(frozen=True)
+class QueueStats:
+    """Number of messages in the relay database by status and priority."""
+
+    counts: dict[tuple[int, int], int]
+    approximate: bool
+    collected_at: datetime.datetime
+
+    def count(self, status: int | None = None, priority: int | None = None) -> int:
+        return sum(
+            count
+            for (message_status, message_priority), count in self.counts.items()
+            if (status is None or message_status == status)
+            and (priority is None or message_priority == priority)
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "approximate": self.approximate,
+            "collected_at": self.collected_at.isoformat(),
+            "total": self.count(),
+            "statuses": {
+                status.label.lower(): {
+                    "total": self.count(status),
+                    **{
+                        priority.label.lower(): self.count(status, priority)
+                        for priority in Priority
+                    },
+                }
+                for status in Status
+            },
+        }
+
+
+def get_queue_stats(
+    approximate: bool | None = None, cache_seconds: float | None = None
+) -> QueueStats:
+    """Get the number of messages by status and priority.
+
+    Results are cached in Django's default cache for `QUEUE_STATS_CACHE_SECONDS`,
+    so dashboards and health checks polling frequently do not add load to the
+    database.
+
+    Args:
+        approximate (bool | None): Use the PostgreSQL query planner's estimates
+            instead of counting, falling back to counting on other databases or
+            if the table has not been analyzed. Defaults to
+            `QUEUE_STATS_APPROXIMATE`.
+        cache_seconds (float | None): How long to cache the results for.
+            Defaults to `QUEUE_STATS_CACHE_SECONDS`, with `0` disabling the cache.
+    """
+    if approximate is None:
+        approximate = app_settings.QUEUE_STATS_APPROXIMATE
+    if cache_seconds is None:
+        cache_seconds = app_settings.QUEUE_STATS_CACHE_SECONDS
+
+    key = QUEUE_STATS_CACHE_KEY.format("approximate" if approximate else "exact")
+    if cache_seconds:
+        stats = cache.get(key)
+        if stats is not None:
+            return stats
+
+    counts = estimate_messages() if approximate else None
+    stats = QueueStats(
+        counts=counts if counts is not None else count_messages(),
+        approximate=counts is not None,
+        collected_at=timezone.now(),
+    )
+
+    if cache_seconds:
+        cache.set(key, stats, cache_seconds)
+    return stats
+
+
+def count_messages() -> dict[tuple[int, int], int]:
+    """Count messages by status and priority in a single grouped query.
+
+    The query is covered by the `(status, priority)` index.
+    """
+    return {
+        (row["status"], row["priority"]): row["count"]
+        for row in Message.objects.order_by()
+        .values("status", "priority")
+        .annotate(count=Count("*"))
+    }
+
+
+def estimate_messages() -> dict[tuple[int, int], int] | None:
+    """Estimate messages by status and priority from PostgreSQL's statistics.
+
+    Uses the table's estimated row count and the most common values of the
+    `status` and `priority` columns collected by `ANALYZE`, the same
+    statistics the query planner uses, treating the two columns as
+    independent. Nothing is counted, so this is cheap on any size of table.
+
+    Returns:
+        dict[tuple[int, int], int] | None: The estimates, or `None` if the
+            database is not PostgreSQL or the table has not been analyzed.
+    """
+    connection = connections[router.db_for_read(Message)]
+    if connection.vendor != "postgresql":
+        return None
+
+    table = Message._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", [table]
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        total = row[0]
+
+        cursor.execute(
+            """
+            SELECT attname, null_frac, n_distinct,
+                most_common_vals::text::int[], most_common_freqs
+            FROM pg_stats
+            WHERE schemaname = current_schema()
+                AND tablename = %s
+                AND attname IN ('status', 'priority')
+            """,
+            [table],
+        )
+        columns = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    if set(columns) != {"status", "priority"}:
+        return None
+
+    status_freqs = _estimate_frequencies(total, columns["status"], Status.values)
+    priority_freqs = _estimate_frequencies(total, columns["priority"], Priority.values)
+    return {
+        (status, priority): round(total * status_freq * priority_freq)
+        for status, status_freq in status_freqs.items()
+        for priority, priority_freq in priority_freqs.items()
+    }
+
+
+def _estimate_frequencies(
+    total: float, column_stats: tuple[Any, ...], values: list[int]
+) -> dict[int, float]:
+    # Mirrors how PostgreSQL estimates equality selectivity: values in the
+    # most common values list use their own frequency, and the remaining
+    # frequency is spread evenly over the remaining distinct values.
+    null_frac, n_distinct, most_common_vals, most_common_freqs = column_stats
+    common = dict(zip(most_common_vals or [], most_common_freqs or []))
+    distinct = -n_distinct * total if n_distinct < 0 else n_distinct
+    remaining_distinct = distinct - len(common)
+    remaining_freq = max(1 - null_frac - sum(common.values()), 0)
+    other_freq = remaining_freq / remaining_distinct if remaining_distinct >= 1 else 0
+    return {value: common.get(value, other_freq) for value in values}
+
+
+def estimate_count(queryset: QuerySet[Message]) -> int | None:
+    """Estimate the number of rows a queryset matches from PostgreSQL's planner.
+
+    The query is only planned with `EXPLAIN`, not run, so this is cheap on
+    any size of table, but can be off by a wide margin for some filters.
+
+    Returns:
+        int | None: The estimate, or `None` if the database is not
+            PostgreSQL.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
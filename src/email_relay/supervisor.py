@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import signal
+import time
+from collections.abc import Callable
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+# `SIGHUP`, which reloads settings, does not exist on every platform.
+FORWARDED_SIGNALS = (
+    (*STOP_SIGNALS, signal.SIGHUP) if hasattr(signal, "SIGHUP") else STOP_SIGNALS
+)
+
+
+class Supervisor:
+    """Fork and babysit a fixed number of relay worker processes.
+
+    Each worker runs `target(index)` in its own process, where `index` is the
+    worker's slot from `0` to `processes - 1`. Workers that exit while the
+    supervisor is running are restarted in the same slot, no more often than
+    every `restart_delay` seconds. `SIGTERM`, `SIGINT` and `SIGHUP` are
+    forwarded to every worker, with the first two also stopping the supervisor
+    once all workers have exited.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[int], None],
+        processes: int,
+        restart_delay: float = 1.0,
+    ):
+        if not hasattr(os, "fork"):  # pragma: no cover
+            raise RuntimeError("Running multiple processes requires os.fork")
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.target = target
+        self.processes = processes
+        self.restart_delay = restart_delay
+        self.workers: dict[int, int] = {}
+        self.stopping = False
+        self._last_started: dict[int, float] = {}
+
+    def run(self) -> int:
+        previous_handlers = {
+            signum: signal.signal(signum, self.handle_signal)
+            for signum in FORWARDED_SIGNALS
+        }
+        try:
+            for index in range(self.processes):
+                self.spawn(index)
+
+            while self.workers:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+
+                slot = next((i for i, p in self.workers.items() if p == pid), None)
+                if slot is None:
+                    continue
+                del self.workers[slot]
+
+                exit_code = os.waitstatus_to_exitcode(status)
+                if self.stopping:
+                    logger.info("worker %s (pid %s) stopped", slot, pid)
+                    continue
+
+                logger.warning(
+                    "worker %s (pid %s) exited with %s, restarting",
+                    slot,
+                    pid,
+                    exit_code,
+                )
+                self.spawn(slot)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        return 0
+
+    def spawn(self, index: int) -> None:
+        last_started = self._last_started.get(index)
+        if last_started is not None:
+            wait = self.restart_delay - (time.monotonic() - last_started)
+            if wait > 0:
+                time.sleep(wait)
+        self._last_started[index] = time.monotonic()
+
+        # Database connections must not be shared across a fork.
+        connections.close_all()
+
+        # Hold off forwarded signals until the new worker is registered, so a
+        # signal arriving mid-fork still reaches it.
+        signal.pthread_sigmask(signal.SIG_BLOCK, FORWARDED_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                self.run_worker(index)
+            self.workers[index] = pid
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED_SIGNALS)
+
+        logger.info("started worker %s (pid %s)", index, pid)
+
+    def run_worker(self, index: int) -> None:  # pragma: no cover
+        for signum in FORWARDED_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, FORWARDED_SIGNALS)
+
+        exit_code = 0
+        try:
+            self.target(index)
+        except BaseException:
+            logger.exception("worker %s crashed", index)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def handle_signal(self, signum: int, frame) -> None:
+        if signum in STOP_SIGNALS:
+            self.stopping = True
+        for pid in list(self.workers.values()):
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signum)
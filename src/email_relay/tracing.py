@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+from collections.abc import Iterator
+from collections.abc import Sequence
+from contextlib import AbstractContextManager
+
+from email_relay.instrumentation import NULL_STAGE
+from email_relay.instrumentation import RelayObserver
+from email_relay.models import Message
+
+try:
+    from opentelemetry import propagate
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    propagate = None  # type: ignore[assignment]
+    trace = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "email_relay"
+
+
+class TracingObserver(RelayObserver):
+    """Trace messages from where they are queued to where they are sent.
+
+    In the email backend, the current trace context is stored on each new
+    message and the `serialize` and `insert` stages are traced as part of the
+    current trace. In the relay service, every stage for a message is traced
+    as a child of the context stored with it, so sending an email shows up in
+    the same trace as the request that queued it.
+
+    Requires `opentelemetry-api`. If it is not installed, this observer does
+    nothing.
+    """
+
+    def __init__(self, tracer_provider: trace.TracerProvider | None = None):
+        self.tracer: trace.Tracer | None = None
+        if trace is None:  # pragma: no cover
+            logger.warning(
+                "Tracing configured but opentelemetry-api is not installed. "
+                "Please install opentelemetry-api to use the tracing feature."
+            )
+            return
+        self.tracer = trace.get_tracer(TRACER_NAME, tracer_provider=tracer_provider)
+
+    def messages_serialized(self, messages: Sequence[Message]) -> None:
+        if self.tracer is None:  # pragma: no cover
+            return
+        carrier: dict[str, str] = {}
+        propagate.inject(carrier)
+        if not carrier:
+            return
+        for message in messages:
+            message.trace_context = carrier
+
+    def stage(
+        self, name: str, message: Message | None = None
+    ) -> AbstractContextManager[None]:
+        if self.tracer is None:  # pragma: no cover
+            return NULL_STAGE
+        return self._span(self.tracer, name, message)
+
+    @contextlib.contextmanager
+    def _span(
+        self, tracer: trace.Tracer, name: str, message: Message | None
+    ) -> Iterator[None]:
+        context = None
+        attributes = {}
+        if message is not None:
+            if message.trace_context:
+                context = propagate.extract(message.trace_context)
+            attributes = {
+                "email_relay.message.id": message.id,
+                "email_relay.message.priority": message.priority,
+                "email_relay.message.retry_count": message.retry_count,
+            }
+
+        with tracer.start_as_current_span(
+            f"email_relay {name}",
+            context=context,
+            kind=trace.SpanKind.CLIENT if name == "send" else trace.SpanKind.INTERNAL,
+            attributes=attributes,
+        ):
+            yield
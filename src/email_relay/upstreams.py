@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import random
+import smtplib
+import time
+from collections import deque
+from collections.abc import Sequence
+from typing import Any
+
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from email_relay.conf import app_settings
+from email_relay.errors import is_retryable
+from email_relay.errors import is_transport_error
+
+logger = logging.getLogger(__name__)
+
+# The fewest recent sends an upstream needs before it can be ejected, so a
+# single early error does not take it out of the pool.
+UPSTREAM_MIN_SENDS = 5
+
+
+class NoUpstreamsError(smtplib.SMTPException):
+    """Raised when there is no upstream with a weight above 0 to send through.
+
+    An `OSError`, like other errors reaching an email backend, so the message
+    is deferred rather than treated as sent.
+    """
+
+
+class Upstream:
+    """An email backend in the pool, with its own connection and health.
+
+    Whether each recent send succeeded is kept for the last
+    `EMAIL_UPSTREAM_ERROR_WINDOW` sends. Once the share of errors reaches
+    `EMAIL_UPSTREAM_MAX_ERROR_RATE`, the upstream is ejected from the pool for
+    `EMAIL_UPSTREAM_EJECT_SECONDS`.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        options: dict[str, Any] | None = None,
+        name: str | None = None,
+        weight: float = 1,
+        throttle: float = 0,
+    ):
+        self.backend = backend
+        self.options = options or {}
+        self.name = name or self.options.get("host") or backend
+        self.weight = weight
+        self.throttle = throttle
+        self.connection: BaseEmailBackend | None = None
+        self.outcomes: deque[bool] = deque(
+            maxlen=app_settings.EMAIL_UPSTREAM_ERROR_WINDOW
+        )
+        self.ejected_until: float | None = None
+        self.next_send_at = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> Upstream:
+        return cls(
+            backend=config["BACKEND"],
+            options=config.get("OPTIONS"),
+            name=config.get("NAME"),
+            weight=config.get("WEIGHT", 1),
+            throttle=config.get("THROTTLE", 0),
+        )
+
+    def __repr__(self) -> str:
+        return f"<Upstream {self.name}>"
+
+    def is_available(self, now: float | None = None) -> bool:
+        if self.ejected_until is None:
+            return True
+        now = time.monotonic() if now is None else now
+        if now < self.ejected_until:
+            return False
+        logger.info("upstream %s is back in the pool", self.name)
+        self.ejected_until = None
+        return True
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, success: bool) -> None:
+        self.outcomes.append(success)
+        if (
+            not success
+            and len(self.outcomes) >= min(UPSTREAM_MIN_SENDS, self.outcomes.maxlen or 0)
+            and self.error_rate >= app_settings.EMAIL_UPSTREAM_MAX_ERROR_RATE
+        ):
+            logger.warning(
+                "ejecting upstream %s for %s seconds, %.0f%% of its last %s sends "
+                "failed",
+                self.name,
+                app_settings.EMAIL_UPSTREAM_EJECT_SECONDS,
+                self.error_rate * 100,
+                len(self.outcomes),
+            )
+            self.ejected_until = (
+                time.monotonic() + app_settings.EMAIL_UPSTREAM_EJECT_SECONDS
+            )
+            self.outcomes.clear()
+
+    def send(self, email: EmailMessage) -> None:
+        if self.throttle > 0:
+            delay = self.next_send_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_send_at = time.monotonic() + self.throttle
+
+        if self.connection is None:
+            self.connection = get_connection(backend=self.backend, **self.options)
+        # A no-op if the connection is already open, so each upstream keeps
+        # one connection open across the emails it sends.
+        self.connection.open()
+        email.connection = self.connection
+        email.send()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            with contextlib.suppress(Exception):
+                self.connection.close()
+
+
+class UpstreamPool(BaseEmailBackend):
+    """Spread emails across several weighted email backends.
+
+    Each email goes to an upstream picked at random in proportion to its
+    weight, skipping any that have been ejected for failing too often. If
+    sending fails with an error worth retrying, the email fails over to the
+    next upstream, until every available upstream has been tried. If every
+    upstream has been ejected, all of them are tried anyway rather than
+    sending nothing.
+    """
+
+    def __init__(
+        self, upstreams: Sequence[Upstream], fail_silently: bool = False, **kwargs
+    ):
+        super().__init__(fail_silently=fail_silently, **kwargs)
+        self.upstreams = list(upstreams)
+        self.random = random.Random()  # noqa: S311
+
+    def candidates(self) -> list[Upstream]:
+        """Order the upstreams to try sending an email through."""
+        now = time.monotonic()
+        upstreams = [
+            upstream
+            for upstream in self.upstreams
+            if upstream.weight > 0 and upstream.is_available(now)
+        ]
+        if not upstreams:
+            logger.warning("all upstreams are ejected, trying them anyway")
+            upstreams = [upstream for upstream in self.upstreams if upstream.weight > 0]
+
+        ordered = []
+        while upstreams:
+            (upstream,) = self.random.choices(
+                upstreams, weights=[upstream.weight for upstream in upstreams]
+            )
+            upstreams.remove(upstream)
+            ordered.append(upstream)
+        return ordered
+
+    def send_email(self, email: EmailMessage) -> Exception | None:
+        error: Exception | None = NoUpstreamsError("no upstream has a weight above 0")
+        for upstream in self.candidates():
+            try:
+                upstream.send(email)
+            except Exception as err:
+                if not is_retryable(err) or isinstance(
+                    err, smtplib.SMTPRecipientsRefused
+                ):
+                    # No other upstream will do better, such as with an email
+                    # that cannot be encoded or a mailbox that does not exist.
+                    # Refused recipients are not failed over either, as the
+                    # email may have been sent to the rest of its recipients.
+                    if isinstance(err, OSError):
+                        upstream.record(success=True)
+                    return err
+                logger.debug(
+                    "sending through upstream %s failed, got %s", upstream.name, err
+                )
+                # Errors about the email itself show the upstream is up.
+                upstream.record(success=not is_transport_error(err))
+                upstream.close()
+                error = err
+                continue
+            upstream.record(success=True)
+            return None
+        return error
+
+    def send_messages_with_results(
+        self, email_messages: Sequence[EmailMessage]
+    ) -> list[Exception | None]:
+        try:
+            return [self.send_email(email) for email in email_messages]
+        finally:
+            self.close()
+
+    def send_messages(self, email_messages: Sequence[EmailMessage]) -> int:
+        results = self.send_messages_with_results(email_messages)
+        errors = [result for result in results if result is not None]
+        if errors and not self.fail_silently:
+            raise errors[0]
+        return len(results) - len(errors)
+
+    def close(self) -> None:
+        for upstream in self.upstreams:
+            upstream.close()
+
+
+_pool: UpstreamPool | None = None
+_pool_config: list[dict[str, Any]] | None = None
+
+
+def get_upstream_pool() -> UpstreamPool | None:
+    """Get the process-wide pool of upstreams, if any are configured.
+
+    The pool is kept between batches, so each upstream's recent errors and
+    ejection carry over, and rebuilt if `EMAIL_UPSTREAMS` changes.
+
+    Returns:
+        UpstreamPool | None: The pool, or `None` if `EMAIL_UPSTREAMS` is not
+            set.
+    """
+    global _pool, _pool_config
+
+    config = app_settings.EMAIL_UPSTREAMS
+    if not config:
+        return None
+
+    if _pool is None or _pool_config != config:
+        _pool = UpstreamPool([Upstream.from_config(upstream) for upstream in config])
+        _pool_config = config
+    return _pool
@@ -8,7 +8,7 @@ from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
 
 from .settings import DEFAULT_SETTINGS
 
-pytest_plugins = []  # type: ignore
+pytest_plugins = ["email_relay.pytest_plugin"]
 
 
 def pytest_configure(config):
@@ -37,7 +37,10 @@ TEST_SETTINGS = {
         "email_relay.db.EmailDatabaseRouter",
     ],
     "INSTALLED_APPS": [
+        "django.contrib.admin",
+        "django.contrib.auth",
         "django.contrib.contenttypes",
+        "django.contrib.messages",
         "email_relay",
     ],
 }
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+from django.contrib.admin import AdminSite
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage
+from django.test import RequestFactory
+from model_bakery import baker
+
+from email_relay import admin
+from email_relay.admin import EstimatedCountPaginator
+from email_relay.admin import MessageAdmin
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture
+def model_admin():
+    model_admin = MessageAdmin(Message, AdminSite())
+    model_admin.message_user = mock.MagicMock()
+    return model_admin
+
+
+@pytest.fixture
+def request_():
+    request = RequestFactory().get("/")
+    request.user = User(username="admin", is_superuser=True, is_staff=True)
+    return request
+
+
+def test_get_queryset_defers_data(model_admin, request_):
+    message = Message()
+    message.email = EmailMessage(
+        subject="Test", body="Body", to=["to@example.com"], bcc=["bcc@example.com"]
+    )
+    message.save()
+
+    (listed,) = model_admin.get_queryset(request_)
+
+    assert listed.get_deferred_fields() == {
+        "data",
+        "recipient_state",
+        "trace_context",
+        "log",
+    }
+    assert listed.subject == "Test"
+    assert listed.recipient_summary == "to@example.com"
+
+
+def test_get_actions(model_admin, request_):
+    actions = model_admin.get_actions(request_)
+
+    assert "delete_selected" not in actions
+    assert set(actions) == {
+        "requeue_messages",
+        "cancel_messages",
+        "fail_messages",
+        "delete_messages",
+    }
+
+
+def test_requeue_messages(model_admin, request_):
+    baker.make("email_relay.Message", status=Status.FAILED, retry_count=3)
+    baker.make("email_relay.Message", status=Status.SENT)
+
+    model_admin.requeue_messages(request_, Message.objects.all())
+
+    assert Message.objects.queued().count() == 1
+    assert Message.objects.sent().count() == 1
+    model_admin.message_user.assert_called_once()
+    assert "Requeued 1 messages." in model_admin.message_user.call_args.args
+
+
+def test_cancel_messages(model_admin, request_):
+    baker.make("email_relay.Message", status=Status.SCHEDULED, _quantity=2)
+    baker.make("email_relay.Message", status=Status.SENT)
+
+    model_admin.cancel_messages(request_, Message.objects.all())
+
+    assert Message.objects.cancelled().count() == 2
+    assert Message.objects.cancelled().first().log == "Cancelled by admin"
+    assert "Cancelled 2 messages." in model_admin.message_user.call_args.args
+
+
+def test_fail_messages(model_admin, request_):
+    baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+    baker.make("email_relay.Message", status=Status.SENT)
+
+    model_admin.fail_messages(request_, Message.objects.all())
+
+    assert Message.objects.failed().count() == 2
+    assert Message.objects.failed().first().log == "Marked as failed by admin"
+    assert "Marked 2 messages as failed." in model_admin.message_user.call_args.args
+
+
+def test_delete_messages(model_admin, request_):
+    baker.make("email_relay.Message", _quantity=3)
+
+    model_admin.delete_messages(request_, Message.objects.all())
+
+    assert not Message.objects.exists()
+    assert "Deleted 3 messages." in model_admin.message_user.call_args.args
+
+
+def test_paginator_counts_without_estimate():
+    baker.make("email_relay.Message", _quantity=3)
+
+    paginator = EstimatedCountPaginator(Message.objects.order_by("id"), 2)
+
+    assert paginator.count == 3
+    assert paginator.num_pages == 2
+
+
+@pytest.mark.parametrize(
+    ("estimate", "count"),
+    [
+        (admin.EXACT_COUNT_THRESHOLD, admin.EXACT_COUNT_THRESHOLD),
+        (admin.EXACT_COUNT_THRESHOLD - 1, 3),
+    ],
+)
+def test_paginator_uses_large_estimate(estimate, count):
+    baker.make("email_relay.Message", _quantity=3)
+
+    with mock.patch("email_relay.admin.estimate_count", return_value=estimate):
+        paginator = EstimatedCountPaginator(Message.objects.order_by("id"), 2)
+
+        assert paginator.count == count
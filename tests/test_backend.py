@@ -3,10 +3,12 @@ from __future__ import annotations
 import pytest
 from django.conf import settings
 from django.core.mail import EmailMessage
+from django.core.mail import get_connection
 from django.core.mail import send_mail
 from django.test.utils import override_settings
 
 from email_relay.models import Message
+from email_relay.models import Status
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -49,3 +51,94 @@ def test_email_message():
     email.send()
 
     assert Message.objects.count() == 1
+
+
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_email_message_scheduled():
+    email = EmailMessage(
+        "Subject here",
+        "Here is the message.",
+        "from_test@example.com",
+        ["to_test@example.com"],
+        headers={"X-Email-Relay-Send-At": "2999-01-01T09:00:00+00:00"},
+    )
+
+    email.send()
+
+    message = Message.objects.get()
+    assert message.status == Status.SCHEDULED
+    assert message.send_at.year == 2999
+    assert "X-Email-Relay-Send-At" not in message.data["extra_headers"]
+
+
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+@override_settings(DJANGO_EMAIL_RELAY={"MESSAGES_MAX_RECIPIENTS": 2})
+def test_email_message_split():
+    email = EmailMessage(
+        "Subject here",
+        "Here is the message.",
+        "from_test@example.com",
+        ["to_test@example.com"],
+        bcc=[f"bcc-{n}@example.com" for n in range(4)],
+        headers={"X-Email-Relay-Send-At": "2999-01-01T09:00:00+00:00"},
+    )
+
+    assert email.send() == 1
+
+    messages = Message.objects.order_by("id")
+    assert [message.recipients for message in messages] == [
+        ["to_test@example.com", "bcc-0@example.com"],
+        ["bcc-1@example.com", "bcc-2@example.com"],
+        ["bcc-3@example.com"],
+    ]
+    assert all(message.status == Status.SCHEDULED for message in messages)
+    assert all(message.send_at.year == 2999 for message in messages)
+
+
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_email_message_idempotency_key(django_assert_num_queries):
+    def make_email(key):
+        return EmailMessage(
+            "Subject here",
+            "Here is the message.",
+            "from_test@example.com",
+            ["to_test@example.com"],
+            headers={"X-Email-Relay-Idempotency-Key": key},
+        )
+
+    make_email("order-1").send()
+
+    with (
+        django_assert_num_queries(1, using="email_relay_db"),
+        get_connection() as connection,
+    ):
+        connection.send_messages([make_email("order-1"), make_email("order-2")])
+
+    assert sorted(Message.objects.values_list("idempotency_key", flat=True)) == [
+        "order-1",
+        "order-2",
+    ]
+    assert (
+        "X-Email-Relay-Idempotency-Key"
+        not in Message.objects.first().data["extra_headers"]
+    )
+
+
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+@override_settings(DJANGO_EMAIL_RELAY={"MESSAGES_MAX_RECIPIENTS": 1})
+def test_email_message_split_idempotency_key():
+    email = EmailMessage(
+        "Subject here",
+        "Here is the message.",
+        "from_test@example.com",
+        ["one@example.com", "two@example.com"],
+    )
+    email.idempotency_key = "order-1"
+
+    email.send()
+    email.send()
+
+    assert sorted(Message.objects.values_list("idempotency_key", flat=True)) == [
+        "order-1:0",
+        "order-1:1",
+    ]
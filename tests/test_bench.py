@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from email_relay.bench import PAYLOADS
+from email_relay.bench import main
+from email_relay.bench import make_email
+from email_relay.bench import run_benchmarks
+from email_relay.bench import transport
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_make_email(payload):
+    email = make_email(payload, 1)
+
+    assert email.to == ["to-1@example.com"]
+    assert email.message()
+
+
+def test_make_email_unknown_payload():
+    with pytest.raises(ValueError, match="Unknown payload"):
+        make_email("unknown", 1)
+
+
+def test_transport_unknown():
+    with pytest.raises(ValueError, match="Unknown transport"), transport("unknown"):
+        pass
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(messages=3, batch_size=2, payloads=("plain", "html"))
+
+    assert results["database"] == "sqlite"
+    assert [
+        (result["benchmark"], result["payload"], result.get("transport"))
+        for result in results["results"]
+    ] == [
+        ("enqueue", "plain", None),
+        ("send_all", "plain", "null"),
+        ("send_all", "plain", "smtp"),
+        ("enqueue", "html", None),
+        ("send_all", "html", "null"),
+        ("send_all", "html", "smtp"),
+    ]
+    for result in results["results"]:
+        assert result["messages"] == 3
+        assert result["queries_per_message"] > 0
+        assert result["peak_memory_bytes"] > 0
+    assert Message.objects.count() == 0
+
+
+def test_main_output(tmp_path):
+    output = tmp_path / "results.json"
+
+    assert (
+        main(
+            [
+                "--messages",
+                "2",
+                "--payload",
+                "attachments",
+                "--transport",
+                "null",
+                "--no-memory",
+                "--output",
+                str(output),
+            ]
+        )
+        == 0
+    )
+
+    results = json.loads(output.read_text())
+    assert len(results["results"]) == 2
+    assert "peak_memory_bytes" not in results["results"][0]
+
+
+def test_main_stdout(capsys):
+    main(["--messages", "1", "--payload", "plain", "--transport", "null"])
+
+    assert json.loads(capsys.readouterr().out)["results"]
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import logging
+import smtplib
+import time
+from unittest import mock
+
+import pytest
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay import breaker as breaker_module
+from email_relay.breaker import CircuitBreaker
+from email_relay.breaker import get_circuit_breaker
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+from email_relay.relay import send_all
+
+
+@pytest.fixture(autouse=True)
+def reset_breaker():
+    yield
+    breaker_module._breaker = None
+
+
+@pytest.fixture
+def breaker():
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3,
+            "EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS": 60,
+        }
+    ):
+        yield CircuitBreaker()
+
+
+def test_get_circuit_breaker_disabled():
+    assert get_circuit_breaker() is None
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3})
+def test_get_circuit_breaker():
+    breaker = get_circuit_breaker()
+
+    assert isinstance(breaker, CircuitBreaker)
+    assert get_circuit_breaker() is breaker
+
+
+def test_opens_after_threshold(breaker, caplog):
+    caplog.set_level(logging.WARNING)
+
+    breaker.record(OSError("Test Network Error"))
+    breaker.record(smtplib.SMTPServerDisconnected("Test"))
+
+    assert not breaker.is_open
+
+    breaker.record(TimeoutError("Test"))
+
+    assert breaker.is_open
+    assert not breaker.is_half_open
+    assert 59 < breaker.remaining_seconds <= 60
+    assert "opening circuit breaker for 60 seconds after 3 transport errors" in (
+        caplog.text
+    )
+
+
+@pytest.mark.parametrize(
+    "result",
+    [
+        None,
+        smtplib.SMTPRecipientsRefused({"to@example.com": (550, b"Refused")}),
+        smtplib.SMTPDataError(554, b"Rejected"),
+    ],
+)
+def test_success_resets_failures(breaker, result):
+    breaker.record(OSError("Test Network Error"))
+    breaker.record(OSError("Test Network Error"))
+    breaker.record(result)
+    breaker.record(OSError("Test Network Error"))
+
+    assert not breaker.is_open
+    assert breaker.failures == 1
+
+
+def test_unexpected_errors_are_ignored(breaker):
+    breaker.record(OSError("Test Network Error"))
+    breaker.record(ValueError("Test"))
+
+    assert breaker.failures == 1
+
+
+def test_half_open_after_cooldown(breaker):
+    breaker.opened_at = time.monotonic() - 61
+
+    assert not breaker.is_open
+    assert breaker.is_half_open
+    assert breaker.remaining_seconds == 0
+
+
+def test_half_open_probe_succeeds(breaker, caplog):
+    caplog.set_level(logging.INFO)
+    breaker.opened_at = time.monotonic() - 61
+
+    breaker.record(None)
+
+    assert not breaker.is_open
+    assert not breaker.is_half_open
+    assert "email backend is back, closing circuit breaker" in caplog.text
+
+
+def test_half_open_probe_fails(breaker, caplog):
+    caplog.set_level(logging.WARNING)
+    breaker.opened_at = time.monotonic() - 61
+
+    breaker.record(OSError("Test Network Error"))
+
+    assert breaker.is_open
+    assert "probe message could not be sent, reopening circuit breaker" in caplog.text
+
+
+def make_messages(quantity):
+    return baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=quantity,
+    )
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@pytest.mark.parametrize("batch_size", [None, 5])
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_stops_when_open(mock_send, batch_size, caplog):
+    caplog.set_level(logging.WARNING)
+    mock_send.side_effect = OSError("Test Network Error")
+    make_messages(10)
+
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3,
+            "EMAIL_SEND_BATCH_SIZE": batch_size,
+        }
+    ):
+        send_all()
+
+    assert mock_send.call_count == 3
+    assert Message.objects.filter(status=Status.DEFERRED, retry_count=1).count() == 3
+    assert Message.objects.filter(status=Status.QUEUED, retry_count=0).count() == 7
+    assert "circuit breaker open, leaving remaining messages queued" in caplog.text
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_skips_rest_of_batch(mock_send, caplog):
+    caplog.set_level(logging.WARNING)
+    mock_send.side_effect = OSError("Test Network Error")
+    make_messages(5)
+
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3,
+            "EMAIL_SEND_BATCH_SIZE": 10,
+        }
+    ):
+        send_all()
+
+    assert mock_send.call_count == 3
+    assert Message.objects.filter(status=Status.QUEUED, retry_count=0).count() == 2
+    assert "circuit breaker opened, left 2 emails queued" in caplog.text
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3})
+def test_send_all_does_nothing_while_open(django_assert_num_queries, mailoutbox):
+    make_messages(2)
+    get_circuit_breaker().opened_at = time.monotonic()
+
+    with django_assert_num_queries(0, using=EMAIL_RELAY_DATABASE_ALIAS):
+        send_all()
+
+    assert len(mailoutbox) == 0
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3,
+        "EMAIL_SEND_BATCH_SIZE": 10,
+    }
+)
+def test_send_all_probe_succeeds(mailoutbox):
+    make_messages(5)
+    breaker = get_circuit_breaker()
+    breaker.opened_at = time.monotonic() - 61
+
+    send_all()
+
+    assert len(mailoutbox) == 5
+    assert not breaker.is_half_open
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMAIL_CIRCUIT_BREAKER_THRESHOLD": 3,
+        "EMAIL_SEND_BATCH_SIZE": 10,
+    }
+)
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_probe_fails(mock_send):
+    mock_send.side_effect = OSError("Test Network Error")
+    make_messages(5)
+    breaker = get_circuit_breaker()
+    breaker.opened_at = time.monotonic() - 61
+
+    send_all()
+
+    assert mock_send.call_count == 1
+    assert breaker.is_open
+    assert Message.objects.deferred().count() == 1
+    assert Message.objects.queued().count() == 4
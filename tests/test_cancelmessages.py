@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture
+def messages():
+    for status in (Status.QUEUED, Status.DEFERRED, Status.SCHEDULED, Status.SENT):
+        baker.make(
+            "email_relay.Message",
+            data={"subject": "Campaign", "to": ["to@example.com"]},
+            status=status,
+            _quantity=2,
+        )
+
+
+def test_cancelmessages(messages):
+    out = StringIO()
+
+    call_command(
+        "cancelmessages",
+        "--reason",
+        "runaway campaign",
+        "--chunk-size",
+        "4",
+        stdout=out,
+    )
+
+    assert out.getvalue() == "cancelled 6 messages\n"
+    assert Message.objects.cancelled().count() == 6
+    assert set(Message.objects.cancelled().values_list("log", flat=True)) == {
+        "runaway campaign"
+    }
+    assert Message.objects.sent().count() == 2
+
+
+def test_cancelmessages_status(messages):
+    out = StringIO()
+
+    call_command("cancelmessages", "--status", "scheduled", stdout=out)
+
+    assert out.getvalue() == "cancelled 2 messages\n"
+    assert Message.objects.scheduled().count() == 0
+    assert Message.objects.queued().count() == 2
+
+
+def test_cancelmessages_dry_run(messages):
+    out = StringIO()
+
+    call_command("cancelmessages", "--dry-run", stdout=out)
+
+    assert out.getvalue() == "would cancel 6 messages\n"
+    assert not Message.objects.cancelled().exists()
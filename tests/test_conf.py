@@ -2,8 +2,10 @@ from __future__ import annotations
 
 import pytest
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.test import override_settings
 
+from email_relay.conf import EMAIL_RELAY_LEADER_LOCK_ID
 from email_relay.conf import app_settings
 
 
@@ -11,17 +13,43 @@ from email_relay.conf import app_settings
     ("setting", "default_setting"),
     [
         ("DATABASE_ALIAS", "email_relay_db"),
+        ("EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS", 60.0),
+        ("EMAIL_CIRCUIT_BREAKER_THRESHOLD", None),
         ("EMAIL_MAX_BATCH", None),
         ("EMAIL_MAX_DEFERRED", None),
         ("EMAIL_MAX_RETRIES", None),
+        ("EMAIL_SEND_BATCH_SIZE", None),
+        ("EMAIL_SENDING_TIMEOUT_SECONDS", 600.0),
+        ("EMAIL_SMTP_ERROR_ACTIONS", None),
+        ("EMAIL_STALE_SENDING_ACTION", "fail"),
         ("EMPTY_QUEUE_SLEEP", 30),
         ("EMAIL_THROTTLE", 0),
+        ("EMAIL_UPSTREAM_EJECT_SECONDS", 30.0),
+        ("EMAIL_UPSTREAM_ERROR_WINDOW", 20),
+        ("EMAIL_UPSTREAM_MAX_ERROR_RATE", 0.5),
+        ("EMAIL_UPSTREAMS", None),
         ("MESSAGES_BATCH_SIZE", None),
+        ("MESSAGES_MAX_RECIPIENTS", None),
         ("MESSAGES_RETENTION_SECONDS", None),
+        ("MESSAGES_TTL_SECONDS", None),
+        ("PRIORITY_AGING_SECONDS", None),
+        ("PRIORITY_WEIGHTS", None),
+        ("QUEUE_STATS_APPROXIMATE", False),
+        ("QUEUE_STATS_CACHE_SECONDS", 15.0),
+        ("RELAY_HEALTHCHECK_INTERVAL", 60.0),
+        ("RELAY_HEALTHCHECK_MAX_LOOP_SECONDS", None),
         ("RELAY_HEALTHCHECK_METHOD", "GET"),
         ("RELAY_HEALTHCHECK_STATUS_CODE", 200),
         ("RELAY_HEALTHCHECK_TIMEOUT", 5.0),
         ("RELAY_HEALTHCHECK_URL", None),
+        ("RELAY_LEADER_ELECTION", False),
+        ("RELAY_LEADER_LEASE_SECONDS", 10),
+        ("RELAY_LEADER_LOCK_ID", EMAIL_RELAY_LEADER_LOCK_ID),
+        ("RELAY_LEADER_POLL_SECONDS", 1.0),
+        ("RELAY_METRICS_ADDR", "0.0.0.0"),  # noqa: S104
+        ("RELAY_METRICS_CACHE_SECONDS", 15.0),
+        ("RELAY_METRICS_PORT", None),
+        ("RELAY_OBSERVERS", None),
     ],
 )
 def test_default_settings(setting, default_setting):
@@ -35,17 +63,54 @@ def test_default_settings(setting, default_setting):
     ("setting", "user_setting"),
     [
         ("DATABASE_ALIAS", "custom_db_name"),
+        ("EMAIL_CIRCUIT_BREAKER_COOLDOWN_SECONDS", 300.0),
+        ("EMAIL_CIRCUIT_BREAKER_THRESHOLD", 5),
         ("EMAIL_MAX_BATCH", 10),
         ("EMAIL_MAX_DEFERRED", 10),
         ("EMAIL_MAX_RETRIES", 10),
+        ("EMAIL_SEND_BATCH_SIZE", 10),
+        ("EMAIL_SENDING_TIMEOUT_SECONDS", 60.0),
+        ("EMAIL_SMTP_ERROR_ACTIONS", {552: "defer", 421: "fail"}),
+        ("EMAIL_STALE_SENDING_ACTION", "defer"),
         ("EMPTY_QUEUE_SLEEP", 1),
         ("EMAIL_THROTTLE", 1),
+        ("EMAIL_UPSTREAM_EJECT_SECONDS", 60.0),
+        ("EMAIL_UPSTREAM_ERROR_WINDOW", 50),
+        ("EMAIL_UPSTREAM_MAX_ERROR_RATE", 0.25),
+        (
+            "EMAIL_UPSTREAMS",
+            [
+                {
+                    "BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+                    "NAME": "primary",
+                    "OPTIONS": {"host": "smtp.example.com"},
+                    "THROTTLE": 0.1,
+                    "WEIGHT": 3,
+                }
+            ],
+        ),
         ("MESSAGES_BATCH_SIZE", 10),
+        ("MESSAGES_MAX_RECIPIENTS", 100),
         ("MESSAGES_RETENTION_SECONDS", 10),
+        ("MESSAGES_TTL_SECONDS", {3: 300}),
+        ("PRIORITY_AGING_SECONDS", 300),
+        ("PRIORITY_WEIGHTS", {3: 6, 2: 3, 1: 1}),
+        ("QUEUE_STATS_APPROXIMATE", True),
+        ("QUEUE_STATS_CACHE_SECONDS", 60.0),
+        ("RELAY_HEALTHCHECK_INTERVAL", 15.0),
+        ("RELAY_HEALTHCHECK_MAX_LOOP_SECONDS", 90.0),
         ("RELAY_HEALTHCHECK_METHOD", "POST"),
         ("RELAY_HEALTHCHECK_STATUS_CODE", 201),
         ("RELAY_HEALTHCHECK_TIMEOUT", 10.0),
         ("RELAY_HEALTHCHECK_URL", "http://example.com/healthcheck"),
+        ("RELAY_LEADER_ELECTION", True),
+        ("RELAY_LEADER_LEASE_SECONDS", 30),
+        ("RELAY_LEADER_LOCK_ID", 42),
+        ("RELAY_LEADER_POLL_SECONDS", 0.5),
+        ("RELAY_METRICS_ADDR", "127.0.0.1"),
+        ("RELAY_METRICS_CACHE_SECONDS", 60.0),
+        ("RELAY_METRICS_PORT", 9100),
+        ("RELAY_OBSERVERS", ["email_relay.instrumentation.StageStatsObserver"]),
     ],
 )
 def test_custom_settings(setting, user_setting):
@@ -55,3 +120,143 @@ def test_custom_settings(setting, user_setting):
         },
     ):
         assert getattr(app_settings, setting) == user_setting
+
+
+def test_settings_are_snapshotted():
+    with override_settings(DJANGO_EMAIL_RELAY={"EMAIL_THROTTLE": 1}):
+        assert app_settings.EMAIL_THROTTLE == 1
+
+        # bypasses the setting_changed signal
+        settings.DJANGO_EMAIL_RELAY = {"EMAIL_THROTTLE": 2}
+
+        assert app_settings.EMAIL_THROTTLE == 1
+
+        app_settings.reload()
+
+        assert app_settings.EMAIL_THROTTLE == 2
+
+    assert app_settings.EMAIL_THROTTLE == 0
+
+
+def test_settings_snapshot_is_copied():
+    user_settings = {"PRIORITY_WEIGHTS": {3: 6}}
+
+    with override_settings(DJANGO_EMAIL_RELAY=user_settings):
+        assert app_settings.PRIORITY_WEIGHTS == {3: 6}
+
+        user_settings["PRIORITY_WEIGHTS"][3] = 1
+
+        assert app_settings.PRIORITY_WEIGHTS == {3: 6}
+
+
+def test_settings_are_read_only():
+    with pytest.raises(AttributeError, match="read-only"):
+        app_settings.EMAIL_THROTTLE = 1
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        app_settings.NOT_A_SETTING  # noqa: B018
+
+
+@override_settings(DJANGO_EMAIL_RELAY=None)
+def test_settings_none():
+    assert app_settings.EMAIL_THROTTLE == 0
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_THROTLE": 1, "EMAIL_MAX_BACH": 1})
+def test_unknown_settings():
+    with pytest.raises(
+        ImproperlyConfigured,
+        match="Unknown DJANGO_EMAIL_RELAY settings: EMAIL_MAX_BACH, EMAIL_THROTLE",
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@pytest.mark.parametrize(
+    "user_settings",
+    [
+        {"EMAIL_THROTTLE": -1},
+        {"EMAIL_MAX_BATCH": -10},
+        {"RELAY_LEADER_POLL_SECONDS": -0.5},
+        {"PRIORITY_WEIGHTS": {3: -1}},
+        {"MESSAGES_TTL_SECONDS": {1: -60}},
+        {"EMAIL_UPSTREAMS": [{"BACKEND": "path.to.Backend", "WEIGHT": -1}]},
+    ],
+)
+def test_invalid_settings(user_settings):
+    with (
+        override_settings(DJANGO_EMAIL_RELAY=user_settings),
+        pytest.raises(ImproperlyConfigured, match="must not be negative"),
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@pytest.mark.parametrize(
+    ("upstream", "match"),
+    [
+        ({"OPTIONS": {}}, r"\['EMAIL_UPSTREAMS'\]\[0\] must set 'BACKEND'"),
+        (
+            {"BACKEND": "path.to.Backend", "WIEGHT": 1},
+            r"\['EMAIL_UPSTREAMS'\]\[0\] has unknown keys: WIEGHT",
+        ),
+    ],
+)
+def test_invalid_upstreams(upstream, match):
+    with (
+        override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAMS": [upstream]}),
+        pytest.raises(ImproperlyConfigured, match=match),
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+def test_upstreams_all_weight_zero():
+    upstreams = [
+        {"BACKEND": "path.to.Backend", "WEIGHT": 0},
+        {"BACKEND": "path.to.Backend", "WEIGHT": 0},
+    ]
+
+    with (
+        override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAMS": upstreams}),
+        pytest.raises(
+            ImproperlyConfigured,
+            match=r"must have at least one upstream with a 'WEIGHT' above 0",
+        ),
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SMTP_ERROR_ACTIONS": {552: "retry"}})
+def test_invalid_smtp_error_actions():
+    with pytest.raises(
+        ImproperlyConfigured,
+        match=r"\['EMAIL_SMTP_ERROR_ACTIONS'\]\[552\] must be one of 'defer', 'fail'",
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SMTP_ERROR_ACTIONS": {"5xx": "fail"}})
+def test_invalid_smtp_error_action_code():
+    with pytest.raises(
+        ImproperlyConfigured,
+        match=r"\['EMAIL_SMTP_ERROR_ACTIONS'\] keys must be SMTP reply codes, got '5xx'",
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"MESSAGES_MAX_RECIPIENTS": 0})
+def test_invalid_max_recipients():
+    with pytest.raises(
+        ImproperlyConfigured,
+        match=r"\['MESSAGES_MAX_RECIPIENTS'\] must be at least 1, got 0",
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_STALE_SENDING_ACTION": "retry"})
+def test_invalid_stale_sending_action():
+    with pytest.raises(
+        ImproperlyConfigured,
+        match=r"\['EMAIL_STALE_SENDING_ACTION'\] must be one of 'defer', 'fail'",
+    ):
+        app_settings.EMAIL_THROTTLE  # noqa: B018
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import datetime
+
+import pytest
 from dirty_equals import IsPartialDict
 from django.core.mail import EmailMessage
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 
 from email_relay.email import RelayEmailData
 from email_relay.email import __version__
+from email_relay.email import get_expires_at
+from email_relay.email import get_idempotency_key
+from email_relay.email import get_send_at
+from email_relay.email import split_idempotency_key
 
 
 def test_from_email_message():
@@ -183,3 +191,177 @@ def test_email_message_version():
     relay_email_data = RelayEmailData.from_email_message(email_message)
 
     assert relay_email_data._email_relay_version == __version__
+
+
+def test_from_email_message_strips_relay_headers():
+    email_message = EmailMessage(
+        "Subject here",
+        "Here is the message.",
+        "from@example.com",
+        ["to@example.com"],
+        headers={
+            "Test-Header": "Test Value",
+            "X-Email-Relay-Send-At": "2030-01-01T00:00:00Z",
+        },
+    )
+
+    relay_email_data = RelayEmailData.from_email_message(email_message)
+
+    assert relay_email_data.extra_headers == {"Test-Header": "Test Value"}
+
+
+def test_get_send_at_from_attribute():
+    send_at = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+    email_message.send_at = send_at
+
+    assert get_send_at(email_message) == send_at
+
+
+@pytest.mark.parametrize("header", ["X-Email-Relay-Send-At", "x-email-relay-send-at"])
+def test_get_send_at_from_header(header):
+    email_message = EmailMessage(
+        "Subject here",
+        to=["to@example.com"],
+        headers={header: "2030-01-01T00:00:00+00:00"},
+    )
+
+    assert get_send_at(email_message) == datetime.datetime(
+        2030, 1, 1, tzinfo=datetime.timezone.utc
+    )
+
+
+def test_get_send_at_naive():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+    email_message.send_at = datetime.datetime(2030, 1, 1)  # noqa: DTZ001
+
+    assert timezone.is_aware(get_send_at(email_message))
+
+
+def test_get_send_at_not_scheduled():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+
+    assert get_send_at(email_message) is None
+
+
+def test_get_send_at_invalid_header():
+    email_message = EmailMessage(
+        "Subject here",
+        to=["to@example.com"],
+        headers={"X-Email-Relay-Send-At": "tomorrow"},
+    )
+
+    with pytest.raises(ValueError, match="Invalid X-Email-Relay-Send-At header"):
+        get_send_at(email_message)
+
+
+def test_get_expires_at_from_header():
+    email_message = EmailMessage(
+        "Subject here",
+        to=["to@example.com"],
+        headers={"X-Email-Relay-Expires-At": "2030-01-01T00:00:00+00:00"},
+    )
+
+    assert get_expires_at(email_message) == datetime.datetime(
+        2030, 1, 1, tzinfo=datetime.timezone.utc
+    )
+
+
+def test_get_expires_at_wrong_type():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+    email_message.expires_at = "2030-01-01"
+
+    with pytest.raises(TypeError, match="expires_at must be a datetime"):
+        get_expires_at(email_message)
+
+
+def test_split():
+    data = RelayEmailData(
+        to=["to@example.com"],
+        cc=["cc@example.com"],
+        bcc=[f"bcc-{n}@example.com" for n in range(4)],
+    )
+
+    emails = data.split(2)
+
+    assert [email.envelope_recipients for email in emails] == [
+        ["to@example.com", "cc@example.com"],
+        ["bcc-0@example.com", "bcc-1@example.com"],
+        ["bcc-2@example.com", "bcc-3@example.com"],
+    ]
+    assert all(email.to == ["to@example.com"] for email in emails)
+    assert all(email.cc == ["cc@example.com"] for email in emails)
+    assert [email.bcc for email in emails] == [
+        [],
+        ["bcc-0@example.com", "bcc-1@example.com"],
+        ["bcc-2@example.com", "bcc-3@example.com"],
+    ]
+
+
+def test_split_under_max_recipients():
+    data = RelayEmailData(to=["to@example.com"], bcc=["bcc@example.com"])
+
+    assert data.split(2) == [data]
+
+
+def test_split_envelope_recipients():
+    data = RelayEmailData(to=["to@example.com"], bcc=["bcc@example.com"]).split(1)[1]
+
+    email = data.to_email_message()
+
+    assert email.recipients() == ["bcc@example.com"]
+    assert email.to == ["to@example.com"]
+
+
+def test_get_idempotency_key_from_attribute():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+    email_message.idempotency_key = "order-1234"
+
+    assert get_idempotency_key(email_message) == "order-1234"
+
+
+@pytest.mark.parametrize(
+    "header", ["X-Email-Relay-Idempotency-Key", "x-email-relay-idempotency-key"]
+)
+def test_get_idempotency_key_from_header(header):
+    email_message = EmailMessage(
+        "Subject here", to=["to@example.com"], headers={header: "order-1234"}
+    )
+
+    assert get_idempotency_key(email_message) == "order-1234"
+
+
+def test_get_idempotency_key_not_set():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+
+    assert get_idempotency_key(email_message) is None
+
+
+def test_get_idempotency_key_too_long():
+    email_message = EmailMessage("Subject here", to=["to@example.com"])
+    email_message.idempotency_key = "x" * 256
+
+    with pytest.raises(ValueError, match="at most 255 characters, got 256"):
+        get_idempotency_key(email_message)
+
+
+def test_split_idempotency_key():
+    assert split_idempotency_key("order-1234", 3) == "order-1234:3"
+
+
+@pytest.mark.parametrize("length", [254, 255])
+def test_split_idempotency_key_too_long(length):
+    key = "x" * length
+
+    split_key = split_idempotency_key(key, 12)
+
+    assert len(split_key) <= 255
+    assert split_key == split_idempotency_key(key, 12)
+    assert split_key != split_idempotency_key(key, 11)
+    assert split_key.endswith(":12")
+
+
+def test_split_idempotency_key_at_max_length():
+    key = "x" * 253
+
+    assert split_idempotency_key(key, 1) == f"{key}:1"
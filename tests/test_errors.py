@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import smtplib
+
+import pytest
+from django.test import override_settings
+
+from email_relay.errors import get_smtp_action
+from email_relay.errors import get_smtp_codes
+from email_relay.errors import is_retryable
+from email_relay.errors import is_transport_error
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (smtplib.SMTPDataError(554, b"Rejected"), [554]),
+        (smtplib.SMTPSenderRefused(553, b"Refused", "from@example.com"), [553]),
+        (
+            smtplib.SMTPRecipientsRefused(
+                {"a@example.com": (550, b"Unknown"), "b@example.com": (450, b"Later")}
+            ),
+            [550, 450],
+        ),
+        (OSError("Test Network Error"), []),
+        (ValueError("Test"), []),
+    ],
+)
+def test_get_smtp_codes(error, expected):
+    assert get_smtp_codes(error) == expected
+
+
+@pytest.mark.parametrize(
+    ("code", "expected"),
+    [
+        (421, "defer"),
+        (450, "defer"),
+        (451, "defer"),
+        (550, "fail"),
+        (552, "fail"),
+        (554, "fail"),
+    ],
+)
+def test_get_smtp_action(code, expected):
+    assert get_smtp_action(code) == expected
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={"EMAIL_SMTP_ERROR_ACTIONS": {552: "defer", 450: "fail"}}
+)
+def test_get_smtp_action_configured():
+    assert get_smtp_action(552) == "defer"
+    assert get_smtp_action(450) == "fail"
+    assert get_smtp_action(550) == "fail"
+    assert get_smtp_action(451) == "defer"
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={"EMAIL_SMTP_ERROR_ACTIONS": {"552": "defer", "450": "fail"}}
+)
+def test_get_smtp_action_configured_with_string_codes():
+    assert get_smtp_action(552) == "defer"
+    assert get_smtp_action(450) == "fail"
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (OSError("Test Network Error"), True),
+        (TimeoutError("Test"), True),
+        (smtplib.SMTPServerDisconnected("Test"), True),
+        (smtplib.SMTPAuthenticationError(535, b"Bad credentials"), True),
+        (smtplib.SMTPDataError(451, b"Try again later"), True),
+        (smtplib.SMTPDataError(554, b"Rejected"), False),
+        (smtplib.SMTPSenderRefused(421, b"Try later", "from@example.com"), True),
+        (smtplib.SMTPSenderRefused(553, b"Refused", "from@example.com"), False),
+        (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"Unknown")}), False),
+        (
+            smtplib.SMTPRecipientsRefused(
+                {"a@example.com": (550, b"Unknown"), "b@example.com": (450, b"Later")}
+            ),
+            True,
+        ),
+        (ValueError("Test"), False),
+    ],
+)
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (OSError("Test Network Error"), True),
+        (smtplib.SMTPServerDisconnected("Test"), True),
+        (smtplib.SMTPAuthenticationError(535, b"Bad credentials"), True),
+        (smtplib.SMTPDataError(451, b"Try again later"), False),
+        (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"Unknown")}), False),
+        (ValueError("Test"), False),
+    ],
+)
+def test_is_transport_error(error, expected):
+    assert is_transport_error(error) is expected
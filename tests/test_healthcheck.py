@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+import time
+from unittest import mock
+
+import pytest
+import requests
+import responses
+from django.test.utils import override_settings
+
+from email_relay.healthcheck import Healthcheck
+from email_relay.healthcheck import get_healthcheck
+
+HEALTHCHECK_URL = "http://example.com/healthcheck"
+
+
+@pytest.fixture
+def healthcheck():
+    healthcheck = Healthcheck()
+    healthcheck.beat()
+    yield healthcheck
+    healthcheck.stop()
+
+
+def test_get_healthcheck_not_configured():
+    assert get_healthcheck() is None
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+def test_get_healthcheck():
+    assert isinstance(get_healthcheck(), Healthcheck)
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+def test_get_healthcheck_no_requests(caplog):
+    caplog.set_level(logging.WARNING)
+
+    with mock.patch("email_relay.healthcheck.requests", None):
+        assert get_healthcheck() is None
+
+    assert "Healthcheck URL configured but requests is not installed." in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+@responses.activate
+def test_ping(healthcheck, caplog):
+    caplog.set_level(logging.DEBUG)
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+
+    assert healthcheck.ping()
+
+    assert len(responses.calls) == 1
+    assert "healthcheck ping successful" in caplog.text
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL,
+        "RELAY_HEALTHCHECK_STATUS_CODE": 201,
+    }
+)
+@responses.activate
+def test_ping_status_code(healthcheck, caplog):
+    caplog.set_level(logging.DEBUG)
+    responses.add(responses.GET, HEALTHCHECK_URL, status=201)
+
+    assert healthcheck.ping()
+
+    assert len(responses.calls) == 1
+    assert "healthcheck ping successful" in caplog.text
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL,
+        "RELAY_HEALTHCHECK_METHOD": "POST",
+    }
+)
+@responses.activate
+def test_ping_method(healthcheck, caplog):
+    caplog.set_level(logging.DEBUG)
+    responses.add(responses.POST, HEALTHCHECK_URL, status=200)
+
+    assert healthcheck.ping()
+
+    assert len(responses.calls) == 1
+    assert "healthcheck ping successful" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+@responses.activate
+def test_ping_failure(healthcheck, caplog):
+    caplog.set_level(logging.WARNING)
+    responses.add(responses.GET, HEALTHCHECK_URL, status=500)
+
+    assert not healthcheck.ping()
+
+    assert len(responses.calls) == 1
+    assert "healthcheck failed, got 500, expected 200" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+@responses.activate
+def test_ping_requests_exception(healthcheck, caplog):
+    caplog.set_level(logging.WARNING)
+    responses.add(responses.GET, HEALTHCHECK_URL, body=requests.ConnectionError("test"))
+
+    assert not healthcheck.ping()
+
+    assert "healthcheck failed, got exception: test" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+@responses.activate
+def test_ping_reuses_session(healthcheck):
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+
+    with mock.patch.object(
+        healthcheck.session, "request", wraps=healthcheck.session.request
+    ) as request:
+        healthcheck.ping()
+        healthcheck.ping()
+
+    assert request.call_count == 2
+    assert len(responses.calls) == 2
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL})
+@responses.activate
+def test_ping_before_first_beat(caplog):
+    caplog.set_level(logging.WARNING)
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+    healthcheck = Healthcheck()
+
+    assert not healthcheck.ping()
+
+    assert len(responses.calls) == 0
+    assert "skipping healthcheck ping" in caplog.text
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL,
+        "RELAY_HEALTHCHECK_MAX_LOOP_SECONDS": 60,
+    }
+)
+@responses.activate
+def test_ping_stale_loop(healthcheck, caplog):
+    caplog.set_level(logging.WARNING)
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+    healthcheck.last_beat = time.monotonic() - 61
+
+    assert not healthcheck.is_alive()
+    assert not healthcheck.ping()
+
+    assert len(responses.calls) == 0
+    assert "relay loop has not completed in the last 60 seconds" in caplog.text
+
+
+@pytest.mark.parametrize(
+    ("relay_settings", "expected"),
+    [
+        ({}, 120),
+        ({"EMPTY_QUEUE_SLEEP": 300}, 600),
+        ({"RELAY_HEALTHCHECK_INTERVAL": 10}, 60),
+        ({"RELAY_HEALTHCHECK_MAX_LOOP_SECONDS": 45}, 45),
+    ],
+)
+def test_max_loop_seconds(healthcheck, relay_settings, expected):
+    with override_settings(DJANGO_EMAIL_RELAY=relay_settings):
+        assert healthcheck.max_loop_seconds == expected
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL,
+        "RELAY_HEALTHCHECK_INTERVAL": 0.01,
+    }
+)
+@responses.activate
+def test_start_pings_in_background(healthcheck):
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+
+    healthcheck.start()
+    deadline = time.monotonic() + 5
+    while not responses.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    healthcheck.stop()
+
+    assert len(responses.calls) >= 1
+    assert not healthcheck.thread.is_alive()
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_HEALTHCHECK_URL": HEALTHCHECK_URL,
+        "RELAY_HEALTHCHECK_INTERVAL": 0.01,
+    }
+)
+def test_run_survives_unexpected_errors(healthcheck, caplog):
+    caplog.set_level(logging.ERROR)
+
+    with mock.patch.object(
+        healthcheck, "ping", side_effect=[RuntimeError("test"), True]
+    ) as ping:
+        healthcheck.stopping.wait = mock.Mock(side_effect=[False, False, True])
+        healthcheck.run()
+
+    assert ping.call_count == 2
+    assert "unexpected error pinging healthcheck" in caplog.text
+
+
+@responses.activate
+def test_ping_url_unset(healthcheck):
+    responses.add(responses.GET, HEALTHCHECK_URL, status=200)
+
+    assert not healthcheck.ping()
+
+    assert len(responses.calls) == 0
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+from django.core.mail import send_mail
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay import instrumentation
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.instrumentation import NULL_OBSERVER
+from email_relay.instrumentation import CompositeObserver
+from email_relay.instrumentation import RelayObserver
+from email_relay.instrumentation import StageStatsObserver
+from email_relay.instrumentation import get_observer
+from email_relay.models import Status
+from email_relay.relay import send_all
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+class RecordingObserver(RelayObserver):
+    instances: list[RecordingObserver] = []
+
+    def __init__(self):
+        self.stages = []
+        self.events = []
+        RecordingObserver.instances.append(self)
+
+    def stage(self, name, message=None):
+        self.stages.append(name)
+        return super().stage(name, message)
+
+    def message_sent(self, message):
+        self.events.append(("sent", message.id))
+
+
+@pytest.fixture(autouse=True)
+def clear_observers():
+    instrumentation._observers.clear()
+    yield
+    instrumentation._observers.clear()
+
+
+@pytest.fixture
+def recording_observer():
+    RecordingObserver.instances = []
+    with override_settings(
+        DJANGO_EMAIL_RELAY={"RELAY_OBSERVERS": [f"{__name__}.RecordingObserver"]}
+    ):
+        yield get_observer()
+
+
+def test_get_observer_default():
+    assert get_observer() is NULL_OBSERVER
+
+
+def test_get_observer_is_cached(recording_observer):
+    assert isinstance(recording_observer, RecordingObserver)
+    assert get_observer() is recording_observer
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_OBSERVERS": [
+            "email_relay.instrumentation.StageStatsObserver",
+            f"{__name__}.RecordingObserver",
+        ]
+    }
+)
+def test_get_observer_multiple():
+    observer = get_observer()
+
+    assert isinstance(observer, CompositeObserver)
+    assert [type(o) for o in observer.observers] == [
+        StageStatsObserver,
+        RecordingObserver,
+    ]
+
+
+def test_send_all_stages(recording_observer, mailoutbox):
+    message = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    assert recording_observer.stages == ["claim", "claim", "render", "send", "ack"]
+    assert recording_observer.events == [("sent", message.id)]
+
+
+@override_settings(EMAIL_BACKEND="email_relay.backend.RelayDatabaseEmailBackend")
+def test_backend_stages(recording_observer):
+    send_mail("Subject", "Body", "from@example.com", ["to@example.com"])
+
+    assert recording_observer.stages == ["serialize", "insert"]
+
+
+def test_stage_stats_observer():
+    observer = StageStatsObserver()
+
+    for _ in range(2):
+        with observer.stage("send"):
+            pass
+    with observer.stage("ack"):
+        pass
+
+    summary = observer.summary()
+
+    assert summary.startswith("send 2x avg ")
+    assert ", ack 1x avg " in summary
+    assert observer.summary() == ""
+
+
+def test_composite_observer_stage():
+    first, second = StageStatsObserver(), StageStatsObserver()
+    observer = CompositeObserver([first, second])
+
+    with observer.stage("send"):
+        pass
+
+    assert first.stats["send"][0] == 1
+    assert second.stats["send"][0] == 1
+    assert observer.summary().count("send 1x") == 2
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "RELAY_OBSERVERS": ["email_relay.instrumentation.StageStatsObserver"]
+    }
+)
+def test_send_all_logs_stage_stats(mailoutbox, caplog):
+    caplog.set_level(logging.INFO)
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    assert "sent 1 emails, deferred 0 emails, failed 0 emails (claim 2x" in (
+        caplog.text
+    )
+    assert "send 1x avg" in caplog.text
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import datetime
+import threading
+from unittest import mock
+
+import pytest
+from django.db import connections
+from django.db import router
+from django.test import override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.leader import LEADER_LEASE_NAME
+from email_relay.leader import LeaderElection
+from email_relay.management.commands.runrelay import Command
+from email_relay.models import Lease
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture
+def leader():
+    return LeaderElection(identity="leader")
+
+
+@pytest.fixture
+def standby():
+    return LeaderElection(identity="standby")
+
+
+def test_uses_lease_on_sqlite(leader):
+    assert not leader.uses_advisory_lock
+
+
+@pytest.mark.django_db(databases=["default"], transaction=True)
+def test_acquire_without_relay_database():
+    # As with the standalone relay service, which has no database router and
+    # only a `default` database.
+    with mock.patch.object(router, "routers", []):
+        with connections["default"].schema_editor() as schema_editor:
+            schema_editor.create_model(Lease)
+        try:
+            leader = LeaderElection(identity="leader")
+
+            assert leader.using == "default"
+            assert leader.acquire()
+            assert Lease.objects.get(name=LEADER_LEASE_NAME).holder == "leader"
+        finally:
+            with connections["default"].schema_editor() as schema_editor:
+                schema_editor.delete_model(Lease)
+
+
+def test_acquire(leader):
+    assert leader.acquire()
+    assert leader.is_leader
+
+    lease = Lease.objects.get(name=LEADER_LEASE_NAME)
+
+    assert lease.holder == "leader"
+    assert lease.expires_at > timezone.now()
+
+
+def test_acquire_renews(leader):
+    leader.acquire()
+    expires_at = Lease.objects.get(name=LEADER_LEASE_NAME).expires_at
+
+    assert leader.acquire()
+    assert Lease.objects.get(name=LEADER_LEASE_NAME).expires_at >= expires_at
+    assert Lease.objects.count() == 1
+
+
+def test_standby_cannot_acquire(leader, standby):
+    assert leader.acquire()
+    assert not standby.acquire()
+    assert not standby.is_leader
+
+
+def test_standby_takes_over_expired_lease(leader, standby):
+    leader.acquire()
+    Lease.objects.filter(name=LEADER_LEASE_NAME).update(
+        expires_at=timezone.now() - datetime.timedelta(seconds=1)
+    )
+
+    assert standby.acquire()
+    assert not leader.acquire()
+    assert Lease.objects.get(name=LEADER_LEASE_NAME).holder == "standby"
+
+
+def test_release(leader, standby):
+    leader.acquire()
+    leader.release()
+
+    assert not leader.is_leader
+    assert standby.acquire()
+
+
+def test_heartbeat(leader):
+    assert not leader.heartbeat()
+
+    leader.acquire()
+
+    assert leader.heartbeat()
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_LEADER_LEASE_SECONDS": 0})
+def test_heartbeat_detects_lost_leadership(leader):
+    leader.acquire()
+    Lease.objects.filter(name=LEADER_LEASE_NAME).update(
+        holder="standby", expires_at=timezone.now() + datetime.timedelta(minutes=1)
+    )
+
+    assert not leader.heartbeat()
+    assert not leader.is_leader
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMPTY_QUEUE_SLEEP": 0,
+        "RELAY_LEADER_ELECTION": True,
+        "RELAY_LEADER_POLL_SECONDS": 0,
+    }
+)
+def test_runrelay_standby_does_not_send(standby, mailoutbox):
+    standby.acquire()
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    Command().handle(_loop_count=1)
+
+    assert len(mailoutbox) == 0
+    assert Lease.objects.get(name=LEADER_LEASE_NAME).holder == "standby"
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMPTY_QUEUE_SLEEP": 0,
+        "RELAY_LEADER_ELECTION": True,
+    }
+)
+def test_runrelay_leader_sends_and_releases(mailoutbox):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    Command().handle(_loop_count=1)
+
+    assert len(mailoutbox) == 1
+    assert not Lease.objects.exists()
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMPTY_QUEUE_SLEEP": 30,
+        "RELAY_LEADER_ELECTION": True,
+        "RELAY_LEADER_LEASE_SECONDS": 10,
+    }
+)
+def test_runrelay_leader_renews_lease_while_sleeping(standby):
+    start = timezone.now()
+    elapsed = 0.0
+    waits = []
+    standby_acquired = []
+
+    class Stopping(threading.Event):
+        def wait(self, timeout=None):
+            nonlocal elapsed
+            waits.append(timeout)
+            elapsed += timeout
+            if elapsed >= 30 - 1e-6:
+                # The standby tries to take over at the end of the leader's sleep.
+                standby_acquired.append(standby.acquire())
+                self.set()
+            return self.is_set()
+
+    now = mock.patch(
+        "email_relay.leader.timezone.now",
+        side_effect=lambda: start + datetime.timedelta(seconds=elapsed),
+    )
+    with mock.patch("time.monotonic", side_effect=lambda: elapsed), now:
+        Command().run_relay(stopping=Stopping())
+
+    assert len(waits) > 1
+    assert max(waits) <= 10 / 3
+    assert standby_acquired == [False]
+
+
+@override_settings(
+    DJANGO_EMAIL_RELAY={
+        "EMPTY_QUEUE_SLEEP": 30,
+        "RELAY_LEADER_ELECTION": True,
+    }
+)
+def test_runrelay_stops_waiting_when_leadership_lost():
+    leader = LeaderElection(identity="leader")
+    leader.acquire()
+    stopping = threading.Event()
+
+    heartbeat = mock.patch.object(leader, "heartbeat", return_value=False)
+    with heartbeat, mock.patch.object(stopping, "wait", return_value=False) as wait:
+        Command().wait(stopping, 30, leader)
+
+    wait.assert_called_once_with(10 / 3)
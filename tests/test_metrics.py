@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import smtplib
+import socket
+import urllib.request
+from unittest import mock
+
+import pytest
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.metrics import RelayMetrics
+from email_relay.metrics import get_metrics
+from email_relay.models import Priority
+from email_relay.models import Status
+from email_relay.relay import send_all
+
+pytest.importorskip("prometheus_client")
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture
+def metrics():
+    metrics = RelayMetrics()
+    with mock.patch("email_relay.relay.get_observer", return_value=metrics):
+        yield metrics
+
+
+def test_get_metrics_disabled():
+    assert get_metrics() is None
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_METRICS_PORT": 9100})
+def test_get_metrics_enabled():
+    assert isinstance(get_metrics(), RelayMetrics)
+    assert get_metrics() is get_metrics()
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_METRICS_PORT": 9100})
+def test_get_metrics_no_prometheus_client(caplog):
+    caplog.set_level(logging.WARNING)
+
+    with mock.patch("email_relay.metrics.prometheus_client", None):
+        assert get_metrics() is None
+
+    assert "prometheus_client is not installed" in caplog.text
+
+
+def test_send_all_records_metrics(metrics, mailoutbox):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=2,
+    )
+
+    send_all()
+
+    registry = metrics.registry
+    assert (
+        registry.get_sample_value("email_relay_messages_total", {"outcome": "sent"})
+        == 2
+    )
+    assert registry.get_sample_value("email_relay_enqueue_to_send_seconds_count") == 2
+    assert registry.get_sample_value("email_relay_send_duration_seconds_count") == 2
+    assert registry.get_sample_value("email_relay_loop_duration_seconds_count") == 1
+    assert registry.get_sample_value("email_relay_batch_size_sum") == 2
+    assert registry.get_sample_value("email_relay_retry_count_count") == 2
+
+
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_records_deferred_metrics(mock_send, metrics):
+    mock_send.side_effect = smtplib.SMTPServerDisconnected("gone")
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    assert (
+        metrics.registry.get_sample_value(
+            "email_relay_messages_total", {"outcome": "deferred"}
+        )
+        == 1
+    )
+
+
+def test_queue_depth(metrics):
+    baker.make(
+        "email_relay.Message",
+        status=Status.QUEUED,
+        priority=Priority.HIGH,
+        _quantity=3,
+    )
+
+    assert (
+        metrics.registry.get_sample_value(
+            "email_relay_queue_depth", {"status": "queued", "priority": "high"}
+        )
+        == 3
+    )
+    assert (
+        metrics.registry.get_sample_value(
+            "email_relay_queue_depth", {"status": "sent", "priority": "low"}
+        )
+        == 0
+    )
+
+
+def test_queue_depth_is_cached(metrics):
+    metrics.queue_depth.get_counts()
+    baker.make("email_relay.Message", status=Status.QUEUED)
+
+    assert (
+        metrics.registry.get_sample_value(
+            "email_relay_queue_depth", {"status": "queued", "priority": "low"}
+        )
+        == 0
+    )
+
+
+def test_start_server(metrics):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "RELAY_METRICS_ADDR": "127.0.0.1",
+            "RELAY_METRICS_PORT": port,
+        }
+    ):
+        metrics.start_server()
+
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+        assert b"email_relay_batch_size" in response.read()
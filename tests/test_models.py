@@ -3,6 +3,7 @@ from __future__ import annotations
 import base64
 import datetime
 from email.mime.base import MIMEBase
+from unittest import mock
 
 import pytest
 from django.core.mail import EmailMessage
@@ -12,6 +13,7 @@ from django.utils import timezone
 from model_bakery import baker
 
 from email_relay.models import Message
+from email_relay.models import MessageQuerySet
 from email_relay.models import Priority
 from email_relay.models import Status
 
@@ -32,6 +34,139 @@ class TestMessageManager:
 
         assert len(message_batch) == 10
 
+    def test_get_message_batch_single_query(self, django_assert_num_queries):
+        baker.make("email_relay.Message", status=Status.QUEUED, _quantity=5)
+        baker.make("email_relay.Message", status=Status.DEFERRED, _quantity=5)
+
+        with django_assert_num_queries(1, using="email_relay_db"):
+            Message.objects.get_message_batch()
+
+    def test_get_message_batch_empty(self, django_assert_num_queries):
+        baker.make("email_relay.Message", status=Status.SENT)
+        baker.make("email_relay.Message", status=Status.FAILED)
+
+        with django_assert_num_queries(1, using="email_relay_db"):
+            assert Message.objects.get_message_batch() == []
+
+    @override_settings(DJANGO_EMAIL_RELAY={"EMAIL_MAX_BATCH": 2})
+    def test_reserve_message_batch(self):
+        messages = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=3)
+
+        first = Message.objects.reserve_message_batch()
+        second = Message.objects.reserve_message_batch()
+
+        assert first == messages[:2]
+        assert second == messages[2:]
+        assert Message.objects.reserve_message_batch() == []
+        assert Message.objects.get_message_batch() == []
+        assert all(message.reserved_until is not None for message in first)
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={"EMAIL_MAX_BATCH": 2, "PRIORITY_WEIGHTS": {3: 2, 1: 1}}
+    )
+    def test_reserve_message_batch_with_priority_weights(self):
+        baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.HIGH,
+            _quantity=2,
+        )
+        baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+
+        first = Message.objects.reserve_message_batch()
+        second = Message.objects.reserve_message_batch()
+
+        assert len(first) == len(second) == 2
+        assert not {message.id for message in first} & {
+            message.id for message in second
+        }
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={"EMAIL_MAX_BATCH": 2, "PRIORITY_WEIGHTS": {3: 2, 1: 1}}
+    )
+    def test_reserve_message_batch_with_priority_weights_refills(self):
+        messages = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=4)
+        locked_by_other = {messages[0].id, messages[2].id}
+
+        def select_for_update(queryset, **kwargs):
+            # Another relay process has locked some of the picked messages.
+            return queryset.exclude(id__in=locked_by_other)
+
+        with mock.patch.object(MessageQuerySet, "select_for_update", select_for_update):
+            message_batch = Message.objects.reserve_message_batch()
+
+        assert message_batch == [messages[1], messages[3]]
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={"EMAIL_MAX_BATCH": 2, "PRIORITY_WEIGHTS": {3: 2, 1: 1}}
+    )
+    def test_reserve_message_batch_with_priority_weights_all_locked(self):
+        messages = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+
+        def select_for_update(queryset, **kwargs):
+            return queryset.exclude(id__in=[message.id for message in messages])
+
+        with mock.patch.object(MessageQuerySet, "select_for_update", select_for_update):
+            assert Message.objects.reserve_message_batch() == []
+
+    def test_reserve_message_batch_reservation_runs_out(self):
+        message = baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            reserved_until=timezone.now() - datetime.timedelta(seconds=1),
+        )
+
+        assert Message.objects.reserve_message_batch() == [message]
+
+    def test_release_reservations(self):
+        messages = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+        Message.objects.reserve_message_batch()
+
+        assert Message.objects.release_reservations(messages) == 2
+        assert Message.objects.get_message_batch() == messages
+
+    def test_claim_messages_clears_reservation(self):
+        baker.make("email_relay.Message", status=Status.QUEUED)
+        (message,) = Message.objects.reserve_message_batch()
+
+        Message.objects.claim_messages([message])
+
+        message.refresh_from_db()
+        assert message.status == Status.SENDING
+        assert message.reserved_until is None
+
+    def test_get_message_batch_order(self):
+        deferred_high = baker.make(
+            "email_relay.Message", status=Status.DEFERRED, priority=Priority.HIGH
+        )
+        queued_low = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.LOW
+        )
+        queued_high = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.HIGH
+        )
+        deferred_low = baker.make(
+            "email_relay.Message", status=Status.DEFERRED, priority=Priority.LOW
+        )
+
+        message_batch = Message.objects.get_message_batch()
+
+        assert message_batch == [queued_high, queued_low, deferred_high, deferred_low]
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_MAX_BATCH": 3,
+        }
+    )
+    def test_get_message_batch_with_max_batch_size_prefers_queued(self):
+        baker.make("email_relay.Message", status=Status.DEFERRED, _quantity=5)
+        queued = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+
+        message_batch = Message.objects.get_message_batch()
+
+        assert message_batch[:2] == queued
+        assert message_batch[2].status == Status.DEFERRED
+
     @override_settings(
         DJANGO_EMAIL_RELAY={
             "EMAIL_MAX_BATCH": 1,
@@ -45,6 +180,95 @@ class TestMessageManager:
 
         assert len(message_batch) == 1
 
+    @override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_MAX_BATCH": 6,
+            "PRIORITY_WEIGHTS": {Priority.HIGH: 3, Priority.MEDIUM: 2, Priority.LOW: 1},
+        }
+    )
+    def test_get_message_batch_with_priority_weights(self):
+        baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.HIGH,
+            _quantity=10,
+        )
+        baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.MEDIUM,
+            _quantity=10,
+        )
+        baker.make(
+            "email_relay.Message",
+            status=Status.DEFERRED,
+            priority=Priority.LOW,
+            _quantity=10,
+        )
+
+        message_batch = Message.objects.get_message_batch()
+
+        priorities = [message.priority for message in message_batch]
+        assert len(message_batch) == 6
+        assert priorities.count(Priority.HIGH) == 3
+        assert priorities.count(Priority.MEDIUM) == 2
+        assert priorities.count(Priority.LOW) == 1
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_MAX_BATCH": 4,
+            "PRIORITY_WEIGHTS": {Priority.HIGH: 3, Priority.MEDIUM: 2, Priority.LOW: 1},
+        }
+    )
+    def test_get_message_batch_with_priority_weights_redistributes_unused_share(
+        self,
+    ):
+        baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.HIGH,
+            _quantity=1,
+        )
+        baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.LOW,
+            _quantity=10,
+        )
+
+        message_batch = Message.objects.get_message_batch()
+
+        priorities = [message.priority for message in message_batch]
+        assert priorities == [Priority.HIGH, Priority.LOW, Priority.LOW, Priority.LOW]
+
+    @override_settings(DJANGO_EMAIL_RELAY={"PRIORITY_WEIGHTS": {Priority.HIGH: 2}})
+    def test_get_message_batch_with_priority_weights_oldest_first(self):
+        newer = baker.make("email_relay.Message", status=Status.QUEUED)
+        older = baker.make("email_relay.Message", status=Status.DEFERRED)
+        Message.objects.filter(id=older.id).update(
+            created_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        message_batch = Message.objects.get_message_batch()
+
+        assert message_batch == [older, newer]
+
+    @override_settings(DJANGO_EMAIL_RELAY={"PRIORITY_AGING_SECONDS": 60})
+    def test_get_message_batch_with_priority_aging(self):
+        high = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.HIGH
+        )
+        low = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.LOW
+        )
+        Message.objects.filter(id=low.id).update(
+            created_at=timezone.now() - datetime.timedelta(seconds=121)
+        )
+
+        message_batch = Message.objects.get_message_batch()
+
+        assert message_batch == [low, high]
+
     def test_get_message_for_sending(self):
         message = baker.make("email_relay.Message", status=Status.QUEUED)
 
@@ -69,6 +293,151 @@ class TestMessageManager:
     def test_messages_available_to_send_with_no_messages(self):
         assert not Message.objects.messages_available_to_send()
 
+    def test_release_scheduled_messages(self):
+        due = baker.make(
+            "email_relay.Message",
+            status=Status.SCHEDULED,
+            send_at=timezone.now() - datetime.timedelta(minutes=1),
+        )
+        not_due = baker.make(
+            "email_relay.Message",
+            status=Status.SCHEDULED,
+            send_at=timezone.now() + datetime.timedelta(hours=1),
+        )
+
+        released = Message.objects.release_scheduled_messages()
+
+        due.refresh_from_db()
+        not_due.refresh_from_db()
+        assert released == 1
+        assert due.status == Status.QUEUED
+        assert not_due.status == Status.SCHEDULED
+
+    def test_scheduled_messages_not_in_batch(self):
+        baker.make(
+            "email_relay.Message",
+            status=Status.SCHEDULED,
+            send_at=timezone.now() + datetime.timedelta(hours=1),
+        )
+
+        assert Message.objects.get_message_batch() == []
+        assert not Message.objects.messages_available_to_send()
+
+    def test_expire_messages(self):
+        past = timezone.now() - datetime.timedelta(minutes=1)
+        future = timezone.now() + datetime.timedelta(hours=1)
+        expired = [
+            baker.make("email_relay.Message", status=status, expires_at=past)
+            for status in [Status.QUEUED, Status.DEFERRED, Status.SCHEDULED]
+        ]
+        not_expired = [
+            baker.make("email_relay.Message", status=Status.QUEUED, expires_at=future),
+            baker.make("email_relay.Message", status=Status.QUEUED),
+            baker.make("email_relay.Message", status=Status.FAILED, expires_at=past),
+            baker.make("email_relay.Message", status=Status.SENT, expires_at=past),
+        ]
+
+        assert Message.objects.expire_messages() == 3
+
+        for message in expired:
+            message.refresh_from_db()
+            assert message.status == Status.EXPIRED
+        for message in not_expired:
+            message.refresh_from_db()
+            assert message.status != Status.EXPIRED
+
+    @override_settings(
+        DJANGO_EMAIL_RELAY={"MESSAGES_TTL_SECONDS": {Priority.HIGH: 60}},
+    )
+    def test_expire_messages_with_ttl(self):
+        stale_high = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.HIGH
+        )
+        stale_low = baker.make(
+            "email_relay.Message", status=Status.QUEUED, priority=Priority.LOW
+        )
+        fresh_high = baker.make(
+            "email_relay.Message", status=Status.DEFERRED, priority=Priority.HIGH
+        )
+        released_high = baker.make(
+            "email_relay.Message",
+            status=Status.QUEUED,
+            priority=Priority.HIGH,
+            send_at=timezone.now(),
+        )
+        Message.objects.filter(
+            id__in=[stale_high.id, stale_low.id, released_high.id]
+        ).update(created_at=timezone.now() - datetime.timedelta(hours=1))
+
+        assert Message.objects.expire_messages() == 1
+        assert list(Message.objects.expired()) == [stale_high]
+        assert Message.objects.get(id=fresh_high.id).status == Status.DEFERRED
+
+    def test_claim_messages(self):
+        messages = baker.make("email_relay.Message", status=Status.QUEUED, _quantity=2)
+        untouched = baker.make("email_relay.Message", status=Status.QUEUED)
+
+        Message.objects.claim_messages(messages)
+
+        for message in messages:
+            assert message.status == Status.SENDING
+            message.refresh_from_db()
+            assert message.status == Status.SENDING
+            assert message.claimed_at is not None
+        untouched.refresh_from_db()
+        assert untouched.status == Status.QUEUED
+        assert Message.objects.get_message_batch() == [untouched]
+
+    @pytest.mark.parametrize(
+        ("action", "status", "retry_count"),
+        [
+            ("fail", Status.FAILED, 0),
+            ("defer", Status.DEFERRED, 1),
+        ],
+    )
+    def test_reconcile_sending_messages(self, action, status, retry_count):
+        now = timezone.now()
+        stale = baker.make(
+            "email_relay.Message",
+            status=Status.SENDING,
+            claimed_at=now - datetime.timedelta(seconds=601),
+        )
+        in_flight = baker.make(
+            "email_relay.Message",
+            status=Status.SENDING,
+            claimed_at=now - datetime.timedelta(seconds=60),
+        )
+
+        with override_settings(
+            DJANGO_EMAIL_RELAY={"EMAIL_STALE_SENDING_ACTION": action}
+        ):
+            assert Message.objects.reconcile_sending_messages(now) == 1
+
+        stale.refresh_from_db()
+        in_flight.refresh_from_db()
+        assert stale.status == status
+        assert stale.retry_count == retry_count
+        assert "relay service stopped while sending" in stale.log
+        assert in_flight.status == Status.SENDING
+
+    @pytest.mark.parametrize(
+        ("retry_count", "status"),
+        [
+            (0, Status.QUEUED),
+            (2, Status.DEFERRED),
+        ],
+    )
+    def test_release(self, retry_count, status):
+        message = baker.make(
+            "email_relay.Message", status=Status.SENDING, retry_count=retry_count
+        )
+
+        message.release()
+
+        message.refresh_from_db()
+        assert message.status == status
+        assert message.retry_count == retry_count
+
     def test_delete_all_sent_messages(self):
         baker.make("email_relay.Message", status=Status.SENT, _quantity=5)
 
@@ -141,6 +510,30 @@ class TestMessageQuerySet:
         assert queryset[1] == messages_with_priority["medium"]
         assert queryset[2] == messages_with_priority["low"]
 
+    @pytest.mark.parametrize(
+        ("age", "expected"),
+        [
+            (0, Priority.LOW),
+            (61, Priority.MEDIUM),
+            (121, Priority.HIGH),
+            (600, Priority.HIGH),
+        ],
+    )
+    @override_settings(DJANGO_EMAIL_RELAY={"PRIORITY_AGING_SECONDS": 60})
+    def test_with_effective_priority(self, age, expected):
+        message = baker.make("email_relay.Message", priority=Priority.LOW)
+        Message.objects.filter(id=message.id).update(
+            created_at=timezone.now() - datetime.timedelta(seconds=age)
+        )
+
+        assert Message.objects.with_effective_priority().get().effective_priority == (
+            expected
+        )
+
+    def test_with_effective_priority_without_aging(self, messages_with_priority):
+        for message in Message.objects.with_effective_priority():
+            assert message.effective_priority == message.priority
+
     def test_high_priority(self, messages_with_priority):
         queryset = Message.objects.high_priority()
 
@@ -209,6 +602,150 @@ class TestMessageQuerySet:
         assert now not in queryset
         assert not_sent not in queryset
 
+    def test_requeue(self, messages_with_status):
+        expired = baker.make("email_relay.Message", status=Status.EXPIRED)
+        Message.objects.filter(id=messages_with_status["failed"].id).update(
+            retry_count=3, log="error"
+        )
+
+        count = Message.objects.requeue(chunk_size=2)
+
+        assert count == 3
+        assert Message.objects.queued().count() == 4
+        assert Message.objects.sent().count() == 1
+        failed = Message.objects.get(id=messages_with_status["failed"].id)
+        assert failed.status == Status.QUEUED
+        assert failed.retry_count == 0
+        assert failed.log == ""
+        expired.refresh_from_db()
+        assert expired.status == Status.QUEUED
+
+    def test_fail(self, messages_with_status):
+        scheduled = baker.make("email_relay.Message", status=Status.SCHEDULED)
+
+        count = Message.objects.fail(log="cancelled", chunk_size=1)
+
+        assert count == 3
+        assert set(Message.objects.failed().values_list("log", flat=True)) == {
+            "",
+            "cancelled",
+        }
+        scheduled.refresh_from_db()
+        assert scheduled.status == Status.FAILED
+        assert Message.objects.sent().count() == 1
+
+    def test_cancel(self, messages_with_status):
+        count = Message.objects.cancel(log="cancelled", chunk_size=1)
+
+        assert count == 2
+        assert Message.objects.cancelled().count() == 2
+        assert messages_with_status["queued"] in Message.objects.cancelled()
+        assert messages_with_status["deferred"] in Message.objects.cancelled()
+
+    def test_requeue_cancelled(self):
+        baker.make("email_relay.Message", status=Status.CANCELLED)
+
+        assert Message.objects.requeue() == 1
+        assert Message.objects.queued().count() == 1
+
+    def test_matching(self):
+        match = baker.make(
+            "email_relay.Message",
+            data={
+                "from_email": "Alerts <alerts@example.com>",
+                "to": ["to@example.com"],
+                "cc": ["CC@Example.org"],
+            },
+            status=Status.FAILED,
+            priority=Priority.HIGH,
+            log="Connection refused",
+        )
+        baker.make(
+            "email_relay.Message",
+            data={"from_email": "alerts@example.com", "to": ["to@example.com"]},
+            status=Status.FAILED,
+            priority=Priority.HIGH,
+            log="Connection refused",
+        )
+
+        queryset = Message.objects.matching(
+            statuses=[Status.FAILED],
+            priorities=[Priority.HIGH],
+            created_after=timezone.now() - datetime.timedelta(hours=1),
+            created_before=timezone.now(),
+            sender="alerts@",
+            recipient="cc@example.org",
+            log="refused",
+        )
+
+        assert list(queryset) == [match]
+
+    def test_matching_no_filters(self, messages_with_status):
+        assert Message.objects.matching().count() == 4
+
+    def test_update_in_chunks(self, django_assert_num_queries):
+        messages = baker.make("email_relay.Message", priority=Priority.LOW, _quantity=5)
+
+        # one query to find each chunk of ids and one to update it, with a
+        # last query finding no more ids
+        with django_assert_num_queries(7, using="email_relay_db"):
+            count = Message.objects.all().update_in_chunks(2, priority=Priority.HIGH)
+
+        assert count == 5
+        assert Message.objects.filter(priority=Priority.HIGH).count() == 5
+        updated = Message.objects.get(id=messages[0].id)
+        assert updated.updated_at > messages[0].updated_at
+
+    def test_update_in_chunks_rows_stop_matching(self):
+        baker.make("email_relay.Message", status=Status.QUEUED, _quantity=5)
+
+        count = Message.objects.queued().update_in_chunks(2, status=Status.FAILED)
+
+        assert count == 5
+        assert Message.objects.failed().count() == 5
+
+    def test_requeue_keeps_filters_for_each_chunk(self):
+        messages = baker.make(
+            "email_relay.Message", status=Status.DEFERRED, _quantity=2
+        )
+        id_chunks = MessageQuerySet._id_chunks
+
+        def claim_after_reading_ids(queryset, chunk_size):
+            for ids in id_chunks(queryset, chunk_size):
+                # the relay claims a message between reading ids and updating
+                Message.objects.filter(id=messages[1].id).update(status=Status.SENDING)
+                yield ids
+
+        with mock.patch.object(MessageQuerySet, "_id_chunks", claim_after_reading_ids):
+            count = Message.objects.requeue()
+
+        assert count == 1
+        assert Message.objects.get(id=messages[0].id).status == Status.QUEUED
+        assert Message.objects.get(id=messages[1].id).status == Status.SENDING
+
+    def test_delete_in_chunks_keeps_filters_for_each_chunk(self):
+        message = baker.make("email_relay.Message", status=Status.SENT)
+        id_chunks = MessageQuerySet._id_chunks
+
+        def requeue_after_reading_ids(queryset, chunk_size):
+            for ids in id_chunks(queryset, chunk_size):
+                Message.objects.filter(id=message.id).update(status=Status.QUEUED)
+                yield ids
+
+        with mock.patch.object(
+            MessageQuerySet, "_id_chunks", requeue_after_reading_ids
+        ):
+            count = Message.objects.sent().delete_in_chunks()
+
+        assert count == 0
+        assert Message.objects.queued().get() == message
+
+    def test_delete_in_chunks(self, messages_with_status):
+        count = Message.objects.exclude(status=Status.SENT).delete_in_chunks(2)
+
+        assert count == 3
+        assert list(Message.objects.all()) == [messages_with_status["sent"]]
+
 
 @pytest.mark.django_db(databases=["default", "email_relay_db"])
 class TestMessageModel:
@@ -249,6 +786,24 @@ class TestMessageModel:
 
         assert data["subject"] in str(message)
 
+    def test_str_summary(self, email):
+        message = Message()
+        message.email = email
+
+        assert str(message).endswith('"Test" to to@example.com')
+
+    def test_email_setter_summary(self, email):
+        email.subject = "s" * 300
+        email.to = [f"to{i}@example.com" for i in range(30)]
+        message = Message()
+
+        message.email = email
+
+        assert len(message.subject) == 255
+        assert message.subject.endswith("…")
+        assert len(message.recipient_summary) == 255
+        assert message.recipient_summary.startswith("to0@example.com, to1@")
+
     def test_str_invalid_data(self):
         message = baker.make("email_relay.Message", data={})
 
@@ -312,6 +867,30 @@ class TestMessageModel:
         assert message.data["from_email"] == email.from_email
         assert message.data["to"] == email.to
 
+    def test_email_setter_scheduled(self, email):
+        send_at = timezone.now() + datetime.timedelta(hours=1)
+        email.send_at = send_at
+
+        message = Message(email=email)
+
+        assert message.send_at == send_at
+        assert message.status == Status.SCHEDULED
+
+    def test_email_setter_send_at_in_past(self, email):
+        email.send_at = timezone.now() - datetime.timedelta(hours=1)
+
+        message = Message(email=email)
+
+        assert message.status == Status.QUEUED
+
+    def test_email_setter_expires_at(self, email):
+        expires_at = timezone.now() + datetime.timedelta(hours=1)
+        email.expires_at = expires_at
+
+        message = Message(email=email)
+
+        assert message.expires_at == expires_at
+
     def test_email_with_plain_text_attachment(self, email):
         attachment_content = b"Hello World!"
         email.attach(
@@ -442,3 +1021,72 @@ class TestMessageModel:
         message.email.send()
 
         assert len(mailoutbox) == 1
+
+
+class TestRecipients:
+    @pytest.fixture
+    def message(self):
+        return Message(
+            data={
+                "subject": "Test",
+                "to": ["to@example.com", "Bounce <Bounce@example.com>"],
+                "cc": ["cc@example.com"],
+                "bcc": ["bcc@example.com"],
+            }
+        )
+
+    def test_recipients(self, message):
+        assert message.recipients == [
+            "to@example.com",
+            "Bounce <Bounce@example.com>",
+            "cc@example.com",
+            "bcc@example.com",
+        ]
+
+    def test_pending_recipients(self, message):
+        assert message.pending_recipients() == message.recipients
+
+        message.record_recipients(sent=["to@example.com"])
+        message.record_recipients(failed={"bounce@example.com": "550 Refused"})
+
+        assert message.pending_recipients() == ["cc@example.com", "bcc@example.com"]
+        assert message.recipient_state == {
+            "sent": ["to@example.com"],
+            "failed": {"bounce@example.com": "550 Refused"},
+        }
+
+    def test_email_envelope_recipients(self, message):
+        message.record_recipients(sent=["to@example.com", "bcc@example.com"])
+
+        email = message.email
+
+        assert email.recipients() == ["Bounce <Bounce@example.com>", "cc@example.com"]
+        assert email.to == ["to@example.com", "Bounce <Bounce@example.com>"]
+
+    def test_email_all_recipients(self, message):
+        assert message.email.recipients() == message.recipients
+
+    def test_split(self, message):
+        message.priority = Priority.HIGH
+
+        messages = message.split(2)
+
+        assert [message.recipients for message in messages] == [
+            ["to@example.com", "Bounce <Bounce@example.com>"],
+            ["cc@example.com", "bcc@example.com"],
+        ]
+        assert all(message.priority == Priority.HIGH for message in messages)
+        assert all(message.pk is None for message in messages)
+
+    def test_split_idempotency_key(self, message):
+        message.idempotency_key = "x" * 255
+
+        messages = message.split(2)
+
+        assert len(messages) == 2
+        assert all(len(message.idempotency_key) <= 255 for message in messages)
+        assert messages[0].idempotency_key != messages[1].idempotency_key
+
+    def test_split_disabled(self, message):
+        assert message.split(None) == [message]
+        assert message.split(4) == [message]
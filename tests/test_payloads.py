@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import pytest
+
+from email_relay import payloads
+from email_relay.email import RelayEmailData
+from email_relay.payloads import needs_upgrade
+from email_relay.payloads import parse_version
+from email_relay.payloads import register_upgrader
+from email_relay.payloads import upgrade_payload
+
+
+@pytest.fixture
+def upgraders():
+    registered = list(payloads._upgraders)
+    yield
+    payloads._upgraders[:] = registered
+
+
+@pytest.mark.parametrize(
+    ("version", "expected"),
+    [
+        (None, (0,)),
+        ("", (0,)),
+        ("0.4.0", (0, 4, 0)),
+        ("1.10.2", (1, 10, 2)),
+        ("1.0.0a1", (1, 0, 0)),
+    ],
+)
+def test_parse_version(version, expected):
+    assert parse_version(version) == expected
+
+
+def test_parse_version_ordering():
+    assert parse_version("0.10.0") > parse_version("0.9.1") > parse_version(None)
+
+
+def test_upgrade_old_schema():
+    data = {
+        "subject": "Test",
+        "message": "Here is the message.",
+        "recipient_list": ["to@example.com"],
+        "html_message": "<p>HTML</p>",
+    }
+
+    upgraded = upgrade_payload(data)
+
+    assert upgraded == {
+        "subject": "Test",
+        "body": "Here is the message.",
+        "to": ["to@example.com"],
+        "cc": [],
+        "bcc": [],
+        "reply_to": [],
+        "extra_headers": {},
+        "alternatives": [("<p>HTML</p>", "text/html")],
+        "_email_relay_version": "0.2.0",
+    }
+    assert "body" not in data
+
+
+def test_upgrade_unversioned_current_schema():
+    data = RelayEmailData(subject="Test", body="Body", to=["to@example.com"]).to_dict()
+    del data["_email_relay_version"]
+
+    assert upgrade_payload(data) == {**data, "_email_relay_version": "0.2.0"}
+
+
+def test_upgrade_keeps_current_schema_keys():
+    data = {"subject": "Test", "to": ["to@example.com"]}
+
+    upgraded = upgrade_payload(data)
+
+    assert upgraded["to"] == ["to@example.com"]
+    assert upgraded["body"] == ""
+
+
+def test_current_payload_not_upgraded():
+    data = RelayEmailData(subject="Test").to_dict()
+
+    assert not needs_upgrade(data)
+    assert upgrade_payload(data) is data
+
+
+@pytest.mark.usefixtures("upgraders")
+def test_register_upgrader():
+    @register_upgrader("99.0.0")
+    def rename_subject(data):
+        data["subject"] = data.pop("title")
+        return data
+
+    @register_upgrader("98.0.0")
+    def add_title(data):
+        data["title"] = "Test"
+        return data
+
+    data = RelayEmailData(body="Body").to_dict()
+    del data["subject"]
+
+    assert needs_upgrade(data)
+
+    upgraded = upgrade_payload(data)
+
+    assert upgraded["subject"] == "Test"
+    assert upgraded["_email_relay_version"] == "99.0.0"
+    assert not needs_upgrade(upgraded)
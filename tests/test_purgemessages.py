@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+def test_purgemessages():
+    for status in Status:
+        baker.make("email_relay.Message", status=status)
+    out = StringIO()
+
+    call_command("purgemessages", "--chunk-size", "2", stdout=out)
+
+    assert out.getvalue() == "deleted 4 messages\n"
+    assert set(Message.objects.values_list("status", flat=True)) == {
+        Status.QUEUED,
+        Status.DEFERRED,
+        Status.SCHEDULED,
+        Status.SENDING,
+    }
+
+
+def test_purgemessages_created_before():
+    old = baker.make("email_relay.Message", status=Status.SENT, _quantity=2)
+    Message.objects.filter(id__in=[message.id for message in old]).update(
+        created_at=timezone.now() - datetime.timedelta(days=30)
+    )
+    new = baker.make("email_relay.Message", status=Status.SENT)
+    cutoff = (timezone.now() - datetime.timedelta(days=7)).date().isoformat()
+    out = StringIO()
+
+    call_command("purgemessages", "--created-before", cutoff, stdout=out)
+
+    assert out.getvalue() == "deleted 2 messages\n"
+    assert list(Message.objects.all()) == [new]
+
+
+def test_purgemessages_dry_run():
+    baker.make("email_relay.Message", status=Status.FAILED, _quantity=3)
+    out = StringIO()
+
+    call_command("purgemessages", "--status", "failed", "--dry-run", stdout=out)
+
+    assert out.getvalue() == "would delete 3 messages\n"
+    assert Message.objects.count() == 3
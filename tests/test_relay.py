@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import datetime
 import logging
 import smtplib
 from unittest import mock
 
 import pytest
+from django.core.mail import EmailMessage
 from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.base import BaseEmailBackend
 from django.test import override_settings
+from django.utils import timezone
 from model_bakery import baker
 
 from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
@@ -29,8 +33,49 @@ def test_send_all_empty_queue(mailoutbox, caplog):
 
     assert len(mailoutbox) == 0
     assert Message.objects.count() == 0
-    assert "sending emails" in caplog.text
-    assert "sent 0 emails, deferred 0 emails, failed 0 emails" in caplog.text
+    assert "no emails to send" in caplog.text
+    assert "sending emails" not in caplog.text
+
+
+def test_send_all_skips_expired_messages(mailoutbox, caplog):
+    expired = baker.make(
+        "email_relay.Message",
+        data={"subject": "Expired", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        expires_at=timezone.now() - datetime.timedelta(seconds=1),
+    )
+
+    send_all()
+
+    expired.refresh_from_db()
+    assert len(mailoutbox) == 0
+    assert expired.status == Status.EXPIRED
+    assert "expired 1 messages" in caplog.text
+    assert "no emails to send" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_MAX_BATCH": 2})
+def test_send_all_expires_messages_before_fetching_batch(mailoutbox):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Expired", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        priority=Priority.HIGH,
+        expires_at=timezone.now() - datetime.timedelta(seconds=1),
+        _quantity=2,
+    )
+    fresh = baker.make(
+        "email_relay.Message",
+        data={"subject": "Fresh", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    fresh.refresh_from_db()
+    assert fresh.status == Status.SENT
+    assert [email.subject for email in mailoutbox] == ["Fresh"]
+    assert Message.objects.expired().count() == 2
 
 
 def test_send_all_single_message(mailoutbox, caplog):
@@ -176,7 +221,7 @@ def test_send_all_sends_email_multi_alternatives(mailoutbox, caplog):
 @mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
 def test_send_all_defer_on_smtp_error(mock_send, mailoutbox, caplog):
     mock_send.side_effect = smtplib.SMTPSenderRefused(
-        550, b"Test SMTP Error", "sender@example.com"
+        451, b"Test SMTP Error", "sender@example.com"
     )
     queued = baker.make(
         "email_relay.Message",
@@ -232,7 +277,7 @@ def test_send_all_defer_on_os_error(mock_send, mailoutbox, caplog):
 @mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
 def test_send_all_fail_after_max_retries(mock_send, mailoutbox, caplog):
     mock_send.side_effect = smtplib.SMTPSenderRefused(
-        550, b"Test SMTP Error", "sender@example.com"
+        451, b"Test SMTP Error", "sender@example.com"
     )
     queued = baker.make(
         "email_relay.Message",
@@ -392,3 +437,337 @@ def test_send_all_fail_message_no_email_object(mock_email, mailoutbox, caplog):
     assert error_msg in queued.log
     assert error_msg in caplog.text
     assert "sent 0 emails, deferred 0 emails, failed 1 emails" in caplog.text
+
+
+class ResultsEmailBackend(BaseEmailBackend):
+    results: list[Exception | None] = []
+    batches: list[list[EmailMessage]] = []
+
+    def send_messages(self, email_messages):
+        raise AssertionError("send_messages_with_results should be used instead")
+
+    def send_messages_with_results(self, email_messages):
+        self.batches.append(email_messages)
+        results = self.results[: len(email_messages)]
+        del self.results[: len(email_messages)]
+        return results
+
+
+@pytest.fixture
+def results_backend():
+    with override_settings(EMAIL_BACKEND="tests.test_relay.ResultsEmailBackend"):
+        yield ResultsEmailBackend
+    ResultsEmailBackend.results = []
+    ResultsEmailBackend.batches = []
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SEND_BATCH_SIZE": 4})
+def test_send_all_batches(mailoutbox, caplog):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=10,
+    )
+
+    send_all()
+
+    assert len(mailoutbox) == 10
+    assert Message.objects.sent().count() == 10
+    assert "sent 10 emails, deferred 0 emails, failed 0 emails" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SEND_BATCH_SIZE": 3})
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_batch_outcomes_per_message(mock_send, caplog):
+    mock_send.side_effect = [1, OSError("Test Network Error"), ValueError("Test")]
+    sent, deferred, failed = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=3,
+    )
+
+    send_all()
+
+    for message in (sent, deferred, failed):
+        message.refresh_from_db()
+    assert sent.status == Status.SENT
+    assert deferred.status == Status.DEFERRED
+    assert deferred.log == "Test Network Error"
+    assert failed.status == Status.FAILED
+    assert failed.log == "Test"
+    assert "sent 1 emails, deferred 1 emails, failed 1 emails" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SEND_BATCH_SIZE": 3})
+def test_send_all_send_messages_with_results(results_backend, caplog):
+    results_backend.results = [
+        None,
+        smtplib.SMTPRecipientsRefused({"to@example.com": (450, b"Refused")}),
+        ValueError("Test"),
+        None,
+    ]
+    sent, deferred, failed, sent_later = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=4,
+    )
+
+    send_all()
+
+    assert [len(batch) for batch in results_backend.batches] == [3, 1]
+    for message in (sent, deferred, failed, sent_later):
+        message.refresh_from_db()
+    assert sent.status == Status.SENT
+    assert deferred.status == Status.DEFERRED
+    assert failed.status == Status.FAILED
+    assert sent_later.status == Status.SENT
+    assert "sent 2 emails, deferred 1 emails, failed 1 emails" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SEND_BATCH_SIZE": 2})
+def test_send_all_send_messages_with_results_mismatch(results_backend, caplog):
+    results_backend.results = [None]
+    messages = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=2,
+    )
+
+    send_all()
+
+    for message in messages:
+        message.refresh_from_db()
+        assert message.status == Status.FAILED
+        assert "returned 1 results for 2 emails" in message.log
+
+
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_fail_on_permanent_smtp_error(mock_send, caplog):
+    mock_send.side_effect = smtplib.SMTPRecipientsRefused(
+        {"to@example.com": (550, b"Mailbox does not exist")}
+    )
+    queued = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    queued.refresh_from_db()
+
+    assert queued.status == Status.FAILED
+    assert queued.retry_count == 0
+    assert "Mailbox does not exist" in queued.log
+    assert f"permanent error sending message {queued.id}" in caplog.text
+    assert "sent 0 emails, deferred 0 emails, failed 1 emails" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SMTP_ERROR_ACTIONS": {552: "defer"}})
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_smtp_error_actions(mock_send):
+    mock_send.side_effect = smtplib.SMTPDataError(552, b"Mailbox full")
+    queued = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    queued.refresh_from_db()
+
+    assert queued.status == Status.DEFERRED
+    assert queued.retry_count == 1
+
+
+def test_send_all_split_message(mailoutbox):
+    email = EmailMessage(
+        subject="Test",
+        to=["to@example.com"],
+        bcc=[f"bcc-{n}@example.com" for n in range(3)],
+    )
+    Message.objects.bulk_create(Message(email=email).split(2))
+
+    send_all()
+
+    assert sorted(email.recipients() for email in mailoutbox) == [
+        ["bcc-1@example.com", "bcc-2@example.com"],
+        ["to@example.com", "bcc-0@example.com"],
+    ]
+    assert all(email.to == ["to@example.com"] for email in mailoutbox)
+    assert Message.objects.sent().count() == 2
+
+
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_claims_before_sending(mock_send):
+    message = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+    statuses = []
+    mock_send.side_effect = lambda: statuses.append(
+        Message.objects.get(id=message.id).status
+    )
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert statuses == [Status.SENDING]
+    assert message.status == Status.SENT
+    assert message.claimed_at is not None
+
+
+@mock.patch("django.core.mail.message.EmailMultiAlternatives.send")
+def test_send_all_left_sending_if_relay_stops(mock_send):
+    message = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+    mock_send.side_effect = KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.SENDING
+    assert Message.objects.get_message_batch() == []
+
+
+def test_send_all_reconciles_stale_sending_messages(mailoutbox, caplog):
+    stale = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.SENDING,
+        claimed_at=timezone.now() - datetime.timedelta(hours=1),
+    )
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    send_all()
+
+    stale.refresh_from_db()
+
+    assert stale.status == Status.FAILED
+    assert len(mailoutbox) == 1
+    assert "1 messages were left sending by a relay that stopped" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_STALE_SENDING_ACTION": "defer"})
+def test_send_all_reconciles_stale_sending_messages_on_empty_queue(mailoutbox):
+    stale = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.SENDING,
+        claimed_at=timezone.now() - datetime.timedelta(hours=1),
+    )
+
+    send_all()
+
+    stale.refresh_from_db()
+
+    assert stale.status == Status.SENT
+    assert stale.retry_count == 1
+    assert len(mailoutbox) == 1
+
+
+def test_send_all_releases_unsent_reservations(mailoutbox):
+    messages = baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=3,
+    )
+    calls = iter([True, False])
+
+    send_all(should_continue=lambda: next(calls))
+
+    assert len(mailoutbox) == 1
+    assert Message.objects.get_message_batch() == messages[1:]
+    assert not Message.objects.filter(reserved_until__isnull=False).exists()
+
+
+def test_send_all_sends_requeued_expired_message(mailoutbox):
+    expired = baker.make(
+        "email_relay.Message",
+        data={"subject": "Expired", "to": ["to@example.com"]},
+        status=Status.EXPIRED,
+        expires_at=timezone.now() - datetime.timedelta(seconds=1),
+    )
+
+    Message.objects.requeue()
+    send_all()
+
+    expired.refresh_from_db()
+    assert len(mailoutbox) == 1
+    assert expired.status == Status.SENT
+    assert expired.expires_at is None
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"MESSAGES_TTL_SECONDS": {Priority.LOW: 60}})
+def test_send_all_sends_requeued_message_past_ttl(mailoutbox):
+    expired = baker.make(
+        "email_relay.Message",
+        data={"subject": "Expired", "to": ["to@example.com"]},
+        status=Status.EXPIRED,
+        priority=Priority.LOW,
+    )
+    Message.objects.filter(id=expired.id).update(
+        created_at=timezone.now() - datetime.timedelta(hours=1)
+    )
+
+    Message.objects.requeue()
+    send_all()
+
+    expired.refresh_from_db()
+    assert len(mailoutbox) == 1
+    assert expired.status == Status.SENT
+
+
+def test_send_all_retries_failed_recipients_of_requeued_message(mailoutbox):
+    failed = baker.make(
+        "email_relay.Message",
+        data={"subject": "Failed", "to": ["sent@example.com", "failed@example.com"]},
+        status=Status.FAILED,
+        recipient_state={
+            "sent": ["sent@example.com"],
+            "failed": {"failed@example.com": "550 mailbox unavailable"},
+        },
+    )
+
+    Message.objects.requeue()
+    send_all()
+
+    failed.refresh_from_db()
+    assert len(mailoutbox) == 1
+    assert mailoutbox[0].recipients() == ["failed@example.com"]
+    assert failed.status == Status.SENT
+
+
+def test_send_all_keeps_requeued_scheduled_message_scheduled(mailoutbox):
+    send_at = timezone.now() + datetime.timedelta(days=1)
+    cancelled = baker.make(
+        "email_relay.Message",
+        data={"subject": "Scheduled", "to": ["to@example.com"]},
+        status=Status.CANCELLED,
+        send_at=send_at,
+    )
+
+    Message.objects.requeue()
+    send_all()
+
+    cancelled.refresh_from_db()
+    assert len(mailoutbox) == 0
+    assert cancelled.status == Status.SCHEDULED
+    assert cancelled.send_at == send_at
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Priority
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture(autouse=True)
+def messages():
+    baker.make(
+        "email_relay.Message", status=Status.QUEUED, priority=Priority.HIGH, _quantity=3
+    )
+    baker.make("email_relay.Message", status=Status.FAILED, priority=Priority.LOW)
+
+
+def test_relaystats():
+    out = StringIO()
+
+    call_command("relaystats", stdout=out)
+
+    lines = out.getvalue().splitlines()
+
+    assert lines[0].split() == ["low", "medium", "high", "total"]
+    assert lines[1].split() == ["queued", "0", "0", "3", "3"]
+    assert lines[3].split() == ["failed", "1", "0", "0", "1"]
+    assert lines[-1].startswith("4 messages as of ")
+
+
+def test_relaystats_json():
+    out = StringIO()
+
+    call_command("relaystats", "--json", "--no-cache", "--exact", stdout=out)
+
+    data = json.loads(out.getvalue())
+
+    assert data["total"] == 4
+    assert data["approximate"] is False
+    assert data["statuses"]["queued"]["high"] == 3
+
+
+def test_relaystats_approximate():
+    out = StringIO()
+
+    # SQLite has no estimates, so this falls back to counting
+    call_command("relaystats", "--approximate", stdout=out)
+
+    assert out.getvalue().splitlines()[-1].startswith("4 messages as of ")
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.management.bulk import BulkMessageCommand
+from email_relay.management.bulk import parse_time
+from email_relay.models import Message
+from email_relay.models import Priority
+from email_relay.models import Status
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+def make_message(**kwargs):
+    data = {
+        "subject": "Test",
+        "from_email": "from@example.com",
+        "to": ["to@example.com"],
+        "cc": [],
+        "bcc": [],
+    }
+    data.update(kwargs.pop("data", {}))
+    return baker.make("email_relay.Message", data=data, **kwargs)
+
+
+def test_requeuemessages():
+    failed = make_message(status=Status.FAILED, retry_count=3, log="error")
+    cancelled = make_message(status=Status.CANCELLED)
+    sent = make_message(status=Status.SENT)
+    out = StringIO()
+
+    call_command("requeuemessages", "--chunk-size", "1", stdout=out)
+
+    assert out.getvalue() == "requeued 2 messages\n"
+    failed.refresh_from_db()
+    assert failed.status == Status.QUEUED
+    assert failed.retry_count == 0
+    assert failed.log == ""
+    cancelled.refresh_from_db()
+    assert cancelled.status == Status.QUEUED
+    sent.refresh_from_db()
+    assert sent.status == Status.SENT
+
+
+def test_requeuemessages_dry_run():
+    make_message(status=Status.FAILED, _quantity=3)
+    out = StringIO()
+
+    call_command("requeuemessages", "--dry-run", stdout=out)
+
+    assert out.getvalue() == "would requeue 3 messages\n"
+    assert Message.objects.failed().count() == 3
+
+
+def test_requeuemessages_filters():
+    now = timezone.now()
+    match = make_message(
+        status=Status.FAILED,
+        priority=Priority.HIGH,
+        log="SMTPServerDisconnected: Connection unexpectedly closed",
+        data={"from_email": "alerts@example.com", "bcc": ["someone@example.org"]},
+    )
+    make_message(status=Status.DEFERRED, priority=Priority.HIGH)
+    make_message(status=Status.FAILED, priority=Priority.LOW)
+    make_message(status=Status.FAILED, priority=Priority.HIGH, log="550 No such user")
+    make_message(
+        status=Status.FAILED,
+        priority=Priority.HIGH,
+        log="SMTPServerDisconnected",
+        data={"from_email": "news@example.com"},
+    )
+    out = StringIO()
+
+    call_command(
+        "requeuemessages",
+        "--status",
+        "failed",
+        "--priority",
+        "high",
+        "--created-after",
+        (now - datetime.timedelta(hours=1)).isoformat(),
+        "--created-before",
+        (now + datetime.timedelta(hours=1)).isoformat(),
+        "--sender",
+        "alerts@",
+        "--recipient",
+        "@example.org",
+        "--log-contains",
+        "serverdisconnected",
+        stdout=out,
+    )
+
+    assert out.getvalue() == "requeued 1 messages\n"
+    assert list(Message.objects.queued()) == [match]
+
+
+def test_requeuemessages_status_not_requeueable():
+    with pytest.raises(CommandError, match="invalid choice: 'sent'"):
+        call_command("requeuemessages", "--status", "sent")
+
+
+def test_requeuemessages_invalid_chunk_size():
+    with pytest.raises(CommandError, match="--chunk-size must be at least 1"):
+        call_command("requeuemessages", "--chunk-size", "0")
+
+
+def test_parse_time():
+    parsed = parse_time("2024-01-02T03:04:05+00:00")
+
+    assert parsed == datetime.datetime(
+        2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc
+    )
+
+
+def test_parse_time_date():
+    parsed = parse_time("2024-01-02")
+
+    assert timezone.is_aware(parsed)
+    assert parsed.date() == datetime.date(2024, 1, 2)
+    assert parsed.time() == datetime.time()
+
+
+def test_requeuemessages_invalid_time():
+    with pytest.raises(CommandError, match="is not an ISO 8601 date or datetime"):
+        call_command("requeuemessages", "--created-after", "yesterday")
+
+
+def test_bulk_message_command_requires_apply():
+    class Command(BulkMessageCommand):
+        verb = "touch"
+        past_verb = "touched"
+        statuses = [Status.QUEUED]
+
+    with pytest.raises(TypeError, match="apply"):
+        Command()
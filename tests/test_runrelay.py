@@ -2,15 +2,20 @@ from __future__ import annotations
 
 import datetime
 import logging
+import os
+import signal
+import sys
 from unittest import mock
 
 import pytest
 import responses
+from django.conf import settings
 from django.core.management import call_command
 from django.test.utils import override_settings
 from django.utils import timezone
 from model_bakery import baker
 
+from email_relay.conf import app_settings
 from email_relay.management.commands.runrelay import Command
 from email_relay.models import Message
 from email_relay.models import Status
@@ -39,6 +44,15 @@ def test_command_with_empty_queue(runrelay, mailoutbox):
     assert len(mailoutbox) == 0
 
 
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_command_with_empty_queue_queries(runrelay, django_assert_num_queries):
+    # releasing scheduled messages, expiring messages, reconciling messages
+    # left sending, then reserving an empty batch, which is in a savepoint as
+    # the test runs in a transaction
+    with django_assert_num_queries(6, using="email_relay_db"):
+        runrelay.handle(_loop_count=1)
+
+
 @pytest.mark.parametrize(
     ("status", "quantity", "expected_sent"),
     [
@@ -69,6 +83,30 @@ def test_command_with_messages_in_queue(
     assert len(mailoutbox) == expected_sent
 
 
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_command_sends_due_scheduled_messages(runrelay, mailoutbox):
+    data = {"subject": "Test", "to": ["to@example.com"]}
+    due = baker.make(
+        "email_relay.Message",
+        data=data,
+        status=Status.SCHEDULED,
+        send_at=timezone.now() - datetime.timedelta(seconds=1),
+    )
+    baker.make(
+        "email_relay.Message",
+        data=data,
+        status=Status.SCHEDULED,
+        send_at=timezone.now() + datetime.timedelta(hours=1),
+    )
+
+    runrelay.handle(_loop_count=1)
+
+    due.refresh_from_db()
+    assert len(mailoutbox) == 1
+    assert due.status == Status.SENT
+    assert Message.objects.scheduled().count() == 1
+
+
 @override_settings(
     DJANGO_EMAIL_RELAY={
         "EMPTY_QUEUE_SLEEP": 0.1,
@@ -92,6 +130,80 @@ def test_command_with_sleep(runrelay, mailoutbox):
     assert len(mailoutbox) == 1
 
 
+@override_settings(DJANGO_EMAIL_RELAY={"EMPTY_QUEUE_SLEEP": 0})
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_command_reloads_settings_on_sighup(runrelay):
+    with (
+        mock.patch(
+            "email_relay.management.commands.runrelay.send_all",
+            side_effect=lambda **kwargs: os.kill(os.getpid(), signal.SIGHUP),
+        ),
+        mock.patch.object(runrelay, "reload_settings") as reload_settings,
+    ):
+        runrelay.handle(_loop_count=2)
+
+    reload_settings.assert_called_once_with()
+    assert signal.getsignal(signal.SIGHUP) is signal.SIG_DFL
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMPTY_QUEUE_SLEEP": 0})
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
+def test_command_without_sighup(runrelay, monkeypatch):
+    # As on Windows, which has neither `SIGHUP` nor the supervisor's `os.fork`.
+    monkeypatch.delattr(signal, "SIGHUP")
+    monkeypatch.setitem(sys.modules, "email_relay.supervisor", None)
+
+    runrelay.handle(_loop_count=1)
+
+
+@pytest.fixture
+def settings_module(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    path = tmp_path / "relay_reload_settings.py"
+    with override_settings(
+        SETTINGS_MODULE="relay_reload_settings",
+        DJANGO_EMAIL_RELAY={"EMAIL_THROTTLE": 1},
+    ):
+        yield path
+
+
+def test_reload_settings(runrelay, settings_module, caplog):
+    caplog.set_level(logging.INFO)
+    settings_module.write_text('DJANGO_EMAIL_RELAY = {"EMAIL_THROTTLE": 2}\n')
+
+    runrelay.reload_settings()
+
+    assert app_settings.EMAIL_THROTTLE == 2
+    assert "reloaded settings" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        'DJANGO_EMAIL_RELAY = {"EMAIL_THROTLE": 2}\n',
+        'DJANGO_EMAIL_RELAY = {"EMAIL_THROTTLE": -2}\n',
+        "DJANGO_EMAIL_RELAY = {\n",
+    ],
+)
+def test_reload_settings_invalid(runrelay, settings_module, contents, caplog):
+    caplog.set_level(logging.ERROR)
+    settings_module.write_text(contents)
+
+    runrelay.reload_settings()
+
+    assert app_settings.EMAIL_THROTTLE == 1
+    assert "could not reload settings" in caplog.text
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_THROTTLE": 1})
+def test_reload_settings_without_settings_module(runrelay):
+    settings.DJANGO_EMAIL_RELAY = {"EMAIL_THROTTLE": 2}
+
+    runrelay.reload_settings()
+
+    assert app_settings.EMAIL_THROTTLE == 2
+
+
 @pytest.mark.django_db(databases=["default", "email_relay_db"])
 def test_delete_sent_messages_based_on_retention_default(runrelay):
     baker.make(
@@ -150,109 +262,34 @@ def test_delete_sent_messages_based_on_retention_non_zero(runrelay):
     assert Message.objects.count() == 5
 
 
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-    }
-)
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
 @responses.activate
-def test_relay_healthcheck_url(runrelay, caplog):
-    caplog.set_level(logging.DEBUG)
+def test_relay_healthcheck_runs_in_background(runrelay):
     responses.add(responses.GET, "http://example.com/healthcheck", status=200)
 
-    runrelay.ping_healthcheck()
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMPTY_QUEUE_SLEEP": 0.01,
+            "RELAY_HEALTHCHECK_INTERVAL": 0.01,
+            "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
+        }
+    ):
+        runrelay.handle(_loop_count=20)
 
-    assert len(responses.calls) == 1
-    assert "healthcheck ping successful" in caplog.text
+    assert len(responses.calls) >= 1
 
 
+@pytest.mark.django_db(databases=["default", "email_relay_db"])
 @responses.activate
-def test_relay_healthcheck_url_not_configured(runrelay):
+def test_relay_healthcheck_not_pinged_by_loop(runrelay):
     responses.add(responses.GET, "http://example.com/healthcheck", status=200)
 
-    runrelay.ping_healthcheck()
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMPTY_QUEUE_SLEEP": 0,
+            "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
+        }
+    ):
+        runrelay.handle(_loop_count=5)
 
     assert len(responses.calls) == 0
-
-
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-        "RELAY_HEALTHCHECK_STATUS_CODE": 201,
-    }
-)
-@responses.activate
-def test_relay_healthcheck_status_code(runrelay, caplog):
-    caplog.set_level(logging.DEBUG)
-    responses.add(responses.GET, "http://example.com/healthcheck", status=201)
-
-    runrelay.ping_healthcheck()
-
-    assert len(responses.calls) == 1
-    assert "healthcheck ping successful" in caplog.text
-
-
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-        "RELAY_HEALTHCHECK_METHOD": "POST",
-    }
-)
-@responses.activate
-def test_relay_healthcheck_method(runrelay, caplog):
-    caplog.set_level(logging.DEBUG)
-    responses.add(responses.POST, "http://example.com/healthcheck", status=200)
-
-    runrelay.ping_healthcheck()
-
-    assert len(responses.calls) == 1
-    assert "healthcheck ping successful" in caplog.text
-
-
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-    }
-)
-@responses.activate
-def test_relay_healthcheck_failure(runrelay, caplog):
-    caplog.set_level(logging.WARNING)
-    responses.add(responses.GET, "http://example.com/healthcheck", status=500)
-
-    runrelay.ping_healthcheck()
-
-    assert len(responses.calls) == 1
-    assert "healthcheck ping successful" not in caplog.text
-
-
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-    }
-)
-def test_relay_healthcheck_no_requests(runrelay, caplog):
-    caplog.set_level(logging.WARNING)
-
-    with mock.patch("email_relay.management.commands.runrelay.requests", None):
-        runrelay.ping_healthcheck()
-
-    assert "Healthcheck URL configured but requests is not installed." in caplog.text
-
-
-@override_settings(
-    DJANGO_EMAIL_RELAY={
-        "RELAY_HEALTHCHECK_URL": "http://example.com/healthcheck",
-    }
-)
-def test_relay_healthcheck_requests_exception(runrelay, caplog):
-    caplog.set_level(logging.WARNING)
-
-    with mock.patch(
-        "email_relay.management.commands.runrelay.requests"
-    ) as mock_requests:
-        mock_requests.exceptions.RequestException = Exception
-        mock_requests.request.side_effect = Exception("test")
-
-        runrelay.ping_healthcheck()
-
-    assert "healthcheck failed, got exception" in caplog.text
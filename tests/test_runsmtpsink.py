@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError
+
+from email_relay.management.commands.runsmtpsink import Command
+from email_relay.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def runsmtpsink():
+    return Command(stdout=StringIO())
+
+
+def test_runsmtpsink(runsmtpsink):
+    runsmtpsink.handle(port=0, report_interval=0.01, _loop_count=2)
+
+    output = runsmtpsink.stdout.getvalue().splitlines()
+
+    assert output[0].startswith("SMTP sink listening on 127.0.0.1:")
+    assert len(output) == 4
+    assert output[-1].startswith("0 messages (0.0/s), 0 recipients")
+
+
+def test_runsmtpsink_faults(runsmtpsink):
+    options = runsmtpsink.create_parser("manage.py", "runsmtpsink").parse_args(
+        [
+            "--port=0",
+            "--latency=0.1",
+            "--command-latency=data=0.5",
+            "--command-latency=RCPT=0",
+            "--temporary-failure-rate=0.1",
+            "--permanent-failure-rate=0.2",
+            "--drop-rate=0.3",
+            "--refuse-rate=0.4",
+            "--seed=1",
+            "--report-interval=0.01",
+        ]
+    )
+
+    with mock.patch(
+        "email_relay.management.commands.runsmtpsink.SMTPSink", wraps=SMTPSink
+    ) as sink:
+        runsmtpsink.handle(**vars(options), _loop_count=1)
+
+    faults = sink.call_args.kwargs["faults"]
+
+    assert faults.latency == 0.1
+    assert faults.command_latency == {"DATA": 0.5, "RCPT": 0}
+    assert faults.temporary_failure_rate == 0.1
+    assert faults.permanent_failure_rate == 0.2
+    assert faults.drop_rate == 0.3
+    assert faults.refuse_rate == 0.4
+    assert sink.call_args.kwargs["seed"] == 1
+
+
+def test_runsmtpsink_invalid_command_latency(runsmtpsink):
+    with pytest.raises(CommandError, match="COMMAND=SECONDS"):
+        runsmtpsink.handle(port=0, command_latency=["DATA"])
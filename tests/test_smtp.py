@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import smtplib
+
+import pytest
+from django.core.mail import EmailMessage
+from django.core.mail import get_connection
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+from email_relay.relay import send_all
+
+SMTP_BACKEND = "email_relay.smtp.EmailBackend"
+
+
+@pytest.fixture
+def smtp_backend(smtp_sink):
+    with override_settings(EMAIL_BACKEND=SMTP_BACKEND):
+        yield smtp_sink
+
+
+def make_email(*to: str) -> EmailMessage:
+    return EmailMessage(subject="Test", body="Body", to=list(to))
+
+
+def test_send(smtp_backend):
+    with get_connection() as connection:
+        assert connection.send_messages([make_email("to@example.com")]) == 1
+
+    assert smtp_backend.stats()["recipients"] == 1
+
+
+def test_send_partially_refused(smtp_backend):
+    smtp_backend.faults.refused_recipients = {"bounce@example.com": 550}
+
+    with (
+        pytest.raises(smtplib.SMTPRecipientsRefused) as exc_info,
+        get_connection() as connection,
+    ):
+        connection.send_messages(
+            [make_email("to@example.com", "Bounce <bounce@example.com>")]
+        )
+
+    assert list(exc_info.value.recipients) == ["Bounce <bounce@example.com>"]
+    assert exc_info.value.recipients["Bounce <bounce@example.com>"][0] == 550
+    assert smtp_backend.messages == 1
+
+
+def test_send_all_refused(smtp_backend):
+    smtp_backend.faults.refused_recipients = {"bounce@example.com": 550}
+
+    with (
+        pytest.raises(smtplib.SMTPRecipientsRefused) as exc_info,
+        get_connection() as connection,
+    ):
+        connection.send_messages([make_email("bounce@example.com")])
+
+    assert list(exc_info.value.recipients) == ["bounce@example.com"]
+    assert smtp_backend.messages == 0
+
+
+def test_send_partially_refused_fail_silently(smtp_backend):
+    smtp_backend.faults.refused_recipients = {"bounce@example.com": 550}
+
+    with get_connection(fail_silently=True) as connection:
+        sent = connection.send_messages(
+            [make_email("to@example.com", "bounce@example.com")]
+        )
+
+    assert sent == 1
+
+
+def make_message(*to: str) -> Message:
+    return baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": list(to)},
+        status=Status.QUEUED,
+    )
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+def test_send_all_retries_refused_recipients(smtp_backend):
+    smtp_backend.faults.refused_recipients = {
+        "bounce@example.com": 550,
+        "later@example.com": 450,
+    }
+    message = make_message(
+        "to@example.com", "bounce@example.com", "Later <later@example.com>"
+    )
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.DEFERRED
+    assert message.retry_count == 1
+    assert message.recipient_state["sent"] == ["to@example.com"]
+    assert list(message.recipient_state["failed"]) == ["bounce@example.com"]
+    assert message.pending_recipients() == ["Later <later@example.com>"]
+    assert smtp_backend.stats()["recipients"] == 1
+
+    smtp_backend.faults.refused_recipients = {}
+    Message.objects.filter(pk=message.pk).update(status=Status.QUEUED)
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.SENT
+    assert message.pending_recipients() == []
+    assert "bounce@example.com: 550" in message.log
+    assert smtp_backend.stats()["recipients"] == 2
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+def test_send_all_sent_once_refused_recipients_fail(smtp_backend):
+    smtp_backend.faults.refused_recipients = {"bounce@example.com": 550}
+    message = make_message("to@example.com", "bounce@example.com")
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.SENT
+    assert message.retry_count == 0
+    assert list(message.recipient_state["failed"]) == ["bounce@example.com"]
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+def test_send_all_every_recipient_fails(smtp_backend):
+    smtp_backend.faults.refused_recipients = {
+        "bounce@example.com": 550,
+        "other@example.com": 551,
+    }
+    message = make_message("bounce@example.com", "other@example.com")
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.FAILED
+    assert message.recipient_state["sent"] == []
+    assert "other@example.com: 551" in message.log
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_MAX_RETRIES": 1})
+def test_send_all_refused_recipients_max_retries(smtp_backend):
+    smtp_backend.faults.refused_recipients = {"later@example.com": 450}
+    message = make_message("to@example.com", "later@example.com")
+    Message.objects.filter(pk=message.pk).update(retry_count=1)
+
+    send_all()
+
+    message.refresh_from_db()
+
+    assert message.status == Status.FAILED
+    assert message.recipient_state["sent"] == ["to@example.com"]
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import smtplib
+import time
+
+import pytest
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+from email_relay.relay import send_all
+from email_relay.smtp_sink import SinkFaults
+from email_relay.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink() as sink:
+        yield sink
+
+
+def test_sendmail(sink):
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        refused = smtp.sendmail(
+            "from@example.com",
+            ["to@example.com", "cc@example.com"],
+            "Subject: Test\r\n\r\nBody\r\n",
+        )
+
+    stats = sink.stats()
+
+    assert refused == {}
+    assert sink.messages == 1
+    assert stats["messages"] == 1
+    assert stats["recipients"] == 2
+    assert stats["connections"] == 1
+    assert stats["bytes"] > 0
+    assert stats["messages_per_second"] > 0
+
+
+def test_helo_and_noop(sink):
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        assert smtp.helo()[0] == 250
+        assert smtp.noop()[0] == 250
+        assert smtp.rset()[0] == 250
+
+
+def test_unknown_command(sink):
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        assert smtp.docmd("VRFY", "to@example.com")[0] == 502
+
+
+def test_port_assigned():
+    sink = SMTPSink()
+
+    assert sink.messages == 0
+    assert sink.stats()["messages"] == 0
+
+    sink.start()
+    try:
+        assert sink.port != 0
+    finally:
+        sink.stop()
+
+
+def test_stop_without_start():
+    SMTPSink().stop()
+
+
+def test_temporary_failure(sink):
+    sink.faults.temporary_failure_rate = 1
+
+    with (
+        smtplib.SMTP(sink.host, sink.port) as smtp,
+        pytest.raises(smtplib.SMTPDataError) as exc_info,
+    ):
+        smtp.sendmail("from@example.com", ["to@example.com"], "Body")
+
+    assert exc_info.value.smtp_code == 451
+    assert sink.stats()["temporary_failures"] == 1
+    assert sink.messages == 0
+
+
+def test_permanent_failure(sink):
+    sink.faults.permanent_failure_rate = 1
+
+    with (
+        smtplib.SMTP(sink.host, sink.port) as smtp,
+        pytest.raises(smtplib.SMTPDataError) as exc_info,
+    ):
+        smtp.sendmail("from@example.com", ["to@example.com"], "Body")
+
+    assert exc_info.value.smtp_code == 554
+    assert sink.stats()["permanent_failures"] == 1
+
+
+def test_refused_recipients(sink):
+    sink.faults.refuse_rate = 1
+
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            smtp.sendmail("from@example.com", ["to@example.com"], "Body")
+        smtp.mail("from@example.com")
+        assert smtp.docmd("DATA")[0] == 503
+
+    assert sink.stats()["refused_recipients"] == 1
+
+
+def test_partially_refused_recipients():
+    with SMTPSink(faults=SinkFaults(refuse_rate=0.5), seed=1) as sink:
+        with smtplib.SMTP(sink.host, sink.port) as smtp:
+            refused = smtp.sendmail(
+                "from@example.com",
+                [f"to-{n}@example.com" for n in range(20)],
+                "Body",
+            )
+
+        stats = sink.stats()
+
+    assert 0 < len(refused) < 20
+    assert stats["refused_recipients"] == len(refused)
+    assert stats["recipients"] == 20 - len(refused)
+
+
+def test_dropped_connection(sink):
+    sink.faults.drop_rate = 1
+
+    with (
+        smtplib.SMTP(sink.host, sink.port) as smtp,
+        pytest.raises(smtplib.SMTPServerDisconnected),
+    ):
+        smtp.sendmail("from@example.com", ["to@example.com"], "Body")
+
+    assert sink.stats()["dropped_connections"] == 1
+
+
+def test_latency():
+    faults = SinkFaults(latency=0.01, command_latency={"NOOP": 0.2})
+
+    with SMTPSink(faults=faults) as sink, smtplib.SMTP(sink.host, sink.port) as smtp:
+        started = time.monotonic()
+        smtp.noop()
+
+        assert time.monotonic() - started >= 0.2
+
+        started = time.monotonic()
+        smtp.rset()
+
+        assert time.monotonic() - started < 0.2
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@pytest.mark.parametrize(
+    ("fault", "status"),
+    [
+        ("temporary_failure_rate", Status.DEFERRED),
+        ("drop_rate", Status.DEFERRED),
+        ("permanent_failure_rate", Status.FAILED),
+        ("refuse_rate", Status.FAILED),
+    ],
+)
+def test_send_all_fault(smtp_sink, fault, status):
+    setattr(smtp_sink.faults, fault, 1)
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=2,
+    )
+
+    send_all()
+
+    assert Message.objects.filter(status=status).count() == 2
+    assert smtp_sink.messages == 0
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+def test_send_all_reconnects_after_fault(smtp_sink):
+    smtp_sink.faults.temporary_failure_rate = 0.5
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=20,
+    )
+
+    send_all()
+
+    stats = smtp_sink.stats()
+
+    assert Message.objects.sent().count() == stats["messages"]
+    assert Message.objects.deferred().count() == stats["temporary_failures"]
+    assert stats["connections"] > 1
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+@pytest.mark.parametrize(
+    ("batch_size", "expected_connections"),
+    [
+        (None, 6),
+        (3, 2),
+        (6, 1),
+    ],
+)
+def test_send_all_reuses_connection_per_batch(
+    smtp_sink, batch_size, expected_connections
+):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=6,
+    )
+
+    with override_settings(DJANGO_EMAIL_RELAY={"EMAIL_SEND_BATCH_SIZE": batch_size}):
+        send_all()
+
+    stats = smtp_sink.stats()
+
+    assert stats["messages"] == 6
+    assert stats["connections"] == expected_connections
+
+
+def test_refused_recipients_by_address(sink):
+    sink.faults.refused_recipients = {"bounce@example.com": 450}
+
+    with smtplib.SMTP(sink.host, sink.port) as smtp:
+        refused = smtp.sendmail(
+            "from@example.com", ["to@example.com", "bounce@example.com"], "Body"
+        )
+
+    assert refused == {"bounce@example.com": (450, b"Recipient refused")}
+    assert sink.stats()["refused_recipients"] == 1
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import datetime
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Priority
+from email_relay.models import Status
+from email_relay.stats import QueueStats
+from email_relay.stats import count_messages
+from email_relay.stats import estimate_count
+from email_relay.stats import estimate_messages
+from email_relay.stats import get_queue_stats
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@pytest.fixture
+def messages():
+    baker.make(
+        "email_relay.Message", status=Status.QUEUED, priority=Priority.HIGH, _quantity=3
+    )
+    baker.make(
+        "email_relay.Message", status=Status.QUEUED, priority=Priority.LOW, _quantity=2
+    )
+    baker.make("email_relay.Message", status=Status.FAILED, priority=Priority.LOW)
+
+
+@pytest.fixture
+def locmem_cache():
+    with override_settings(CACHES=LOCMEM_CACHE):
+        cache.clear()
+        yield cache
+        cache.clear()
+
+
+def test_count_messages(messages, django_assert_num_queries):
+    with django_assert_num_queries(1, using=EMAIL_RELAY_DATABASE_ALIAS):
+        counts = count_messages()
+
+    assert counts == {
+        (Status.QUEUED, Priority.HIGH): 3,
+        (Status.QUEUED, Priority.LOW): 2,
+        (Status.FAILED, Priority.LOW): 1,
+    }
+
+
+def test_queue_stats_count():
+    stats = QueueStats(
+        counts={
+            (Status.QUEUED, Priority.HIGH): 3,
+            (Status.QUEUED, Priority.LOW): 2,
+            (Status.FAILED, Priority.LOW): 1,
+        },
+        approximate=False,
+        collected_at=timezone.now(),
+    )
+
+    assert stats.count() == 6
+    assert stats.count(Status.QUEUED) == 5
+    assert stats.count(priority=Priority.LOW) == 3
+    assert stats.count(Status.QUEUED, Priority.LOW) == 2
+    assert stats.count(Status.SENT) == 0
+
+
+def test_queue_stats_to_dict():
+    collected_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    stats = QueueStats(
+        counts={(Status.DEFERRED, Priority.MEDIUM): 4},
+        approximate=True,
+        collected_at=collected_at,
+    )
+
+    data = stats.to_dict()
+
+    assert data["approximate"] is True
+    assert data["collected_at"] == "2024-01-01T00:00:00+00:00"
+    assert data["total"] == 4
+    assert data["statuses"]["deferred"] == {
+        "total": 4,
+        "low": 0,
+        "medium": 4,
+        "high": 0,
+    }
+    assert data["statuses"]["queued"]["total"] == 0
+
+
+def test_get_queue_stats(messages):
+    stats = get_queue_stats()
+
+    assert stats.count(Status.QUEUED) == 5
+    assert stats.approximate is False
+
+
+def test_get_queue_stats_cached(messages, locmem_cache, django_assert_num_queries):
+    get_queue_stats()
+    baker.make("email_relay.Message", status=Status.QUEUED)
+
+    with django_assert_num_queries(0, using=EMAIL_RELAY_DATABASE_ALIAS):
+        assert get_queue_stats().count(Status.QUEUED) == 5
+
+    assert get_queue_stats(cache_seconds=0).count(Status.QUEUED) == 6
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"QUEUE_STATS_CACHE_SECONDS": 0})
+def test_get_queue_stats_cache_disabled(messages, locmem_cache):
+    get_queue_stats()
+    baker.make("email_relay.Message", status=Status.QUEUED)
+
+    assert get_queue_stats().count(Status.QUEUED) == 6
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"QUEUE_STATS_APPROXIMATE": True})
+def test_get_queue_stats_approximate_falls_back(messages):
+    stats = get_queue_stats()
+
+    assert stats.approximate is False
+    assert stats.count(Status.QUEUED) == 5
+
+
+def test_estimate_messages_not_postgres():
+    assert estimate_messages() is None
+
+
+@pytest.fixture
+def postgres_cursor():
+    cursor = mock.MagicMock()
+    connection = mock.MagicMock(vendor="postgresql")
+    connection.cursor.return_value.__enter__.return_value = cursor
+    with mock.patch(
+        "email_relay.stats.connections", {EMAIL_RELAY_DATABASE_ALIAS: connection}
+    ):
+        yield cursor
+
+
+def test_estimate_messages(postgres_cursor):
+    postgres_cursor.fetchone.return_value = (1000.0,)
+    postgres_cursor.fetchall.return_value = [
+        # sent is 90% of rows, queued 6%, and the remaining 4% is shared by
+        # the 2 other distinct statuses
+        ("status", 0.0, 4.0, [Status.SENT, Status.QUEUED], [0.9, 0.06]),
+        # every priority is a most common value
+        (
+            "priority",
+            0.0,
+            3.0,
+            [Priority.LOW, Priority.MEDIUM, Priority.HIGH],
+            [0.5, 0.3, 0.2],
+        ),
+    ]
+
+    counts = estimate_messages()
+
+    assert counts is not None
+    assert counts[(Status.SENT, Priority.LOW)] == 450
+    assert counts[(Status.QUEUED, Priority.HIGH)] == 12
+    assert counts[(Status.FAILED, Priority.MEDIUM)] == 6
+    # like the query planner, every status that is not a most common value is
+    # given the same share, whether or not it exists
+    assert counts[(Status.EXPIRED, Priority.MEDIUM)] == 6
+
+
+def test_estimate_messages_negative_n_distinct(postgres_cursor):
+    postgres_cursor.fetchone.return_value = (100.0,)
+    postgres_cursor.fetchall.return_value = [
+        ("status", 0.0, -0.02, [Status.SENT], [0.5]),
+        ("priority", 0.0, 1.0, [Priority.LOW], [1.0]),
+    ]
+
+    counts = estimate_messages()
+
+    assert counts is not None
+    assert counts[(Status.SENT, Priority.LOW)] == 50
+    assert counts[(Status.QUEUED, Priority.LOW)] == 50
+    assert counts[(Status.QUEUED, Priority.HIGH)] == 0
+
+
+@pytest.mark.parametrize("reltuples", [None, (None,), (-1.0,)])
+def test_estimate_messages_not_analyzed(postgres_cursor, reltuples):
+    postgres_cursor.fetchone.return_value = reltuples
+
+    assert estimate_messages() is None
+
+
+def test_estimate_messages_no_column_stats(postgres_cursor):
+    postgres_cursor.fetchone.return_value = (1000.0,)
+    postgres_cursor.fetchall.return_value = [("status", 0.0, 1.0, [1], [1.0])]
+
+    assert estimate_messages() is None
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"QUEUE_STATS_APPROXIMATE": True})
+def test_get_queue_stats_approximate(postgres_cursor):
+    postgres_cursor.fetchone.return_value = (10.0,)
+    postgres_cursor.fetchall.return_value = [
+        ("status", 0.0, 1.0, [Status.QUEUED], [1.0]),
+        ("priority", 0.0, 1.0, [Priority.LOW], [1.0]),
+    ]
+
+    stats = get_queue_stats()
+
+    assert stats.approximate is True
+    assert stats.count(Status.QUEUED, Priority.LOW) == 10
+
+
+def test_estimate_count_not_postgres():
+    assert estimate_count(Message.objects.all()) is None
+
+
+@pytest.mark.parametrize(
+    "plan", [[{"Plan": {"Plan Rows": 42}}], '[{"Plan": {"Plan Rows": 42}}]']
+)
+def test_estimate_count(postgres_cursor, plan):
+    postgres_cursor.fetchone.return_value = (plan,)
+
+    assert estimate_count(Message.objects.queued().order_by("-id")) == 42
+
+    sql = postgres_cursor.execute.call_args.args[0]
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "ORDER BY" not in sql
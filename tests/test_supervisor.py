@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import importlib
+import os
+import signal
+import time
+
+import pytest
+from django.core.management import CommandError
+from django.core.management import call_command
+from django.test import override_settings
+
+from email_relay import supervisor
+from email_relay.supervisor import Supervisor
+
+
+def test_supervisor_restarts_crashed_workers_and_forwards_signals(tmp_path):
+    starts = tmp_path / "starts"
+
+    def target(index):
+        with starts.open("a") as f:
+            f.write(f"{index}\n")
+        if index == 0:
+            if starts.read_text().split().count("0") == 1:
+                raise RuntimeError("crash")
+            os.kill(os.getppid(), signal.SIGTERM)
+        time.sleep(10)
+
+    supervisor = Supervisor(target=target, processes=2, restart_delay=0)
+
+    assert supervisor.run() == 0
+    assert sorted(starts.read_text().split()) == ["0", "0", "1"]
+    assert supervisor.workers == {}
+
+
+def test_supervisor_requires_a_process():
+    with pytest.raises(ValueError, match="at least 1"):
+        Supervisor(target=lambda index: None, processes=0)
+
+
+def test_runrelay_processes_must_be_positive():
+    with pytest.raises(CommandError, match="at least 1"):
+        call_command("runrelay", "--processes", "0")
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"RELAY_LEADER_ELECTION": True})
+def test_runrelay_processes_with_leader_election():
+    with pytest.raises(CommandError, match="RELAY_LEADER_ELECTION"):
+        call_command("runrelay", "--processes", "2")
+
+
+def test_forwarded_signals_without_sighup(monkeypatch):
+    monkeypatch.delattr(signal, "SIGHUP")
+    try:
+        importlib.reload(supervisor)
+
+        assert supervisor.FORWARDED_SIGNALS == (signal.SIGTERM, signal.SIGINT)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(supervisor)
+
+    assert signal.SIGHUP in supervisor.FORWARDED_SIGNALS
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import smtplib
+from unittest import mock
+
+import pytest
+from django.core.mail import send_mail
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+from email_relay.relay import send_all
+from email_relay.tracing import TracingObserver
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+
+@pytest.fixture
+def exporter():
+    return InMemorySpanExporter()
+
+
+@pytest.fixture
+def tracer_provider(exporter):
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider
+
+
+@pytest.fixture
+def observer(tracer_provider):
+    observer = TracingObserver(tracer_provider=tracer_provider)
+    backend = mock.patch("email_relay.backend.get_observer", return_value=observer)
+    relay = mock.patch("email_relay.relay.get_observer", return_value=observer)
+    with backend, relay:
+        yield observer
+
+
+@override_settings(EMAIL_BACKEND="email_relay.backend.RelayDatabaseEmailBackend")
+def test_trace_context_stored(observer, tracer_provider, exporter):
+    tracer = tracer_provider.get_tracer(__name__)
+
+    with tracer.start_as_current_span("request") as span:
+        send_mail("Subject", "Body", "from@example.com", ["to@example.com"])
+
+    message = Message.objects.get()
+    trace_id = f"{span.get_span_context().trace_id:032x}"
+
+    assert trace_id in message.trace_context["traceparent"]
+    assert [span.name for span in exporter.get_finished_spans()] == [
+        "email_relay serialize",
+        "email_relay insert",
+        "request",
+    ]
+
+
+@override_settings(EMAIL_BACKEND="email_relay.backend.RelayDatabaseEmailBackend")
+def test_no_trace_context_without_span(observer):
+    send_mail("Subject", "Body", "from@example.com", ["to@example.com"])
+
+    assert Message.objects.get().trace_context is None
+
+
+@override_settings(EMAIL_BACKEND="email_relay.backend.RelayDatabaseEmailBackend")
+def test_relay_spans_are_children(observer, tracer_provider, exporter, mailoutbox):
+    tracer = tracer_provider.get_tracer(__name__)
+    with tracer.start_as_current_span("request") as request_span:
+        send_mail("Subject", "Body", "from@example.com", ["to@example.com"])
+    exporter.clear()
+
+    with override_settings(
+        EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"
+    ):
+        send_all()
+
+    spans = exporter.get_finished_spans()
+    request_context = request_span.get_span_context()
+
+    assert len(mailoutbox) == 1
+    assert [span.name for span in spans] == [
+        "email_relay claim",
+        "email_relay claim",
+        "email_relay render",
+        "email_relay send",
+        "email_relay ack",
+    ]
+    assert spans[0].parent is None
+    for span in spans[1:]:
+        assert span.context.trace_id == request_context.trace_id
+        assert span.parent.span_id == request_context.span_id
+        assert span.attributes["email_relay.message.id"] == Message.objects.get().id
+
+
+def test_send_span_records_error(observer, exporter):
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+    )
+
+    with mock.patch(
+        "django.core.mail.EmailMessage.send",
+        side_effect=smtplib.SMTPDataError(451, "try again later"),
+    ):
+        send_all()
+
+    send_span = next(
+        span
+        for span in exporter.get_finished_spans()
+        if span.name == "email_relay send"
+    )
+
+    assert send_span.status.status_code == StatusCode.ERROR
+    assert Message.objects.get().status == Status.DEFERRED
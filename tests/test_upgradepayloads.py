@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError
+from django.core.management import call_command
+from model_bakery import baker
+
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.email import RelayEmailData
+from email_relay.models import Message
+
+pytestmark = pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+
+OLD_SCHEMA_DATA = {
+    "message": "Here is the message.",
+    "recipient_list": ["to@example.com"],
+}
+
+
+@pytest.fixture
+def messages():
+    old = baker.make("email_relay.Message", data=OLD_SCHEMA_DATA, _quantity=5)
+    current = baker.make(
+        "email_relay.Message",
+        data=RelayEmailData(subject="Test").to_dict(),
+    )
+    return old, current
+
+
+def test_upgradepayloads(messages):
+    old, current = messages
+    updated_at = current.updated_at
+    out = StringIO()
+
+    call_command("upgradepayloads", "--batch-size", "2", stdout=out)
+
+    for message in Message.objects.filter(id__in=[message.id for message in old]):
+        assert message.data["body"] == "Here is the message."
+        assert message.data["to"] == ["to@example.com"]
+        assert message.data["_email_relay_version"] == "0.2.0"
+    current.refresh_from_db()
+    assert current.updated_at == updated_at
+    lines = out.getvalue().splitlines()
+    assert lines[0] == f"upgraded 2 messages, up to id {old[1].id}"
+    assert lines[-1] == "done, upgraded 5 messages"
+
+
+def test_upgradepayloads_after_id(messages):
+    old, _ = messages
+    out = StringIO()
+
+    call_command("upgradepayloads", "--after-id", str(old[2].id), stdout=out)
+
+    assert [message.data.get("body") for message in Message.objects.order_by("id")][
+        :5
+    ] == [None, None, None, "Here is the message.", "Here is the message."]
+    assert out.getvalue().splitlines()[-1] == "done, upgraded 2 messages"
+
+
+def test_upgradepayloads_queries(messages, django_assert_num_queries):
+    with django_assert_num_queries(5, using=EMAIL_RELAY_DATABASE_ALIAS):
+        call_command("upgradepayloads", "--batch-size", "3", stdout=StringIO())
+
+
+def test_upgradepayloads_sleep(messages):
+    with mock.patch(
+        "email_relay.management.commands.upgradepayloads.time.sleep"
+    ) as sleep:
+        call_command(
+            "upgradepayloads", "--batch-size", "3", "--sleep", "0.5", stdout=StringIO()
+        )
+
+    assert sleep.call_count == 2
+
+
+def test_upgradepayloads_invalid_batch_size():
+    with pytest.raises(CommandError, match="--batch-size must be at least 1"):
+        call_command("upgradepayloads", "--batch-size", "0")
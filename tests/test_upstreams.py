@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import logging
+import smtplib
+import time
+from unittest import mock
+
+import pytest
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import override_settings
+from model_bakery import baker
+
+from email_relay import upstreams
+from email_relay.conf import EMAIL_RELAY_DATABASE_ALIAS
+from email_relay.models import Message
+from email_relay.models import Status
+from email_relay.relay import send_all
+from email_relay.upstreams import NoUpstreamsError
+from email_relay.upstreams import Upstream
+from email_relay.upstreams import UpstreamPool
+from email_relay.upstreams import get_upstream_pool
+
+RECORDING_BACKEND = "tests.test_upstreams.RecordingEmailBackend"
+FAILING_BACKEND = "tests.test_upstreams.FailingEmailBackend"
+
+
+class RecordingEmailBackend(BaseEmailBackend):
+    sent: dict[str, int] = {}
+    opened: dict[str, int] = {}
+
+    def __init__(self, label: str = "default", **kwargs):
+        super().__init__(**kwargs)
+        self.label = label
+        self.is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        self.is_open = True
+        self.opened[self.label] = self.opened.get(self.label, 0) + 1
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, email_messages):
+        self.sent[self.label] = self.sent.get(self.label, 0) + len(email_messages)
+        return len(email_messages)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    error: Exception = OSError("Test Network Error")
+
+    def __init__(self, label: str = "failing", **kwargs):
+        super().__init__(**kwargs)
+
+    def send_messages(self, email_messages):
+        raise self.error
+
+
+@pytest.fixture(autouse=True)
+def reset_upstreams():
+    yield
+    upstreams._pool = None
+    upstreams._pool_config = None
+    RecordingEmailBackend.sent = {}
+    RecordingEmailBackend.opened = {}
+    FailingEmailBackend.error = OSError("Test Network Error")
+
+
+def make_emails(quantity: int) -> list[EmailMessage]:
+    return [
+        EmailMessage(subject="Test", body="Body", to=["to@example.com"])
+        for _ in range(quantity)
+    ]
+
+
+def test_get_upstream_pool_not_configured():
+    assert get_upstream_pool() is None
+
+
+def test_get_upstream_pool():
+    config = [{"BACKEND": RECORDING_BACKEND, "NAME": "primary"}]
+
+    with override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAMS": config}):
+        pool = get_upstream_pool()
+
+        assert isinstance(pool, UpstreamPool)
+        assert [upstream.name for upstream in pool.upstreams] == ["primary"]
+        assert get_upstream_pool() is pool
+
+    config = [{"BACKEND": RECORDING_BACKEND, "NAME": "secondary"}]
+
+    with override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAMS": config}):
+        assert get_upstream_pool() is not pool
+
+
+def test_upstream_name():
+    assert Upstream(RECORDING_BACKEND, name="primary").name == "primary"
+    assert Upstream(RECORDING_BACKEND, {"host": "smtp.example.com"}).name == (
+        "smtp.example.com"
+    )
+    assert Upstream(RECORDING_BACKEND).name == RECORDING_BACKEND
+
+
+def test_send_weighted():
+    pool = UpstreamPool(
+        [
+            Upstream(RECORDING_BACKEND, {"label": "heavy"}, weight=3),
+            Upstream(RECORDING_BACKEND, {"label": "light"}, weight=1),
+            Upstream(RECORDING_BACKEND, {"label": "off"}, weight=0),
+        ]
+    )
+    pool.random.seed(0)
+
+    results = pool.send_messages_with_results(make_emails(400))
+
+    assert results == [None] * 400
+    assert RecordingEmailBackend.sent["heavy"] > RecordingEmailBackend.sent["light"]
+    assert sum(RecordingEmailBackend.sent.values()) == 400
+    assert "off" not in RecordingEmailBackend.sent
+
+
+def test_send_reuses_connection():
+    pool = UpstreamPool([Upstream(RECORDING_BACKEND, {"label": "primary"})])
+
+    pool.send_messages_with_results(make_emails(10))
+
+    assert RecordingEmailBackend.sent == {"primary": 10}
+    assert RecordingEmailBackend.opened == {"primary": 1}
+
+
+def test_send_fails_over(caplog):
+    caplog.set_level(logging.WARNING)
+    failing = Upstream(FAILING_BACKEND, name="failing", weight=100)
+    pool = UpstreamPool([failing, Upstream(RECORDING_BACKEND, {"label": "backup"})])
+
+    results = pool.send_messages_with_results(make_emails(20))
+
+    assert results == [None] * 20
+    assert RecordingEmailBackend.sent == {"backup": 20}
+    assert not failing.is_available()
+    assert "ejecting upstream failing for 30.0 seconds" in caplog.text
+
+
+def test_send_all_upstreams_failing():
+    pool = UpstreamPool(
+        [
+            Upstream(FAILING_BACKEND, name="first"),
+            Upstream(FAILING_BACKEND, name="second"),
+        ]
+    )
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert len(results) == 1
+    assert isinstance(results[0], OSError)
+
+
+def test_send_no_upstreams_with_weight():
+    pool = UpstreamPool([Upstream(RECORDING_BACKEND, {"label": "off"}, weight=0)])
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert isinstance(results[0], NoUpstreamsError)
+    assert RecordingEmailBackend.sent == {}
+
+
+def test_send_unexpected_error_does_not_fail_over():
+    FailingEmailBackend.error = ValueError("Test Value Error")
+    failing = Upstream(FAILING_BACKEND, name="failing", weight=100)
+    pool = UpstreamPool([failing, Upstream(RECORDING_BACKEND, {"label": "backup"})])
+    pool.random.seed(0)
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert isinstance(results[0], ValueError)
+    assert RecordingEmailBackend.sent == {}
+    assert failing.error_rate == 0
+
+
+def test_send_messages():
+    pool = UpstreamPool([Upstream(RECORDING_BACKEND)])
+
+    assert pool.send_messages(make_emails(3)) == 3
+
+
+def test_send_messages_raises():
+    pool = UpstreamPool([Upstream(FAILING_BACKEND)])
+
+    with pytest.raises(OSError, match="Test Network Error"):
+        pool.send_messages(make_emails(3))
+
+
+def test_send_messages_fail_silently():
+    pool = UpstreamPool([Upstream(FAILING_BACKEND)], fail_silently=True)
+
+    assert pool.send_messages(make_emails(3)) == 0
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAM_MAX_ERROR_RATE": 0.5})
+def test_upstream_ejected_on_error_rate():
+    upstream = Upstream(RECORDING_BACKEND)
+
+    for success in (True, True, True, False, False):
+        upstream.record(success)
+        assert upstream.is_available()
+
+    upstream.record(success=False)
+
+    assert not upstream.is_available()
+    assert upstream.error_rate == 0
+
+
+def test_upstream_not_ejected_before_min_sends():
+    upstream = Upstream(RECORDING_BACKEND)
+
+    for _ in range(upstreams.UPSTREAM_MIN_SENDS - 1):
+        upstream.record(success=False)
+
+    assert upstream.is_available()
+
+
+@override_settings(DJANGO_EMAIL_RELAY={"EMAIL_UPSTREAM_ERROR_WINDOW": 4})
+def test_upstream_error_window():
+    upstream = Upstream(RECORDING_BACKEND)
+
+    for success in (False, False, False, True, True, True):
+        upstream.record(success)
+
+    assert upstream.error_rate == 0.25
+
+
+def test_upstream_returns_after_ejection(caplog):
+    caplog.set_level(logging.INFO)
+    upstream = Upstream(RECORDING_BACKEND, name="primary")
+    upstream.ejected_until = time.monotonic() + 30
+
+    assert not upstream.is_available()
+
+    upstream.ejected_until = time.monotonic() - 1
+
+    assert upstream.is_available()
+    assert upstream.ejected_until is None
+    assert "upstream primary is back in the pool" in caplog.text
+
+
+def test_candidates_all_ejected(caplog):
+    caplog.set_level(logging.WARNING)
+    first = Upstream(RECORDING_BACKEND, name="first")
+    second = Upstream(RECORDING_BACKEND, name="second")
+    for upstream in (first, second):
+        upstream.ejected_until = time.monotonic() + 30
+    pool = UpstreamPool([first, second])
+
+    assert set(pool.candidates()) == {first, second}
+    assert "all upstreams are ejected, trying them anyway" in caplog.text
+
+
+def test_candidates_skip_ejected():
+    first = Upstream(RECORDING_BACKEND, name="first")
+    second = Upstream(RECORDING_BACKEND, name="second")
+    first.ejected_until = time.monotonic() + 30
+    pool = UpstreamPool([first, second])
+
+    assert pool.candidates() == [second]
+
+
+def test_upstream_throttle():
+    upstream = Upstream(RECORDING_BACKEND, throttle=5)
+
+    with mock.patch("email_relay.upstreams.time.sleep") as sleep:
+        upstream.send(make_emails(1)[0])
+        sleep.assert_not_called()
+
+        upstream.send(make_emails(1)[0])
+        sleep.assert_called_once()
+        assert 4 < sleep.call_args.args[0] <= 5
+
+
+@pytest.mark.django_db(databases=["default", EMAIL_RELAY_DATABASE_ALIAS])
+def test_send_all_with_upstreams():
+    baker.make(
+        "email_relay.Message",
+        data={"subject": "Test", "to": ["to@example.com"]},
+        status=Status.QUEUED,
+        _quantity=10,
+    )
+
+    with override_settings(
+        DJANGO_EMAIL_RELAY={
+            "EMAIL_SEND_BATCH_SIZE": 5,
+            "EMAIL_UPSTREAMS": [
+                {"BACKEND": FAILING_BACKEND, "NAME": "down", "WEIGHT": 10},
+                {"BACKEND": RECORDING_BACKEND, "OPTIONS": {"label": "up"}},
+            ],
+        }
+    ):
+        send_all()
+
+    assert Message.objects.sent().count() == 10
+    assert RecordingEmailBackend.sent == {"up": 10}
+    assert RecordingEmailBackend.opened == {"up": 2}
+
+
+def test_send_permanent_error_does_not_fail_over():
+    FailingEmailBackend.error = smtplib.SMTPRecipientsRefused(
+        {"to@example.com": (550, b"Mailbox does not exist")}
+    )
+    failing = Upstream(FAILING_BACKEND, name="failing", weight=100)
+    pool = UpstreamPool([failing, Upstream(RECORDING_BACKEND, {"label": "backup"})])
+    pool.random.seed(0)
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert isinstance(results[0], smtplib.SMTPRecipientsRefused)
+    assert RecordingEmailBackend.sent == {}
+    assert failing.error_rate == 0
+
+
+def test_send_transient_message_error_fails_over():
+    FailingEmailBackend.error = smtplib.SMTPDataError(451, b"Try again later")
+    failing = Upstream(FAILING_BACKEND, name="failing", weight=100)
+    pool = UpstreamPool([failing, Upstream(RECORDING_BACKEND, {"label": "backup"})])
+    pool.random.seed(0)
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert results == [None]
+    assert RecordingEmailBackend.sent == {"backup": 1}
+    assert failing.error_rate == 0
+
+
+def test_send_refused_recipients_does_not_fail_over():
+    FailingEmailBackend.error = smtplib.SMTPRecipientsRefused(
+        {"to@example.com": (450, b"Try again later")}
+    )
+    failing = Upstream(FAILING_BACKEND, name="failing", weight=100)
+    pool = UpstreamPool([failing, Upstream(RECORDING_BACKEND, {"label": "backup"})])
+    pool.random.seed(0)
+
+    results = pool.send_messages_with_results(make_emails(1))
+
+    assert isinstance(results[0], smtplib.SMTPRecipientsRefused)
+    assert RecordingEmailBackend.sent == {}
+    assert failing.error_rate == 0